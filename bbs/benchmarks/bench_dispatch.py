@@ -0,0 +1,59 @@
+"""
+Microbenchmark of message_processing dispatch latency.
+
+Times resolve() - picking the handler for a message - for every registered
+state and quick command, without running the handlers themselves.
+
+Run from the bbs directory:
+    python benchmarks/bench_dispatch.py [--iterations N]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_processing import menu_tables, priority_step_handlers, resolve, step_handlers  # noqa: E402
+
+
+def build_cases():
+    """(label, normalised message, state) for every route the router knows"""
+    cases = [
+        ("no state / menu option", "m", None),
+        ("no state / unknown", "hello", None),
+        ("no state / x", "x", None),
+        ("quick sm,,", "sm,,!abcd1234,,subject,,body", None),
+        ("quick cm", "cm", None),
+        ("quick cb,,", "cb,,urgent", None),
+        ("quick chp,,", "chp,,name,,url", None),
+        ("quick chl", "chl", None),
+    ]
+    for name in menu_tables:
+        state = {'command': 'MENU', 'menu': name, 'step': 1} if name.islower() else {'command': name, 'step': 1}
+        cases.append((f"menu {name}", "x" if name == 'main' else next(iter(menu_tables[name])), state))
+    for command in list(priority_step_handlers) + list(step_handlers):
+        cases.append((f"step {command}", "1", {'command': command, 'step': 1}))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    cases = build_cases()
+    width = max(len(label) for label, _, _ in cases)
+    print(f"{'route':<{width}}  ns/dispatch")
+    total = 0.0
+    for label, message, state in cases:
+        seconds = min(timeit.repeat(lambda: resolve(message, state), number=args.iterations, repeat=3))
+        per_call = seconds / args.iterations * 1e9
+        total += per_call
+        print(f"{label:<{width}}  {per_call:10.0f}")
+    print(f"{'mean':<{width}}  {total / len(cases):10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,348 @@
+"""
+Packet-ingest benchmark for the BBS and the telemetry logger.
+
+Feeds synthetic packets (text, telemetry, position, neighbor info and node
+info) through each stage of the receive pipelines against a throwaway
+database and a fake meshtastic interface, and reports throughput, p50/p99
+latency and memory per packet for every stage:
+
+    bbs.receive[PORTNUM]        message_processing.on_receive up to the dispatcher hand-off
+    bbs.job[TEXT_MESSAGE_APP]   the queued work for a text packet: log_message, command handler, reply
+    bbs.log_message             db_operations.log_message on its own
+    bbs.end_to_end[TEXT_MESSAGE_APP]  on_receive through the real worker pool until it drains
+    logger.on_receive[PORTNUM]  telemetry_logger.on_receive
+
+Memory is measured in a separate, smaller pass under tracemalloc so it
+doesn't skew the timings: peak_kib is the average peak allocation during
+one packet, retained_blocks the net number of memory blocks still held
+per packet afterwards.
+
+Results are written as JSON for comparing runs over time.
+
+Run from the bbs directory (it needs config.ini and messages.json; the
+database it writes to is a temporary copy, never shared/bulletins.db):
+    python benchmarks/bench_ingest.py [--packets N] [--nodes N] [--output results.json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+BBS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BBS_DIR)
+
+import db_operations  # noqa: E402
+import message_processing  # noqa: E402
+import telemetry_logger  # noqa: E402
+import utils  # noqa: E402
+from dispatcher import Dispatcher  # noqa: E402
+from meshtastic import BROADCAST_NUM  # noqa: E402
+
+PORTNUMS = ['TEXT_MESSAGE_APP', 'TELEMETRY_APP', 'POSITION_APP', 'NEIGHBORINFO_APP', 'NODEINFO_APP']
+
+# Messages users send to the BBS: menu options, quick commands and chatter
+TEXT_MESSAGES = ['m', 'b', 's', 'x', 'h', 'n', 'r', 'f', 'hello', 'cm', 'chl', 'w']
+
+HW_MODELS = ['HELTEC_V3', 'TBEAM', 'RAK4631', 'T_ECHO', 'STATION_G2']
+ROLES = ['CLIENT', 'CLIENT_MUTE', 'ROUTER', 'REPEATER']
+
+
+class FakeInterface:
+    """The parts of a meshtastic interface the BBS touches, with sendText recording instead of transmitting"""
+
+    def __init__(self, node_count, seed=0):
+        rng = random.Random(seed)
+        self.my_num = 0x10000000
+        self.myInfo = SimpleNamespace(my_node_num=self.my_num)
+        self.bbs_nodes = []
+        self.allowed_nodes = []
+        self.sync_channel_index = None
+        self.nodes = {}
+        self.nodesByNum = {}
+        self.sent = 0
+        for i in range(node_count + 1):
+            num = self.my_num + i
+            node_id = f"!{num:08x}"
+            node = {
+                'num': num,
+                'user': {'id': node_id, 'shortName': f"N{i:03d}"[:4], 'longName': f"Node {i}",
+                         'hwModel': rng.choice(HW_MODELS), 'role': rng.choice(ROLES)},
+                'position': {'latitude': 39.0 + rng.uniform(-0.5, 0.5), 'longitude': -84.5 + rng.uniform(-0.5, 0.5)},
+                'snr': round(rng.uniform(-20, 10), 2),
+                'lastHeard': int(time.time()) - rng.randint(0, 86400),
+            }
+            self.nodes[node_id] = node
+            self.nodesByNum[num] = node
+
+    def sendText(self, text, destinationId=None, wantAck=False, wantResponse=False, onResponse=None, channelIndex=0):
+        self.sent += 1
+        return SimpleNamespace(id=self.sent)
+
+    def getMyNodeInfo(self):
+        return self.nodesByNum[self.my_num]
+
+
+class PacketGenerator:
+    """Synthetic received packets in the dict form meshtastic publishes them"""
+
+    def __init__(self, interface, seed=0):
+        self.rng = random.Random(seed)
+        self.interface = interface
+        self.senders = [num for num in interface.nodesByNum if num != interface.my_num]
+        self.packet_id = 0
+
+    def base(self, portnum, to=BROADCAST_NUM):
+        rng = self.rng
+        sender = rng.choice(self.senders)
+        self.packet_id += 1
+        return {
+            'id': self.packet_id,
+            'from': sender,
+            'fromId': f"!{sender:08x}",
+            'to': to,
+            'rxTime': int(time.time()),
+            'rxSnr': round(rng.uniform(-20, 10), 2),
+            'rxRssi': rng.randint(-130, -40),
+            'hopLimit': rng.randint(0, 3),
+            'channel': 0,
+            'decoded': {'portnum': portnum},
+        }
+
+    def text(self):
+        # Mostly DMs to the BBS, some group chat
+        to = self.interface.my_num if self.rng.random() < 0.8 else BROADCAST_NUM
+        packet = self.base('TEXT_MESSAGE_APP', to=to)
+        message = self.rng.choice(TEXT_MESSAGES)
+        packet['decoded'].update(payload=message.encode('utf-8'), text=message)
+        return packet
+
+    def telemetry(self):
+        rng = self.rng
+        packet = self.base('TELEMETRY_APP')
+        packet['decoded']['telemetry'] = {
+            'time': packet['rxTime'],
+            'deviceMetrics': {'batteryLevel': rng.randint(1, 101), 'voltage': round(rng.uniform(3.3, 4.2), 3),
+                              'channelUtilization': round(rng.uniform(0, 40), 2),
+                              'airUtilTx': round(rng.uniform(0, 10), 2), 'uptimeSeconds': rng.randint(0, 10 ** 6)},
+            'environmentMetrics': {'temperature': round(rng.uniform(-10, 35), 1),
+                                   'relativeHumidity': round(rng.uniform(10, 90), 1),
+                                   'barometricPressure': round(rng.uniform(980, 1040), 1)},
+        }
+        return packet
+
+    def position(self):
+        rng = self.rng
+        packet = self.base('POSITION_APP')
+        lat, lon = 39.0 + rng.uniform(-0.5, 0.5), -84.5 + rng.uniform(-0.5, 0.5)
+        packet['decoded']['position'] = {
+            'latitudeI': int(lat * 1e7), 'longitudeI': int(lon * 1e7), 'latitude': lat, 'longitude': lon,
+            'altitude': rng.randint(150, 350), 'precisionBits': 32, 'groundSpeed': rng.randint(0, 30),
+            'groundTrack': rng.randint(0, 360), 'satsInView': rng.randint(4, 14), 'time': packet['rxTime'],
+        }
+        return packet
+
+    def neighborinfo(self):
+        rng = self.rng
+        packet = self.base('NEIGHBORINFO_APP')
+        neighbors = rng.sample(self.senders, min(len(self.senders), rng.randint(1, 8)))
+        packet['decoded']['neighborinfo'] = {
+            'nodeId': packet['from'],
+            'neighbors': [{'nodeId': num, 'snr': round(rng.uniform(-20, 10), 2),
+                           'lastHeard': packet['rxTime'] - rng.randint(0, 900)} for num in neighbors],
+        }
+        return packet
+
+    def nodeinfo(self):
+        packet = self.base('NODEINFO_APP')
+        node = self.interface.nodesByNum[packet['from']]
+        packet['decoded']['user'] = dict(node['user'])
+        return packet
+
+    def make(self, portnum):
+        return {
+            'TEXT_MESSAGE_APP': self.text,
+            'TELEMETRY_APP': self.telemetry,
+            'POSITION_APP': self.position,
+            'NEIGHBORINFO_APP': self.neighborinfo,
+            'NODEINFO_APP': self.nodeinfo,
+        }[portnum]()
+
+
+class CollectingDispatcher:
+    """Stands in for the worker pool so on_receive and the queued jobs can be timed separately"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, sender_id, job, timestamp=None):
+        self.jobs.append(job)
+        return True
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def time_stage(run, items, warmup):
+    """Latency of run(item) for each item after warmup calls; returns a result dict"""
+    for item in items[:warmup]:
+        run(item)
+    items = items[warmup:]
+    latencies = []
+    started = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter_ns()
+        run(item)
+        latencies.append(time.perf_counter_ns() - t0)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'packets': len(items),
+        'packets_per_sec': round(len(items) / elapsed, 1) if elapsed else None,
+        'p50_us': round(percentile(latencies, 0.50) / 1000, 1),
+        'p99_us': round(percentile(latencies, 0.99) / 1000, 1),
+        'max_us': round(latencies[-1] / 1000, 1),
+    }
+
+
+def measure_memory(run, items):
+    """(average peak KiB during one call, net memory blocks retained per call)"""
+    tracemalloc.start()
+    peaks = 0
+    blocks_before = sys.getallocatedblocks()
+    for item in items:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        run(item)
+        peaks += tracemalloc.get_traced_memory()[1] - base
+    retained = sys.getallocatedblocks() - blocks_before
+    tracemalloc.stop()
+    return round(peaks / len(items) / 1024, 2), round(retained / len(items), 2)
+
+
+def run_stage(name, run, make_items, count, warmup, memory_count, results):
+    result = time_stage(run, make_items(count + warmup), warmup)
+    result['peak_kib'], result['retained_blocks'] = measure_memory(run, make_items(memory_count))
+    results[name] = result
+    print(f"{name:<34} {result['packets_per_sec']:>10} {result['p50_us']:>9} {result['p99_us']:>9} "
+          f"{result['peak_kib']:>9} {result['retained_blocks']:>9}")
+
+
+def setup_database(path):
+    """Point the BBS and the telemetry logger at path and create every table they write to"""
+    db_operations.DB_PATH = path
+    telemetry_logger.DB_PATH = path
+    db_operations.initialize_database()
+
+    # telemetry_logs / position_logs / neighbor_info / node_info belong to the Observatory
+    sys.path.insert(0, os.path.join(os.path.dirname(BBS_DIR), 'observatory'))
+    import config
+    config.DATABASE_PATH = path
+    from modules.db import initialize_observatory_tables
+    initialize_observatory_tables()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--packets', type=int, default=2000, help="packets timed per stage")
+    parser.add_argument('--warmup', type=int, default=100)
+    parser.add_argument('--memory-packets', type=int, default=200, help="packets per stage in the tracemalloc pass")
+    parser.add_argument('--nodes', type=int, default=300, help="nodes in the fake interface")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='ingest_results.json')
+    parser.add_argument('--log', action='store_true', help="keep INFO logging (off by default; it dominates the timings)")
+    args = parser.parse_args()
+
+    if not args.log:
+        logging.disable(logging.INFO)
+
+    tmpdir = tempfile.TemporaryDirectory(prefix='bbs-bench-')
+    setup_database(os.path.join(tmpdir.name, 'bulletins.db'))
+
+    # Reply pacing is for the radio; the fake interface doesn't need it
+    utils.SEND_INTERVAL = 0
+
+    interface = FakeInterface(args.nodes, seed=args.seed)
+    packets = PacketGenerator(interface, seed=args.seed)
+    collector = CollectingDispatcher()
+    real_dispatcher = message_processing.dispatcher
+    message_processing.dispatcher = collector
+
+    results = {}
+    print(f"{'stage':<34} {'pkts/s':>10} {'p50 us':>9} {'p99 us':>9} {'peak KiB':>9} {'blocks':>9}")
+
+    for portnum in PORTNUMS:
+        run_stage(f"bbs.receive[{portnum}]", lambda packet: message_processing.on_receive(packet, interface),
+                  lambda n: [packets.make(portnum) for _ in range(n)],
+                  args.packets, args.warmup, args.memory_packets, results)
+        collector.jobs.clear()
+
+    def make_jobs(n):
+        collector.jobs.clear()
+        for _ in range(n):
+            message_processing.on_receive(packets.text(), interface)
+        jobs, collector.jobs = collector.jobs, []
+        return jobs
+
+    run_stage("bbs.job[TEXT_MESSAGE_APP]", lambda job: job(), make_jobs,
+              args.packets, args.warmup, args.memory_packets, results)
+
+    def log_one(packet):
+        db_operations.log_message(packet['fromId'], 'BENCH', packet['to'], packet['decoded']['text'], packet['rxTime'],
+                                  packet['channel'], packet['rxSnr'], packet['rxRssi'], packet['hopLimit'])
+
+    run_stage("bbs.log_message", log_one, lambda n: [packets.text() for _ in range(n)],
+              args.packets, args.warmup, args.memory_packets, results)
+
+    for portnum in PORTNUMS[1:]:
+        run_stage(f"logger.on_receive[{portnum}]", lambda packet: telemetry_logger.on_receive(packet, interface),
+                  lambda n: [packets.make(portnum) for _ in range(n)],
+                  args.packets, args.warmup, args.memory_packets, results)
+
+    # Whole text path through the real worker pool
+    message_processing.dispatcher = Dispatcher(max_pending=args.packets + 1)
+    burst = [packets.text() for _ in range(args.packets)]
+    started = time.perf_counter()
+    for packet in burst:
+        message_processing.on_receive(packet, interface)
+    while message_processing.dispatcher.stats()['pending']:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    message_processing.dispatcher.shutdown()
+    message_processing.dispatcher = real_dispatcher
+    results['bbs.end_to_end[TEXT_MESSAGE_APP]'] = {
+        'packets': len(burst),
+        'packets_per_sec': round(len(burst) / elapsed, 1),
+    }
+    print(f"{'bbs.end_to_end[TEXT_MESSAGE_APP]':<34} {results['bbs.end_to_end[TEXT_MESSAGE_APP]']['packets_per_sec']:>10}")
+
+    report = {
+        'benchmark': 'ingest',
+        'timestamp': int(time.time()),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'parameters': {'packets': args.packets, 'warmup': args.warmup, 'memory_packets': args.memory_packets,
+                       'nodes': args.nodes, 'seed': args.seed},
+        'stages': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,103 +1,36 @@
-import configparser
 import logging
-import random
+import math
 import time
-import requests
-import json
 
 from meshtastic import BROADCAST_NUM
 
 from db_operations import (
     add_bulletin, add_mail, delete_mail,
     get_bulletin_content, get_bulletins,
-    get_mail, get_mail_content,
+    get_mail, get_mail_content, get_mail_count,
     add_channel, get_channels, get_sender_id_by_mail_id
 )
+from content_bank import fortunes, trivia
+from delivery_tracker import MAIL_MAX_RETRIES
+from geo_index import geo
+from mesh_census import census
+from menu_cache import menus
 from utils import (
     get_node_id_from_num, get_node_info,
     get_node_short_name, send_message,
     update_user_state
 )
+from weather_service import WeatherNotFound, weather
 
-# Read the configuration for menu options
-config = configparser.ConfigParser()
-config.read('config.ini')
-
-main_menu_items = config['menu']['main_menu_items'].split(',')
-bbs_menu_items = config['menu']['bbs_menu_items'].split(',')
-utilities_menu_items = config['menu']['utilities_menu_items'].split(',')
-
-# Load messages from JSON
-def load_messages():
-    """Load BBS messages from messages.json"""
-    try:
-        with open('messages.json', 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        logging.error(f"Error loading messages.json: {e}")
-        return {}
-
-MESSAGES = load_messages()
-
-
-def build_menu(items, menu_name):
-    menu_str = f"{menu_name}\n"
-    labels = MESSAGES.get('menu_labels', {})
-
-    for item in items:
-        item = item.strip()
-        if item == 'W':
-            # Context-aware: Weather for main menu, Wall of Shame for utilities
-            if "Utilities" in menu_name or "🛠️" in menu_name:
-                menu_str += labels.get('wall_of_shame', '[W]all of Shame') + "\n"
-            else:
-                menu_str += labels.get('weather', '[W]eather') + "\n"
-        elif item == 'N':
-            menu_str += labels.get('network_info', '[N]etwork Info') + "\n"
-        elif item == 'Q':
-            if "BBS" in menu_name or "💾" in menu_name:
-                menu_str += labels.get('quote', '[Q]uote') + "\n"
-            else:
-                menu_str += labels.get('quick_commands', '[Q]uick Commands') + "\n"
-        elif item == 'R':
-            menu_str += labels.get('resources', '[R]esources') + "\n"
-        elif item == 'B':
-            menu_str += labels.get('bulletins', '[B]ulletins') + "\n"
-        elif item == 'U':
-            menu_str += labels.get('utilities', '[U]tilities') + "\n"
-        elif item == 'X':
-            menu_str += labels.get('exit', 'E[X]IT') + "\n"
-        elif item == 'M':
-            menu_str += labels.get('mail', '[M]ail') + "\n"
-        elif item == 'C':
-            menu_str += labels.get('channel_dir', '[C]hannel Dir') + "\n"
-        elif item == 'J':
-            menu_str += labels.get('js8call', '[J]S8CALL') + "\n"
-        elif item == 'S':
-            menu_str += labels.get('stats', '[S]tats') + "\n"
-        elif item == 'F':
-            menu_str += labels.get('fortune', '[F]ortune') + "\n"
-        elif item == 'G':
-            menu_str += labels.get('games', '[G]ames') + "\n"
-    return menu_str
 
 def handle_help_command(sender_id, interface, menu_name=None):
-    headers = MESSAGES.get('menu_headers', {})
-
     if menu_name:
         update_user_state(sender_id, {'command': 'MENU', 'menu': menu_name, 'step': 1})
-        if menu_name == 'bbs':
-            header = headers.get('bbs', '📰BBS Menu📰')
-            response = build_menu(bbs_menu_items, header)
-        elif menu_name == 'utilities':
-            header = headers.get('utilities', '🛠️Utilities Menu🛠️')
-            response = build_menu(utilities_menu_items, header)
+        response = menus.render(menu_name)
     else:
         update_user_state(sender_id, {'command': 'MAIN_MENU', 'step': 1})
-        mail = get_mail(get_node_id_from_num(sender_id, interface))
-        header_template = headers.get('main', '💾Wildcat TC² BBS💾 (✉️:{mail_count})')
-        header = header_template.format(mail_count=len(mail))
-        response = build_menu(main_menu_items, header)
+        mail_count = get_mail_count(get_node_id_from_num(sender_id, interface))
+        response = menus.render('main', mail_count=mail_count)
     send_message(response, sender_id, interface)
 
 def get_node_name(node_id, interface):
@@ -108,28 +41,18 @@ def get_node_name(node_id, interface):
 
 
 def handle_mail_command(sender_id, interface):
-    mail_msgs = MESSAGES.get('mail', {})
-    headers = MESSAGES.get('menu_headers', {})
-    header = headers.get('mail', '✉️Mail Menu✉️')
-    menu = mail_msgs.get('menu', 'What would you like to do with mail?\n[R]ead  [S]end E[X]IT')
-    response = f"{header}\n{menu}"
-    send_message(response, sender_id, interface)
+    send_message(menus.render('mail'), sender_id, interface)
     update_user_state(sender_id, {'command': 'MAIL', 'step': 1})
 
 
 
 def handle_bulletin_command(sender_id, interface):
-    bulletin_msgs = MESSAGES.get('bulletins', {})
-    headers = MESSAGES.get('menu_headers', {})
-    header = headers.get('bulletin', '📰Bulletin Menu📰')
-    menu = bulletin_msgs.get('menu', 'Which board would you like to enter?\n[G]eneral  [I]nfo  [N]ews  [U]rgent')
-    response = f"{header}\n{menu}"
-    send_message(response, sender_id, interface)
+    send_message(menus.render('bulletin'), sender_id, interface)
     update_user_state(sender_id, {'command': 'BULLETIN_MENU', 'step': 1})
 
 
 def handle_exit_command(sender_id, interface):
-    common = MESSAGES.get('common', {})
+    common = menus.messages.get('common', {})
     msg = common.get('help_prompt', "Type 'HELP' for a list of commands.")
     send_message(msg, sender_id, interface)
     update_user_state(sender_id, None)
@@ -148,12 +71,10 @@ def handle_stats_command(sender_id, interface):
 
 def handle_fortune_command(sender_id, interface):
     try:
-        with open('fortunes.txt', 'r') as file:
-            fortunes = file.readlines()
-        if not fortunes:
+        fortune = fortunes.draw(sender_id)
+        if fortune is None:
             send_message("No fortunes available.", sender_id, interface)
             return
-        fortune = random.choice(fortunes).strip()
         decorated_fortune = f"🔮 {fortune} 🔮"
         send_message(decorated_fortune, sender_id, interface)
     except Exception as e:
@@ -182,28 +103,21 @@ def handle_stats_steps(sender_id, message, step, interface):
 
             for period, seconds in timeframes.items():
                 if seconds is None:
-                    total_nodes = len(interface.nodes)
+                    total_nodes = len(census)
                 else:
-                    time_limit = current_time - seconds
-                    total_nodes = sum(1 for node in interface.nodes.values() if node.get('lastHeard') is not None and node['lastHeard'] >= time_limit)
+                    total_nodes = census.heard_since(current_time - seconds)
                 total_nodes_summary.append(f"- {period}: {total_nodes}")
 
             response = "Total nodes seen:\n" + "\n".join(total_nodes_summary)
             send_message(response, sender_id, interface)
             handle_stats_command(sender_id, interface)
         elif choice == 'h':
-            hw_models = {}
-            for node in interface.nodes.values():
-                hw_model = node['user'].get('hwModel', 'Unknown')
-                hw_models[hw_model] = hw_models.get(hw_model, 0) + 1
+            hw_models = census.hardware_counts()
             response = "Hardware Models:\n" + "\n".join([f"{model}: {count}" for model, count in hw_models.items()])
             send_message(response, sender_id, interface)
             handle_stats_command(sender_id, interface)
         elif choice == 'r':
-            roles = {}
-            for node in interface.nodes.values():
-                role = node['user'].get('role', 'Unknown')
-                roles[role] = roles.get(role, 0) + 1
+            roles = census.role_counts()
             response = "Roles:\n" + "\n".join([f"{role}: {count}" for role, count in roles.items()])
             send_message(response, sender_id, interface)
             handle_stats_command(sender_id, interface)
@@ -389,7 +303,7 @@ def handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes):
             send_message(f"Mail has been posted to the mailbox of {recipient_name}.\n(╯°□°)╯📨📬", sender_id, interface)
 
             notification_message = f"You have a new mail message from {sender_short_name}. Check your mailbox by responding to this message with CM."
-            send_message(notification_message, recipient_id, interface)
+            send_message(notification_message, recipient_id, interface, kind='mail', max_retries=MAIL_MAX_RETRIES)
 
             update_user_state(sender_id, None)
             update_user_state(sender_id, {'command': 'MAIL', 'step': 8})
@@ -495,7 +409,7 @@ def handle_send_mail_command(sender_id, message, interface, bbs_nodes):
         send_message(f"Mail has been sent to {recipient_name}.", sender_id, interface)
 
         notification_message = f"You have a new mail message from {sender_short_name}. Check your mailbox by responding to this message with CM."
-        send_message(notification_message, recipient_id, interface)
+        send_message(notification_message, recipient_id, interface, kind='mail', max_retries=MAIL_MAX_RETRIES)
 
     except Exception as e:
         logging.error(f"Error processing send mail command: {e}")
@@ -731,7 +645,7 @@ def handle_quick_help_command(sender_id, interface):
 
 def handle_network_info_command(sender_id, interface):
     """Network info menu"""
-    response = "📡Network Info📡\nWhat info would you like?\n[N]odes  [S]ignals  [M]esh Health  E[X]IT"
+    response = "📡Network Info📡\nWhat info would you like?\n[N]odes  [S]ignals  [M]esh Health  N[E]arby  E[X]IT"
     send_message(response, sender_id, interface)
     update_user_state(sender_id, {'command': 'NETWORK_INFO', 'step': 1})
 
@@ -744,21 +658,13 @@ def handle_network_info_steps(sender_id, message, step, state, interface):
 
     if choice == 'n':
         # Nodes online
-        nodes = interface.nodes
-        total_nodes = len(nodes)
+        total_nodes = len(census)
 
         response = f"📡 Mesh Network Status 📡\n\nTotal Nodes: {total_nodes}\n\nRecent Nodes:\n"
 
-        # Sort by last heard (most recent first)
-        sorted_nodes = sorted(nodes.items(),
-                            key=lambda x: x[1].get('lastHeard', 0) if isinstance(x[1], dict) else 0,
-                            reverse=True)
-
-        for i, (node_id, node_data) in enumerate(sorted_nodes[:10]):  # Show top 10
-            if isinstance(node_data, dict) and 'user' in node_data:
-                short_name = node_data['user'].get('shortName', 'UNK')
-                long_name = node_data['user'].get('longName', 'Unknown')
-                response += f"{i+1}. {short_name} - {long_name}\n"
+        # Most recently heard first
+        for i, node in enumerate(census.recent(10)):
+            response += f"{i+1}. {node.short_name} - {node.long_name}\n"
 
         if total_nodes > 10:
             response += f"\n...and {total_nodes - 10} more nodes"
@@ -770,20 +676,10 @@ def handle_network_info_steps(sender_id, message, step, state, interface):
         # Signal reports
         response = "📶 Signal Reports 📶\n\nRecent SNR readings:\n"
 
-        nodes = interface.nodes
-        signal_nodes = []
-
-        for node_id, node_data in nodes.items():
-            if isinstance(node_data, dict) and 'snr' in node_data:
-                short_name = node_data.get('user', {}).get('shortName', 'UNK')
-                snr = node_data.get('snr', 0)
-                signal_nodes.append((short_name, snr))
-
-        # Sort by SNR (best first)
-        signal_nodes.sort(key=lambda x: x[1], reverse=True)
-
-        for i, (name, snr) in enumerate(signal_nodes[:10]):
-            response += f"{name}: {snr:.1f} dB\n"
+        # Best first
+        signal_nodes = census.top_snr(10)
+        for node in signal_nodes:
+            response += f"{node.short_name}: {node.snr:.1f} dB\n"
 
         if not signal_nodes:
             response = "No signal data available yet."
@@ -793,32 +689,67 @@ def handle_network_info_steps(sender_id, message, step, state, interface):
 
     elif choice == 'm':
         # Mesh health
-        nodes = interface.nodes
-        total = len(nodes)
+        total = len(census)
 
         response = f"🏥 Mesh Health 🏥\n\n"
         response += f"Total Nodes: {total}\n"
 
-        # Count by hardware type
-        hw_types = {}
-        for node_id, node_data in nodes.items():
-            if isinstance(node_data, dict) and 'user' in node_data:
-                hw = node_data['user'].get('hwModel', 'UNKNOWN')
-                hw_types[hw] = hw_types.get(hw, 0) + 1
-
         response += f"\nHardware Types:\n"
-        for hw, count in sorted(hw_types.items(), key=lambda x: x[1], reverse=True)[:5]:
+        for hw, count in census.hardware_counts().most_common(5):
             response += f"{hw}: {count}\n"
 
         send_message(response, sender_id, interface)
         update_user_state(sender_id, None)
 
+    elif choice == 'e':
+        send_message("📍 Nearby Nodes 📍\nEnter a radius in miles, or N for the 10 nearest nodes:", sender_id, interface)
+        update_user_state(sender_id, {'command': 'NEARBY', 'step': 1})
+
     elif choice == 'x':
         handle_help_command(sender_id, interface)
     else:
         send_message("Invalid option. Please try again.", sender_id, interface)
 
 
+def handle_nearby_steps(sender_id, message, step, state, interface):
+    """List nodes near the user (or the BBS if the user has no position)"""
+    update_user_state(sender_id, None)
+
+    center = sender_id if geo.position(sender_id) else interface.myInfo.my_node_num
+    origin = geo.position(center)
+    if origin is None:
+        send_message("GPS position not available.", sender_id, interface)
+        return
+
+    choice = message.lower().strip()
+    if choice == 'n':
+        nearby = geo.nearest(*origin, k=10, exclude=center)
+        response = "📍 Nearest Nodes 📍\n\n"
+    else:
+        try:
+            radius = float(choice)
+        except ValueError:
+            radius = None
+        # float() also accepts "nan", "inf" and negative numbers
+        if radius is None or not (math.isfinite(radius) and radius > 0):
+            send_message("Invalid radius. Please enter a number of miles.", sender_id, interface)
+            return
+        nearby = geo.within(*origin, radius, exclude=center)
+        response = f"📍 {len(nearby)} node(s) within {radius:g} mi 📍\n\n"
+
+    if not nearby:
+        send_message("No nodes found nearby.", sender_id, interface)
+        return
+
+    for i, (node_num, dist) in enumerate(nearby[:10], 1):
+        name = interface.nodesByNum.get(node_num, {}).get('user', {}).get('shortName', 'UNK')
+        response += f"{i}. {name} - {dist:.1f} mi\n"
+    if len(nearby) > 10:
+        response += f"...and {len(nearby) - 10} more"
+
+    send_message(response, sender_id, interface)
+
+
 def handle_resources_command(sender_id, interface):
     """Resources menu"""
     response = "📚Resources📚\nWhat info do you need?\n[G]uide  [H]ardware  [L]inks  [A]I Guide  E[X]IT"
@@ -908,38 +839,20 @@ def handle_weather_steps(sender_id, message, step, state, interface):
             send_message("Invalid ZIP code. Please enter a 5-digit ZIP code.", sender_id, interface)
             return
 
-        try:
-            api_key = "b5f7bc717799c13af6c652a35002edd6"
-            country_code = "us"
-
-            # Get current weather
-            url = f"http://api.openweathermap.org/data/2.5/weather?zip={zip_code},{country_code}&appid={api_key}&units=imperial"
-            response = requests.get(url, timeout=5)
-
-            if response.status_code == 200:
-                data = response.json()
-
-                temp = data["main"]["temp"]
-                feels_like = data["main"]["feels_like"]
-                humidity = data["main"]["humidity"]
-                conditions = data["weather"][0]["description"].title()
-                city = data["name"]
-                state_code = data.get("sys", {}).get("country", "")
-
-                weather_msg = (f"☁️ {city} Weather ☁️\n\n"
-                              f"Temp: {temp:.0f}°F (feels {feels_like:.0f}°F)\n"
-                              f"Conditions: {conditions}\n"
-                              f"Humidity: {humidity}%")
-
+        def reply(report, error):
+            if report is not None:
+                weather_msg = (f"☁️ {report['city']} Weather ☁️\n\n"
+                               f"Temp: {report['temp']:.0f}°F (feels {report['feels_like']:.0f}°F)\n"
+                               f"Conditions: {report['conditions']}\n"
+                               f"Humidity: {report['humidity']}%")
                 send_message(weather_msg, sender_id, interface)
-            elif response.status_code == 404:
+            elif isinstance(error, WeatherNotFound):
                 send_message("ZIP code not found. Please try again.", sender_id, interface)
             else:
                 send_message("Unable to get weather at this time.", sender_id, interface)
 
-        except Exception as e:
-            logging.error(f"Error getting weather: {e}")
-            send_message("Weather service unavailable.", sender_id, interface)
+        # Answers from the cache right away, or from a background fetch
+        weather.lookup(zip_code, reply)
 
         update_user_state(sender_id, None)
 
@@ -949,18 +862,12 @@ def handle_weather_steps(sender_id, message, step, state, interface):
 def handle_trivia_command(sender_id, interface):
     """Start trivia game"""
     try:
-        with open('trivia.txt', 'r') as file:
-            questions = [line.strip() for line in file.readlines() if line.strip()]
-
-        if not questions:
+        entry = trivia.draw(sender_id)
+        if entry is None:
             send_message("No trivia questions available.", sender_id, interface)
             return
 
-        question_line = random.choice(questions)
-        parts = question_line.split('|')
-        question = parts[0]
-        answer = parts[1]
-        category = parts[2] if len(parts) > 2 else 'A'
+        question, answer, category = entry
 
         response = f"🎯 Meshtastic Trivia 🎯\n\n{question}\n\nReply with your answer!"
         send_message(response, sender_id, interface)
@@ -1051,26 +958,15 @@ def handle_propagation_steps(sender_id, message, step, state, interface):
 def handle_snr_leaderboard(sender_id, interface):
     """Show SNR leaderboard"""
     try:
-        # Collect SNR data from nodes
-        snr_data = []
-        for node_id, node_info in interface.nodes.items():
-            if 'snr' in node_info:
-                snr = node_info['snr']
-                name = node_info['user'].get('longName', 'Unknown')
-                short_name = node_info['user'].get('shortName', 'Unknown')
-                snr_data.append((snr, short_name, name))
-
+        # Top 10, best first
+        snr_data = census.top_snr(10)
         if not snr_data:
             send_message("No SNR data available yet.", sender_id, interface)
             return
 
-        # Sort by SNR (best first)
-        snr_data.sort(reverse=True, key=lambda x: x[0])
-
-        # Top 10
         response = "📶 SNR Leaderboard 📶\n\nBest Signals:\n"
-        for i, (snr, short, name) in enumerate(snr_data[:10], 1):
-            response += f"{i}. {short} - {snr:.1f} dB\n"
+        for i, node in enumerate(snr_data, 1):
+            response += f"{i}. {node.short_name} - {node.snr:.1f} dB\n"
 
         send_message(response, sender_id, interface)
     except Exception as e:
@@ -1081,56 +977,22 @@ def handle_snr_leaderboard(sender_id, interface):
 def handle_distance_records(sender_id, interface):
     """Show distance records"""
     try:
-        import math
-
         # Get our position
-        my_node = interface.nodes.get(interface.myInfo.my_node_num)
-        if not my_node or 'position' not in my_node:
+        my_num = interface.myInfo.my_node_num
+        origin = geo.position(my_num)
+        if origin is None:
             send_message("GPS position not available.", sender_id, interface)
             return
 
-        my_lat = my_node['position'].get('latitude')
-        my_lon = my_node['position'].get('longitude')
-
-        if my_lat is None or my_lon is None:
-            send_message("GPS position not available.", sender_id, interface)
-            return
-
-        # Calculate distances
-        distances = []
-        for node_id, node_info in interface.nodes.items():
-            if node_id == interface.myInfo.my_node_num:
-                continue
-
-            if 'position' in node_info:
-                lat = node_info['position'].get('latitude')
-                lon = node_info['position'].get('longitude')
-
-                if lat and lon:
-                    # Haversine formula
-                    R = 3959  # Earth radius in miles
-                    lat1, lon1 = math.radians(my_lat), math.radians(my_lon)
-                    lat2, lon2 = math.radians(lat), math.radians(lon)
-
-                    dlat = lat2 - lat1
-                    dlon = lon2 - lon1
-
-                    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-                    c = 2 * math.asin(math.sqrt(a))
-                    distance = R * c
-
-                    name = node_info['user'].get('shortName', 'Unknown')
-                    distances.append((distance, name))
-
-        if not distances:
+        # Farthest first, from one vectorized pass over the position index
+        farthest = geo.farthest(*origin, k=10, exclude=my_num)
+        if not farthest:
             send_message("No distance data available.", sender_id, interface)
             return
 
-        # Sort by distance (farthest first)
-        distances.sort(reverse=True)
-
         response = "🌍 Distance Records 🌍\n\nFarthest Nodes:\n"
-        for i, (dist, name) in enumerate(distances[:10], 1):
+        for i, (node_num, dist) in enumerate(farthest, 1):
+            name = interface.nodesByNum.get(node_num, {}).get('user', {}).get('shortName', 'Unknown')
             response += f"{i}. {name} - {dist:.1f} mi\n"
 
         send_message(response, sender_id, interface)
@@ -1175,27 +1037,18 @@ def handle_channel_activity(sender_id, interface):
 def handle_top_nodes(sender_id, interface):
     """Show most active nodes"""
     try:
-        # Sort by lastHeard to find most recently active
-        recent_nodes = []
+        # Most recently heard first
+        recent_nodes = census.recent(10)
         current_time = int(time.time())
 
-        for node_id, node_info in interface.nodes.items():
-            if 'lastHeard' in node_info:
-                last_heard = node_info['lastHeard']
-                minutes_ago = (current_time - last_heard) / 60
-                name = node_info['user'].get('shortName', 'Unknown')
-                snr = node_info.get('snr', 0)
-                recent_nodes.append((last_heard, name, snr, minutes_ago))
-
         if not recent_nodes:
             send_message("No activity data available.", sender_id, interface)
             return
 
-        # Sort by most recent
-        recent_nodes.sort(reverse=True)
-
         response = "⭐ Most Active Nodes ⭐\n\nRecent Activity:\n"
-        for i, (timestamp, name, snr, mins) in enumerate(recent_nodes[:10], 1):
+        for i, node in enumerate(recent_nodes, 1):
+            name = node.short_name
+            mins = (current_time - node.last_heard) / 60
             if mins < 1:
                 time_str = "Just now"
             elif mins < 60:
@@ -1291,10 +1144,13 @@ def handle_prop_node_input_steps(sender_id, message, step, state, interface):
         if stats['message_count'] > 0:
             response = (f"📊 {message.upper()} Reliability 📊\n\n"
                        f"Messages (7d): {stats['message_count']}\n"
-                       f"Avg SNR: {stats['avg_snr']:+.1f}dB\n"
+                       f"Avg SNR: {stats['avg_snr']:+.1f}dB (±{stats['snr_stddev']:.1f})\n"
                        f"Range: {stats['min_snr']:+.1f} to {stats['max_snr']:+.1f}dB\n"
-                       f"Avg RSSI: {stats['avg_rssi']:.0f}dBm\n\n"
-                       f"Signal Quality: {'Excellent' if stats['avg_snr'] > 5 else 'Good' if stats['avg_snr'] > 0 else 'Fair'}")
+                       f"Avg RSSI: {stats['avg_rssi']:.0f}dBm (±{stats['rssi_stddev']:.0f})\n")
+            if stats['loss_pct'] is not None:
+                response += (f"Telemetry: {stats['telemetry_received']}/{stats['telemetry_expected']} "
+                             f"(~{stats['loss_pct']:.0f}% lost)\n")
+            response += f"\nSignal Quality: {'Excellent' if stats['avg_snr'] > 5 else 'Good' if stats['avg_snr'] > 0 else 'Fair'}"
         else:
             response = f"No data for {message.upper()} in last 7 days."
     else:
@@ -91,6 +91,9 @@ def initialize_config(config_file: str = None) -> dict[str, Any]:
     hostname - host name for TCP interface
     port - serial port name for serial interface
     bbs_nodes - list of peer nodes to sync with
+    sync_channel_index - channel to broadcast sync messages on, or None to unicast to each peer
+    metrics_port - port to serve /metrics on, or None to not serve metrics
+    metrics_host - address the metrics listener binds to
 
     Args:
         config_file (str, optional): Path to config file. Function reads from './config.ini' if this arg is set to None. Defaults to None.
@@ -114,19 +117,31 @@ def initialize_config(config_file: str = None) -> dict[str, Any]:
 
     print(f"Configured to sync with the following BBS nodes: {bbs_nodes}")
 
+    sync_channel_index = config.getint('sync', 'channel_index', fallback=None)
+    if sync_channel_index is not None:
+        print(f"Broadcasting sync messages on channel {sync_channel_index}")
+
     allowed_nodes = config.get('allow_list', 'allowed_nodes', fallback='').split(',')
     if allowed_nodes == ['']:
         allowed_nodes = []
 
     print(f"Nodes with Urgent board permissions: {allowed_nodes}")
 
+    # A blank "port =" leaves metrics off
+    metrics_port = config.get('metrics', 'port', fallback='').strip()
+    metrics_port = int(metrics_port) if metrics_port else None
+    metrics_host = config.get('metrics', 'host', fallback='127.0.0.1')
+
     return {
         'config': config,
         'interface_type': interface_type,
         'hostname': hostname,
         'port': port,
         'bbs_nodes': bbs_nodes,
+        'sync_channel_index': sync_channel_index,
         'allowed_nodes': allowed_nodes,
+        'metrics_port': metrics_port,
+        'metrics_host': metrics_host,
         'mqtt_topic': 'meshtastic.receive'
     }
 
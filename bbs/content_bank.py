@@ -0,0 +1,126 @@
+"""
+In-memory content banks for trivia questions and fortunes.
+
+Each file is parsed once into a tuple and only re-read when its modification
+time changes (checked at most every CHECK_INTERVAL seconds, or right away when
+the Observatory reports an edit through an admin_events row). Every user draws
+from their own shuffled deck, so nobody sees a repeat until they have been
+through the whole bank.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+CHECK_INTERVAL = 60
+
+# Seconds between checks for admin events from the Observatory
+EVENT_POLL_INTERVAL = 2
+
+# Users whose decks are kept; the least recently used is dropped beyond this
+MAX_DECKS = 500
+
+
+class ContentBank:
+    def __init__(self, path, parse=None):
+        self.path = path
+        self.parse = parse or (lambda line: line)
+        self.items = ()
+        self.mtime = None
+        self.checked_at = 0
+        self.generation = 0
+        self.decks = OrderedDict()
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """Reload the file if its modification time changed"""
+        now = time.time()
+        if now - self.checked_at < CHECK_INTERVAL:
+            return
+        self.checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            logging.error(f"Content file {self.path} unavailable: {e}")
+            return
+        if mtime == self.mtime:
+            return
+
+        items = []
+        with open(self.path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                item = self.parse(line)
+                if item is not None:
+                    items.append(item)
+
+        with self.lock:
+            self.items = tuple(items)
+            self.mtime = mtime
+            self.generation += 1
+            # Old decks index into the previous content
+            self.decks.clear()
+        logging.info(f"Loaded {len(items)} entries from {self.path}")
+
+    def invalidate(self):
+        """Re-check the file on the next draw"""
+        self.checked_at = 0
+
+    def draw(self, user_id):
+        """Next entry from the user's deck, or None if the bank is empty"""
+        self.refresh()
+        with self.lock:
+            if not self.items:
+                return None
+            deck = self.decks.pop(user_id, None)
+            if not deck:
+                deck = array('I', range(len(self.items)))
+                random.shuffle(deck)
+            item = self.items[deck.pop()]
+            self.decks[user_id] = deck
+            while len(self.decks) > MAX_DECKS:
+                self.decks.popitem(last=False)
+            return item
+
+
+def parse_trivia(line):
+    """question|answer[|category] -> tuple, None for malformed lines"""
+    parts = line.split('|')
+    if len(parts) < 2:
+        return None
+    return parts[0], parts[1], parts[2] if len(parts) > 2 else 'A'
+
+
+trivia = ContentBank('trivia.txt', parse=parse_trivia)
+fortunes = ContentBank('fortunes.txt')
+
+# Names used by the Observatory when it reports an edit
+banks = {'trivia': trivia, 'fortunes': fortunes}
+
+last_event_id = None
+
+
+def poll_admin_events():
+    """Periodic task: reload content the Observatory reports as edited and
+    recount mail deleted with db_admin.py"""
+    global last_event_id
+    from db_operations import forget_mail_count, get_admin_events  # Import here to avoid circular import
+
+    events = get_admin_events(last_event_id or 0)
+    if last_event_id is None:
+        # Events from before startup are already reflected in the files
+        last_event_id = events[-1][0] if events else 0
+        return
+    for event_id, event, payload in events:
+        last_event_id = event_id
+        if event == 'content_updated' and payload in banks:
+            logging.info(f"{payload} edited from the Observatory, reloading")
+            banks[payload].invalidate()
+        elif event == 'mail_deleted' and payload:
+            forget_mail_count(payload)
@@ -1,12 +1,16 @@
 import os
 import sqlite3
 import threading
+import time
 
 thread_local = threading.local()
 
+# The database the BBS uses (db_operations.DB_PATH), wherever this is run from
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shared', 'bulletins.db')
+
 def get_db_connection():
     if not hasattr(thread_local, 'connection'):
-        thread_local.connection = sqlite3.connect('bulletins.db')
+        thread_local.connection = sqlite3.connect(DB_PATH)
     return thread_local.connection
 
 def initialize_database():
@@ -80,6 +84,33 @@ def list_channels():
     print_separator()
     return channels
 
+def tombstone(c, table, kind, row_id):
+    # Record the delete so sync reconciliation doesn't restore the row from a peer
+    c.execute('''CREATE TABLE IF NOT EXISTS sync_tombstones (
+                    unique_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    deleted_at INTEGER NOT NULL
+                )''')
+    c.execute(f"SELECT unique_id FROM {table} WHERE id = ?", (row_id,))
+    row = c.fetchone()
+    if row and row[0]:
+        c.execute("INSERT OR IGNORE INTO sync_tombstones (unique_id, kind, deleted_at) VALUES (?, ?, ?)",
+                  (row[0], kind, int(time.time())))
+
+def report_mail_deleted(c, mail_id):
+    # The running BBS caches mail counts per recipient; it polls admin_events and recounts this one
+    c.execute('''CREATE TABLE IF NOT EXISTS admin_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    event TEXT NOT NULL,
+                    payload TEXT,
+                    created_at INTEGER NOT NULL
+                )''')
+    c.execute("SELECT recipient FROM mail WHERE id = ?", (mail_id,))
+    row = c.fetchone()
+    if row:
+        c.execute("INSERT INTO admin_events (event, payload, created_at) VALUES (?, ?, ?)",
+                  ('mail_deleted', row[0], int(time.time())))
+
 def delete_bulletin():
     bulletins = list_bulletins()
     if bulletins:
@@ -91,6 +122,7 @@ def delete_bulletin():
         conn = get_db_connection()
         c = conn.cursor()
         for bulletin_id in bulletin_ids:
+            tombstone(c, 'bulletins', 'bulletin', bulletin_id.strip())
             c.execute("DELETE FROM bulletins WHERE id = ?", (bulletin_id.strip(),))
         conn.commit()
         print_bold(f"Bulletin(s) with ID(s) {', '.join(bulletin_ids)} deleted.")
@@ -107,6 +139,8 @@ def delete_mail():
         conn = get_db_connection()
         c = conn.cursor()
         for mail_id in mail_ids:
+            tombstone(c, 'mail', 'mail', mail_id.strip())
+            report_mail_deleted(c, mail_id.strip())
             c.execute("DELETE FROM mail WHERE id = ?", (mail_id.strip(),))
         conn.commit()
         print_bold(f"Mail with ID(s) {', '.join(mail_ids)} deleted.")
@@ -1,27 +1,51 @@
 import logging
+import math
 import os
 import sqlite3
+import statistics
 import threading
+import time
 import uuid
 from datetime import datetime
 
 from meshtastic import BROADCAST_NUM
 
+from metrics import registry
 from utils import (
     send_bulletin_to_bbs_nodes,
     send_delete_bulletin_to_bbs_nodes,
     send_delete_mail_to_bbs_nodes,
-    send_mail_to_bbs_nodes, send_message, send_channel_to_bbs_nodes
+    send_mail_to_bbs_nodes, send_broadcast, send_channel_to_bbs_nodes
 )
 
 
 thread_local = threading.local()
 
+# Database path - shared with Observatory
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'shared', 'bulletins.db')
+
+# Mail waiting per recipient, filled lazily from an indexed COUNT and kept
+# current by add_mail / delete_mail
+mail_counts = {}
+mail_counts_changes = 0
+mail_counts_lock = threading.Lock()
+
+# Strongest / weakest individual readings kept per day in signal_top_records
+SIGNAL_TOP_K = 10
+
+# Telemetry packets closer together than this are treated as duplicates when
+# estimating a node's telemetry interval
+MIN_TELEMETRY_GAP = 60
+
+# Raw JS8Call spots are kept this long; js8_spot_rollups keeps the summaries
+JS8_SPOT_RETENTION = 14 * 86400
+
+# message_logs rows updated per transaction by backfill_local_buckets
+BACKFILL_BATCH = 10000
+
 def get_db_connection():
-    # Database path - shared with Observatory
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'shared', 'bulletins.db')
     if not hasattr(thread_local, 'connection'):
-        thread_local.connection = sqlite3.connect(db_path)
+        thread_local.connection = sqlite3.connect(DB_PATH)
     return thread_local.connection
 
 def initialize_database():
@@ -61,11 +85,183 @@ def initialize_database():
                     message TEXT NOT NULL,
                     snr REAL,
                     rssi INTEGER,
-                    hop_limit INTEGER
+                    hop_limit INTEGER,
+                    local_hour INTEGER,
+                    day_bucket INTEGER
+                );''')
+    # Local hour of day and day (YYYYMMDD) are stored per row so the hourly /
+    # daily analyses group on plain columns; rows from before they existed are
+    # backfilled once
+    columns = [row[1] for row in c.execute("PRAGMA table_info(message_logs)")]
+    if 'local_hour' not in columns:
+        c.execute("ALTER TABLE message_logs ADD COLUMN local_hour INTEGER")
+    if 'day_bucket' not in columns:
+        c.execute("ALTER TABLE message_logs ADD COLUMN day_bucket INTEGER")
+    # Covering indexes: hour-of-day aggregates over a time window and per-day
+    # rollups are answered from the index alone
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_message_logs_hourly
+                 ON message_logs (timestamp, local_hour, channel_index, snr, rssi, sender_id)""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_message_logs_daily ON message_logs (day_bucket, sender_id, snr, rssi)")
+    backfill_local_buckets(conn)
+    c.execute('''CREATE TABLE IF NOT EXISTS delivery_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    packet_id INTEGER,
+                    destination TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    error_reason TEXT,
+                    attempt INTEGER NOT NULL,
+                    sent_at INTEGER NOT NULL,
+                    resolved_at INTEGER NOT NULL,
+                    latency_ms INTEGER
+                );''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_delivery_log_sent_at ON delivery_log (sent_at)")
+    c.execute('''CREATE TABLE IF NOT EXISTS sync_peers (
+                    node_id TEXT PRIMARY KEY,
+                    protocol_version INTEGER NOT NULL,
+                    updated_at INTEGER NOT NULL
+                );''')
+    # Sync may deliver the same bulletin / mail more than once; keep one row per
+    # unique_id and enforce it. Duplicates stored by older versions are dropped
+    # once, when the unique index is first created.
+    for table in ('bulletins', 'mail'):
+        c.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name = ?", (f'idx_{table}_unique_id',))
+        if c.fetchone() is None:
+            c.execute(f"DELETE FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY unique_id)")
+            c.execute(f"CREATE UNIQUE INDEX idx_{table}_unique_id ON {table} (unique_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_mail_recipient ON mail (recipient)")
+    c.execute('''CREATE TABLE IF NOT EXISTS user_sessions (
+                    user_id INTEGER PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    updated_at INTEGER NOT NULL
+                );''')
+    c.execute('''CREATE TABLE IF NOT EXISTS weather_cache (
+                    zip_code TEXT PRIMARY KEY,
+                    report TEXT NOT NULL,
+                    fetched_at INTEGER NOT NULL
+                );''')
+    c.execute('''CREATE TABLE IF NOT EXISTS admin_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    event TEXT NOT NULL,
+                    payload TEXT,
+                    created_at INTEGER NOT NULL
+                );''')
+    c.execute('''CREATE TABLE IF NOT EXISTS sync_tombstones (
+                    unique_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    deleted_at INTEGER NOT NULL
+                );''')
+    # Per-node, per-day best and worst SNR with the exact reading behind each,
+    # and the SIGNAL_TOP_K best / worst readings of each day, kept up to date by
+    # log_message. Built from message_logs the first time.
+    c.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'node_signal_records'")
+    backfill_signal_records = c.fetchone() is None
+    c.execute('''CREATE TABLE IF NOT EXISTS node_signal_records (
+                    sender_id TEXT NOT NULL,
+                    day_bucket INTEGER NOT NULL,
+                    sender_short_name TEXT,
+                    best_snr REAL NOT NULL,
+                    best_rssi INTEGER,
+                    best_at INTEGER NOT NULL,
+                    worst_snr REAL NOT NULL,
+                    worst_rssi INTEGER,
+                    worst_at INTEGER NOT NULL,
+                    PRIMARY KEY (sender_id, day_bucket)
+                );''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_node_signal_records_day ON node_signal_records (day_bucket)")
+    c.execute('''CREATE TABLE IF NOT EXISTS signal_top_records (
+                    day_bucket INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    sender_id TEXT NOT NULL,
+                    sender_short_name TEXT,
+                    snr REAL NOT NULL,
+                    rssi INTEGER,
+                    timestamp INTEGER NOT NULL
+                );''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_signal_top_records_day ON signal_top_records (day_bucket, kind, snr)")
+    if backfill_signal_records:
+        backfill_signal_tables(c)
+    # Per-node daily totals for reliability reports: message count, SNR / RSSI
+    # sums, sums of squares and extremes, and telemetry packet timing (written
+    # by telemetry_logger) to estimate how many packets went missing
+    c.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'node_daily_stats'")
+    backfill_daily_stats = c.fetchone() is None
+    c.execute('''CREATE TABLE IF NOT EXISTS node_daily_stats (
+                    sender_id TEXT NOT NULL,
+                    day_bucket INTEGER NOT NULL,
+                    msg_count INTEGER NOT NULL DEFAULT 0,
+                    snr_count INTEGER NOT NULL DEFAULT 0,
+                    snr_sum REAL NOT NULL DEFAULT 0,
+                    snr_sq_sum REAL NOT NULL DEFAULT 0,
+                    snr_min REAL,
+                    snr_max REAL,
+                    rssi_count INTEGER NOT NULL DEFAULT 0,
+                    rssi_sum REAL NOT NULL DEFAULT 0,
+                    rssi_sq_sum REAL NOT NULL DEFAULT 0,
+                    rssi_min INTEGER,
+                    rssi_max INTEGER,
+                    telemetry_count INTEGER NOT NULL DEFAULT 0,
+                    telemetry_first_at INTEGER,
+                    telemetry_last_at INTEGER,
+                    telemetry_min_gap INTEGER,
+                    PRIMARY KEY (sender_id, day_bucket)
+                );''')
+    if backfill_daily_stats:
+        backfill_node_daily_stats(c)
+
+    # Stations heard by JS8Call (RX.SPOT / RX.ACTIVITY / RX.CALL_ACTIVITY),
+    # written in batches by js8_spots.SpotWriter
+    c.execute('''CREATE TABLE IF NOT EXISTS js8_spots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    callsign TEXT,
+                    grid TEXT,
+                    snr INTEGER,
+                    dial_freq INTEGER,
+                    freq INTEGER,
+                    band TEXT,
+                    local_hour INTEGER,
+                    day_bucket INTEGER
+                );''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_js8_spots_timestamp ON js8_spots(timestamp)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_js8_spots_callsign ON js8_spots(callsign, timestamp)")
+    # RX.SPOT counts and SNR per local day / hour / band / 4-character grid square
+    c.execute('''CREATE TABLE IF NOT EXISTS js8_spot_rollups (
+                    day_bucket INTEGER NOT NULL,
+                    local_hour INTEGER NOT NULL,
+                    band TEXT NOT NULL,
+                    grid TEXT NOT NULL,
+                    spot_count INTEGER NOT NULL DEFAULT 0,
+                    snr_count INTEGER NOT NULL DEFAULT 0,
+                    snr_sum REAL NOT NULL DEFAULT 0,
+                    snr_min INTEGER,
+                    snr_max INTEGER,
+                    last_at INTEGER,
+                    PRIMARY KEY (day_bucket, local_hour, band, grid)
                 );''')
     conn.commit()
     print("Database schema initialized.")
 
+
+def backfill_signal_tables(c):
+    """Build node_signal_records and signal_top_records from message_logs"""
+    # With a single MIN()/MAX(), SQLite takes the bare columns from the row holding the extreme
+    c.execute("""INSERT INTO node_signal_records
+                 (sender_id, day_bucket, sender_short_name, best_snr, best_rssi, best_at, worst_snr, worst_rssi, worst_at)
+                 SELECT b.sender_id, b.day_bucket, b.sender_short_name, b.snr, b.rssi, b.timestamp, w.snr, w.rssi, w.timestamp
+                 FROM (SELECT sender_id, day_bucket, sender_short_name, MAX(snr) AS snr, rssi, timestamp
+                       FROM message_logs WHERE snr IS NOT NULL GROUP BY sender_id, day_bucket) b
+                 JOIN (SELECT sender_id, day_bucket, MIN(snr) AS snr, rssi, timestamp
+                       FROM message_logs WHERE snr IS NOT NULL GROUP BY sender_id, day_bucket) w
+                 USING (sender_id, day_bucket)""")
+    for kind, order in (('best', 'DESC'), ('worst', 'ASC')):
+        c.execute(f"""INSERT INTO signal_top_records (day_bucket, kind, sender_id, sender_short_name, snr, rssi, timestamp)
+                      SELECT day_bucket, ?, sender_id, sender_short_name, snr, rssi, timestamp FROM (
+                          SELECT *, ROW_NUMBER() OVER (PARTITION BY day_bucket ORDER BY snr {order}, timestamp) AS rank
+                          FROM message_logs WHERE snr IS NOT NULL)
+                      WHERE rank <= ?""", (kind, SIGNAL_TOP_K))
+
 def add_channel(name, url, bbs_nodes=None, interface=None):
     conn = get_db_connection()
     c = conn.cursor()
@@ -91,16 +287,19 @@ def add_bulletin(board, sender_short_name, subject, content, bbs_nodes, interfac
     if not unique_id:
         unique_id = str(uuid.uuid4())
     c.execute(
-        "INSERT INTO bulletins (board, sender_short_name, date, subject, content, unique_id) VALUES (?, ?, ?, ?, ?, ?)",
+        "INSERT OR IGNORE INTO bulletins (board, sender_short_name, date, subject, content, unique_id) VALUES (?, ?, ?, ?, ?, ?)",
         (board, sender_short_name, date, subject, content, unique_id))
     conn.commit()
+    if c.rowcount == 0:
+        logging.info(f"Bulletin {unique_id} already stored, ignoring duplicate")
+        return None
     if bbs_nodes and interface:
         send_bulletin_to_bbs_nodes(board, sender_short_name, subject, content, unique_id, bbs_nodes, interface)
 
     # New logic to send group chat notification for urgent bulletins
     if board.lower() == "urgent":
         notification_message = f"💥NEW URGENT BULLETIN💥\nFrom: {sender_short_name}\nTitle: {subject}\nDM 'CB,,Urgent' to view"
-        send_message(notification_message, BROADCAST_NUM, interface)
+        send_broadcast(notification_message, interface, dedup_key=f"urgent-bulletin:{unique_id}")
 
     return unique_id
 
@@ -118,12 +317,13 @@ def get_bulletin_content(bulletin_id):
     return c.fetchone()
 
 
-def delete_bulletin(bulletin_id, bbs_nodes, interface):
+def delete_bulletin(unique_id, bbs_nodes, interface):
     conn = get_db_connection()
     c = conn.cursor()
-    c.execute("DELETE FROM bulletins WHERE id = ?", (bulletin_id,))
+    c.execute("DELETE FROM bulletins WHERE unique_id = ?", (unique_id,))
+    add_tombstone(unique_id, 'bulletin')
     conn.commit()
-    send_delete_bulletin_to_bbs_nodes(bulletin_id, bbs_nodes, interface)
+    send_delete_bulletin_to_bbs_nodes(unique_id, bbs_nodes, interface)
 
 def add_mail(sender_id, sender_short_name, recipient_id, subject, content, bbs_nodes, interface, unique_id=None):
     conn = get_db_connection()
@@ -131,9 +331,13 @@ def add_mail(sender_id, sender_short_name, recipient_id, subject, content, bbs_n
     date = datetime.now().strftime('%Y-%m-%d %H:%M')
     if not unique_id:
         unique_id = str(uuid.uuid4())
-    c.execute("INSERT INTO mail (sender, sender_short_name, recipient, date, subject, content, unique_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+    c.execute("INSERT OR IGNORE INTO mail (sender, sender_short_name, recipient, date, subject, content, unique_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
               (sender_id, sender_short_name, recipient_id, date, subject, content, unique_id))
     conn.commit()
+    if c.rowcount == 0:
+        logging.info(f"Mail {unique_id} already stored, ignoring duplicate")
+        return None
+    adjust_mail_count(recipient_id, 1)
     if bbs_nodes and interface:
         send_mail_to_bbs_nodes(sender_id, sender_short_name, recipient_id, subject, content, unique_id, bbs_nodes, interface)
     return unique_id
@@ -144,6 +348,42 @@ def get_mail(recipient_id):
     c.execute("SELECT id, sender_short_name, subject, date, unique_id FROM mail WHERE recipient = ?", (recipient_id,))
     return c.fetchall()
 
+def get_mail_count(recipient_id):
+    """Number of mail messages waiting for a recipient"""
+    key = str(recipient_id)
+    with mail_counts_lock:
+        if key in mail_counts:
+            return mail_counts[key]
+        changes = mail_counts_changes
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT COUNT(*) FROM mail WHERE recipient = ?", (recipient_id,))
+    count = c.fetchone()[0]
+    with mail_counts_lock:
+        # Don't cache a count that mail added or deleted meanwhile may have made stale
+        if mail_counts_changes == changes:
+            mail_counts.setdefault(key, count)
+    return count
+
+
+def adjust_mail_count(recipient_id, delta):
+    # Only adjust counts that are cached; others are counted on first use
+    global mail_counts_changes
+    key = str(recipient_id)
+    with mail_counts_lock:
+        mail_counts_changes += 1
+        if key in mail_counts:
+            mail_counts[key] = max(0, mail_counts[key] + delta)
+
+
+def forget_mail_count(recipient_id):
+    # Mail deleted by another process (db_admin.py); the count is taken again on next use
+    global mail_counts_changes
+    with mail_counts_lock:
+        mail_counts_changes += 1
+        mail_counts.pop(str(recipient_id), None)
+
+
 def get_mail_content(mail_id, recipient_id):
     # TODO: ensure only recipient can read mail
     conn = get_db_connection()
@@ -159,11 +399,17 @@ def delete_mail(unique_id, recipient_id, bbs_nodes, interface):
         result = c.fetchone()
         if result is None:
             logging.error(f"No mail found with unique_id: {unique_id}")
+            # Still remember the delete so reconciliation doesn't bring the mail back
+            add_tombstone(unique_id, 'mail')
+            conn.commit()
             return  # Early exit if no matching mail found
         recipient_id = result[0]
         logging.info(f"Attempting to delete mail with unique_id: {unique_id} by {recipient_id}")
         c.execute("DELETE FROM mail WHERE unique_id = ? and recipient = ?", (unique_id, recipient_id,))
+        deleted = c.rowcount
+        add_tombstone(unique_id, 'mail')
         conn.commit()
+        adjust_mail_count(recipient_id, -deleted)
         send_delete_mail_to_bbs_nodes(unique_id, bbs_nodes, interface)
         logging.info(f"Mail with unique_id: {unique_id} deleted and sync message sent.")
     except Exception as e:
@@ -181,19 +427,339 @@ def get_sender_id_by_mail_id(mail_id):
     return None
 
 
+def local_buckets(timestamp):
+    """(local hour of day, local day as YYYYMMDD) for a unix timestamp"""
+    local = time.localtime(timestamp)
+    return local.tm_hour, local.tm_year * 10000 + local.tm_mon * 100 + local.tm_mday
+
+
+def backfill_local_buckets(conn, batch=BACKFILL_BATCH):
+    """Fill local_hour / day_bucket on message_logs rows logged before the columns existed.
+
+    The check for such rows is an idx_message_logs_daily lookup, so once the
+    backfill is done it costs nothing at startup. Rows are updated in rowid
+    ranges of batch per transaction, and an interrupted backfill resumes on
+    the next start.
+    """
+    c = conn.cursor()
+    start = c.execute("SELECT MIN(id) FROM message_logs WHERE day_bucket IS NULL").fetchone()[0]
+    if start is None:
+        return
+    end = c.execute("SELECT MAX(id) FROM message_logs").fetchone()[0]
+    logging.info(f"Backfilling local hour and day on message_logs rows {start}-{end}")
+    conn.commit()
+    while start <= end:
+        c.execute("""UPDATE message_logs SET
+                        local_hour = CAST(strftime('%H', timestamp, 'unixepoch', 'localtime') AS INTEGER),
+                        day_bucket = CAST(strftime('%Y%m%d', timestamp, 'unixepoch', 'localtime') AS INTEGER)
+                     WHERE id >= ? AND id < ? AND (local_hour IS NULL OR day_bucket IS NULL)""",
+                  (start, start + batch))
+        conn.commit()
+        start += batch
+
+
+def backfill_node_daily_stats(c):
+    """Build node_daily_stats from message_logs and telemetry_logs"""
+    c.execute("""INSERT INTO node_daily_stats
+                 (sender_id, day_bucket, msg_count, snr_count, snr_sum, snr_sq_sum, snr_min, snr_max,
+                  rssi_count, rssi_sum, rssi_sq_sum, rssi_min, rssi_max)
+                 SELECT sender_id, day_bucket, COUNT(*), COUNT(snr), TOTAL(snr), TOTAL(snr * snr), MIN(snr), MAX(snr),
+                        COUNT(rssi), TOTAL(rssi), TOTAL(rssi * rssi), MIN(rssi), MAX(rssi)
+                 FROM message_logs GROUP BY sender_id, day_bucket""")
+    c.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'telemetry_logs'")
+    if c.fetchone() is None:
+        return
+    c.execute(f"""INSERT INTO node_daily_stats
+                  (sender_id, day_bucket, telemetry_count, telemetry_first_at, telemetry_last_at, telemetry_min_gap)
+                  SELECT node_id, day, COUNT(*), MIN(timestamp), MAX(timestamp),
+                         MIN(CASE WHEN gap >= {MIN_TELEMETRY_GAP} THEN gap END)
+                  FROM (SELECT node_id, timestamp,
+                               CAST(strftime('%Y%m%d', timestamp, 'unixepoch', 'localtime') AS INTEGER) AS day,
+                               timestamp - LAG(timestamp) OVER (
+                                   PARTITION BY node_id, strftime('%Y%m%d', timestamp, 'unixepoch', 'localtime')
+                                   ORDER BY timestamp) AS gap
+                        FROM telemetry_logs)
+                  WHERE true
+                  GROUP BY node_id, day
+                  ON CONFLICT (sender_id, day_bucket) DO UPDATE SET
+                     telemetry_count = excluded.telemetry_count,
+                     telemetry_first_at = excluded.telemetry_first_at,
+                     telemetry_last_at = excluded.telemetry_last_at,
+                     telemetry_min_gap = excluded.telemetry_min_gap""")
+
+
+db_commit_seconds = registry.histogram('bbs_db_commit_seconds', "Time to commit a database write, by operation",
+                                       ['operation'])
+db_errors = registry.counter('bbs_db_errors_total', "Failed database writes, by operation", ['operation'])
+
+
 def log_message(sender_id, sender_short_name, to_id, message, timestamp, channel_index=0, snr=None, rssi=None, hop_limit=None):
     """Log a message to the database for analytics"""
     try:
+        local_hour, day_bucket = local_buckets(timestamp)
         conn = get_db_connection()
         c = conn.cursor()
         c.execute(
-            "INSERT INTO message_logs (timestamp, sender_id, sender_short_name, to_id, channel_index, message, snr, rssi, hop_limit) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (timestamp, sender_id, sender_short_name, to_id, channel_index, message, snr, rssi, hop_limit))
+            "INSERT INTO message_logs (timestamp, sender_id, sender_short_name, to_id, channel_index, message, snr, rssi, hop_limit, local_hour, day_bucket) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (timestamp, sender_id, sender_short_name, to_id, channel_index, message, snr, rssi, hop_limit, local_hour, day_bucket))
+        record_daily_stats(c, sender_id, snr, rssi, day_bucket)
+        if snr is not None:
+            record_signal(c, sender_id, sender_short_name, snr, rssi, timestamp, day_bucket)
+        started = time.perf_counter()
         conn.commit()
+        db_commit_seconds.observe(time.perf_counter() - started, 'log_message')
     except Exception as e:
+        db_errors.inc('log_message')
         logging.error(f"Error logging message: {e}")
 
 
+def record_daily_stats(c, sender_id, snr, rssi, day_bucket):
+    """Add one message to the sender's node_daily_stats row"""
+    has_snr, has_rssi = snr is not None, rssi is not None
+    c.execute("""INSERT INTO node_daily_stats
+                 (sender_id, day_bucket, msg_count, snr_count, snr_sum, snr_sq_sum, snr_min, snr_max,
+                  rssi_count, rssi_sum, rssi_sq_sum, rssi_min, rssi_max)
+                 VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                 ON CONFLICT (sender_id, day_bucket) DO UPDATE SET
+                    msg_count = msg_count + 1,
+                    snr_count = snr_count + excluded.snr_count,
+                    snr_sum = snr_sum + excluded.snr_sum,
+                    snr_sq_sum = snr_sq_sum + excluded.snr_sq_sum,
+                    snr_min = COALESCE(MIN(snr_min, excluded.snr_min), snr_min, excluded.snr_min),
+                    snr_max = COALESCE(MAX(snr_max, excluded.snr_max), snr_max, excluded.snr_max),
+                    rssi_count = rssi_count + excluded.rssi_count,
+                    rssi_sum = rssi_sum + excluded.rssi_sum,
+                    rssi_sq_sum = rssi_sq_sum + excluded.rssi_sq_sum,
+                    rssi_min = COALESCE(MIN(rssi_min, excluded.rssi_min), rssi_min, excluded.rssi_min),
+                    rssi_max = COALESCE(MAX(rssi_max, excluded.rssi_max), rssi_max, excluded.rssi_max)""",
+              (sender_id, day_bucket,
+               int(has_snr), snr if has_snr else 0, snr * snr if has_snr else 0, snr, snr,
+               int(has_rssi), rssi if has_rssi else 0, rssi * rssi if has_rssi else 0, rssi, rssi))
+
+
+def record_signal(c, sender_id, sender_short_name, snr, rssi, timestamp, day_bucket):
+    """Fold one reading into node_signal_records and signal_top_records"""
+    # SET expressions all see the row as it was before the update
+    c.execute("""INSERT INTO node_signal_records
+                 (sender_id, day_bucket, sender_short_name, best_snr, best_rssi, best_at, worst_snr, worst_rssi, worst_at)
+                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                 ON CONFLICT (sender_id, day_bucket) DO UPDATE SET
+                    sender_short_name = excluded.sender_short_name,
+                    best_rssi = CASE WHEN excluded.best_snr > best_snr THEN excluded.best_rssi ELSE best_rssi END,
+                    best_at = CASE WHEN excluded.best_snr > best_snr THEN excluded.best_at ELSE best_at END,
+                    best_snr = MAX(best_snr, excluded.best_snr),
+                    worst_rssi = CASE WHEN excluded.worst_snr < worst_snr THEN excluded.worst_rssi ELSE worst_rssi END,
+                    worst_at = CASE WHEN excluded.worst_snr < worst_snr THEN excluded.worst_at ELSE worst_at END,
+                    worst_snr = MIN(worst_snr, excluded.worst_snr)""",
+              (sender_id, day_bucket, sender_short_name, snr, rssi, timestamp, snr, rssi, timestamp))
+
+    for kind, weakest in (('best', 'ASC'), ('worst', 'DESC')):
+        c.execute(f"""SELECT rowid, snr, (SELECT COUNT(*) FROM signal_top_records WHERE day_bucket = ? AND kind = ?)
+                      FROM signal_top_records WHERE day_bucket = ? AND kind = ?
+                      ORDER BY snr {weakest}, timestamp DESC LIMIT 1""", (day_bucket, kind, day_bucket, kind))
+        row = c.fetchone()
+        if row and row[2] >= SIGNAL_TOP_K:
+            # Full; replace the weakest entry if this reading beats it
+            if (snr <= row[1]) if kind == 'best' else (snr >= row[1]):
+                continue
+            c.execute("DELETE FROM signal_top_records WHERE rowid = ?", (row[0],))
+        c.execute("INSERT INTO signal_top_records (day_bucket, kind, sender_id, sender_short_name, snr, rssi, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                  (day_bucket, kind, sender_id, sender_short_name, snr, rssi, timestamp))
+
+
+def window_start_day(days=7):
+    """First day_bucket of a window of whole local days ending today"""
+    return local_buckets(int(time.time()) - (days - 1) * 86400)[1]
+
+
+def log_delivery(packet_id, destination, kind, status, error_reason, attempt, sent_at, resolved_at, latency_ms):
+    """Record the delivery outcome of an outbound packet"""
+    # Store node numbers in the same !hex form used for node ids everywhere else
+    if isinstance(destination, int):
+        destination = '^all' if destination == BROADCAST_NUM else f"!{destination:08x}"
+    try:
+        conn = get_db_connection()
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO delivery_log (packet_id, destination, kind, status, error_reason, attempt, sent_at, resolved_at, latency_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (packet_id, destination, kind, status, error_reason, attempt, sent_at, resolved_at, latency_ms))
+        conn.commit()
+    except Exception as e:
+        logging.error(f"Error logging delivery: {e}")
+
+
+def log_js8_spots(spots):
+    """Insert a batch of (timestamp, kind, callsign, grid, snr, dial_freq, freq, band) spots
+    and fold them into js8_spot_rollups, in one transaction"""
+    rows = []
+    rollups = {}
+    for timestamp, kind, callsign, grid, snr, dial_freq, freq, band in spots:
+        local_hour, day_bucket = local_buckets(timestamp)
+        rows.append((timestamp, kind, callsign, grid, snr, dial_freq, freq, band, local_hour, day_bucket))
+
+        # JS8Call reports each decode as RX.ACTIVITY and, with a callsign, also as
+        # RX.SPOT, then again in RX.CALL_ACTIVITY; only the spot is counted
+        if kind != 'spot':
+            continue
+        key = (day_bucket, local_hour, band or '', (grid or '')[:4].upper())
+        count, snr_count, snr_sum, snr_min, snr_max, last_at = rollups.get(key, (0, 0, 0, None, None, timestamp))
+        if snr is not None:
+            snr_count += 1
+            snr_sum += snr
+            snr_min = snr if snr_min is None else min(snr_min, snr)
+            snr_max = snr if snr_max is None else max(snr_max, snr)
+        rollups[key] = (count + 1, snr_count, snr_sum, snr_min, snr_max, max(last_at, timestamp))
+
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.executemany(
+        "INSERT INTO js8_spots (timestamp, kind, callsign, grid, snr, dial_freq, freq, band, local_hour, day_bucket) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows)
+    c.executemany("""INSERT INTO js8_spot_rollups
+                     (day_bucket, local_hour, band, grid, spot_count, snr_count, snr_sum, snr_min, snr_max, last_at)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     ON CONFLICT (day_bucket, local_hour, band, grid) DO UPDATE SET
+                        spot_count = spot_count + excluded.spot_count,
+                        snr_count = snr_count + excluded.snr_count,
+                        snr_sum = snr_sum + excluded.snr_sum,
+                        snr_min = MIN(COALESCE(snr_min, excluded.snr_min), COALESCE(excluded.snr_min, snr_min)),
+                        snr_max = MAX(COALESCE(snr_max, excluded.snr_max), COALESCE(excluded.snr_max, snr_max)),
+                        last_at = MAX(last_at, excluded.last_at)""",
+                  [key + value for key, value in rollups.items()])
+    started = time.perf_counter()
+    conn.commit()
+    db_commit_seconds.observe(time.perf_counter() - started, 'js8_spots')
+
+
+def prune_js8_spots(max_age=JS8_SPOT_RETENTION):
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("DELETE FROM js8_spots WHERE timestamp < ?", (int(time.time()) - max_age,))
+    conn.commit()
+    return c.rowcount
+
+
+def get_sync_peer_versions():
+    """Get the last known sync protocol version of each peer BBS"""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT node_id, protocol_version FROM sync_peers")
+    return dict(c.fetchall())
+
+
+def save_sync_peer_version(node_id, version):
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("""
+        INSERT INTO sync_peers (node_id, protocol_version, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT(node_id) DO UPDATE SET protocol_version = excluded.protocol_version, updated_at = excluded.updated_at
+    """, (node_id, version, int(time.time())))
+    conn.commit()
+
+
+def save_user_session(user_id, state, updated_at):
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("INSERT OR REPLACE INTO user_sessions (user_id, state, updated_at) VALUES (?, ?, ?)",
+              (user_id, state, updated_at))
+    conn.commit()
+
+
+def get_user_sessions():
+    """Get (user_id, state json, updated_at) of every saved session, oldest first"""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT user_id, state, updated_at FROM user_sessions ORDER BY updated_at")
+    return c.fetchall()
+
+
+def delete_user_sessions(user_ids):
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.executemany("DELETE FROM user_sessions WHERE user_id = ?", [(user_id,) for user_id in user_ids])
+    conn.commit()
+
+
+def get_cached_weather(zip_code):
+    """Get (report json, fetched_at) for a ZIP code, or None"""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT report, fetched_at FROM weather_cache WHERE zip_code = ?", (zip_code,))
+    return c.fetchone()
+
+
+def save_cached_weather(zip_code, report, fetched_at):
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("INSERT OR REPLACE INTO weather_cache (zip_code, report, fetched_at) VALUES (?, ?, ?)",
+              (zip_code, report, fetched_at))
+    conn.commit()
+
+
+def get_admin_events(after_id):
+    """Get (id, event, payload) of events posted by the Observatory after after_id"""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT id, event, payload FROM admin_events WHERE id > ? ORDER BY id", (after_id,))
+    return c.fetchall()
+
+
+def add_tombstone(unique_id, kind):
+    """Remember a deleted bulletin / mail; the caller commits"""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("INSERT OR IGNORE INTO sync_tombstones (unique_id, kind, deleted_at) VALUES (?, ?, ?)",
+              (unique_id, kind, int(time.time())))
+
+
+def is_tombstoned(unique_id):
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM sync_tombstones WHERE unique_id = ?", (unique_id,))
+    return c.fetchone() is not None
+
+
+def get_tombstones():
+    """Get (unique_id, kind) for every remembered delete"""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT unique_id, kind FROM sync_tombstones")
+    return c.fetchall()
+
+
+def prune_tombstones(max_age):
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("DELETE FROM sync_tombstones WHERE deleted_at < ?", (int(time.time()) - max_age,))
+    conn.commit()
+    return c.rowcount
+
+
+def get_sync_inventory():
+    """Get (board, unique_id) for every bulletin and the unique_ids of all mail"""
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT board, unique_id FROM bulletins WHERE unique_id IS NOT NULL")
+    bulletins = c.fetchall()
+    c.execute("SELECT unique_id FROM mail WHERE unique_id IS NOT NULL")
+    mail = [row[0] for row in c.fetchall()]
+    return bulletins, mail
+
+
+def get_bulletin_by_unique_id(unique_id):
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT board, sender_short_name, subject, content FROM bulletins WHERE unique_id = ?", (unique_id,))
+    return c.fetchone()
+
+
+def get_mail_by_unique_id(unique_id):
+    conn = get_db_connection()
+    c = conn.cursor()
+    c.execute("SELECT sender, sender_short_name, recipient, subject, content FROM mail WHERE unique_id = ?", (unique_id,))
+    return c.fetchone()
+
+
 def get_channel_activity_stats(hours=24):
     """Get message count by channel for the last N hours"""
     try:
@@ -292,29 +858,31 @@ def get_best_worst_conditions():
     try:
         conn = get_db_connection()
         c = conn.cursor()
-        
-        # Best SNR in last 7 days
+        first_day = window_start_day(7)
+
+        # Best SNR per node in the last 7 days; the bare columns come from the
+        # day row holding the MAX, so the timestamp is that reading's
         c.execute("""
-            SELECT sender_short_name, MAX(snr) as best_snr, timestamp
-            FROM message_logs 
-            WHERE timestamp >= ? AND snr IS NOT NULL
+            SELECT sender_short_name, MAX(best_snr) as best_snr, best_at
+            FROM node_signal_records
+            WHERE day_bucket >= ?
             GROUP BY sender_id
             ORDER BY best_snr DESC
             LIMIT 10
-        """, (int(__import__('time').time()) - 604800,))
+        """, (first_day,))
         best = c.fetchall()
-        
+
         # Worst SNR
         c.execute("""
-            SELECT sender_short_name, MIN(snr) as worst_snr, timestamp
-            FROM message_logs 
-            WHERE timestamp >= ? AND snr IS NOT NULL
+            SELECT sender_short_name, MIN(worst_snr) as worst_snr, worst_at
+            FROM node_signal_records
+            WHERE day_bucket >= ?
             GROUP BY sender_id
             ORDER BY worst_snr ASC
             LIMIT 10
-        """, (int(__import__('time').time()) - 604800,))
+        """, (first_day,))
         worst = c.fetchall()
-        
+
         return {'best': best, 'worst': worst}
     except Exception as e:
         logging.error(f"Error getting best/worst conditions: {e}")
@@ -330,14 +898,14 @@ def get_hourly_propagation_stats():
         # Group by hour of day over last 7 days
         c.execute("""
             SELECT 
-                strftime('%H', datetime(timestamp, 'unixepoch', 'localtime')) as hour,
+                local_hour as hour,
                 AVG(snr) as avg_snr,
                 AVG(rssi) as avg_rssi,
                 COUNT(*) as msg_count
             FROM message_logs 
             WHERE timestamp >= ? AND snr IS NOT NULL
-            GROUP BY hour
-            ORDER BY hour ASC
+            GROUP BY local_hour
+            ORDER BY local_hour ASC
         """, (int(__import__('time').time()) - 604800,))
         
         return c.fetchall()
@@ -346,26 +914,62 @@ def get_hourly_propagation_stats():
         return []
 
 
-def get_node_reliability(node_id):
-    """Calculate reliability metrics for a specific node"""
+def get_node_reliability(node_id, days=7):
+    """Calculate reliability metrics for a specific node from its daily summaries"""
     try:
         conn = get_db_connection()
         c = conn.cursor()
-        
-        # Messages received in last 7 days
+
         c.execute("""
-            SELECT COUNT(*), AVG(snr), MIN(snr), MAX(snr), AVG(rssi)
-            FROM message_logs 
-            WHERE sender_id = ? AND timestamp >= ?
-        """, (node_id, int(__import__('time').time()) - 604800))
-        
-        stats = c.fetchone()
+            SELECT msg_count, snr_count, snr_sum, snr_sq_sum, snr_min, snr_max,
+                   rssi_count, rssi_sum, rssi_sq_sum, telemetry_count, telemetry_first_at,
+                   telemetry_last_at, telemetry_min_gap
+            FROM node_daily_stats
+            WHERE sender_id = ? AND day_bucket >= ?
+        """, (node_id, window_start_day(days)))
+        rows = c.fetchall()
+
+        def mean_and_stddev(count, total, squares):
+            if not count:
+                return 0, 0
+            mean = total / count
+            return mean, math.sqrt(max(squares / count - mean * mean, 0))
+
+        snr_count = sum(row[1] for row in rows)
+        rssi_count = sum(row[6] for row in rows)
+        avg_snr, snr_stddev = mean_and_stddev(snr_count, sum(row[2] for row in rows), sum(row[3] for row in rows))
+        avg_rssi, rssi_stddev = mean_and_stddev(rssi_count, sum(row[7] for row in rows), sum(row[8] for row in rows))
+
+        # A day's shortest gap between telemetry packets approximates the node's
+        # reporting interval; a day spanning first..last should then hold
+        # span / interval + 1 packets. The median of the daily gaps is a floor,
+        # so one short gap (a reboot, two telemetry types back to back) only
+        # skews its own day and not by much.
+        gaps = [row[12] for row in rows if row[12]]
+        received = sum(row[9] for row in rows)
+        expected = None
+        loss_pct = None
+        if gaps:
+            typical = statistics.median(gaps)
+            expected = 0
+            for row in rows:
+                if not row[9]:
+                    continue
+                interval = max(row[12] or typical, typical)
+                expected += max((row[11] - row[10]) // interval + 1, row[9])
+            loss_pct = max(0.0, (1 - received / expected) * 100)
+
         return {
-            'message_count': stats[0],
-            'avg_snr': stats[1] if stats[1] else 0,
-            'min_snr': stats[2] if stats[2] else 0,
-            'max_snr': stats[3] if stats[3] else 0,
-            'avg_rssi': stats[4] if stats[4] else 0
+            'message_count': sum(row[0] for row in rows),
+            'avg_snr': avg_snr,
+            'snr_stddev': snr_stddev,
+            'min_snr': min((row[4] for row in rows if row[4] is not None), default=0),
+            'max_snr': max((row[5] for row in rows if row[5] is not None), default=0),
+            'avg_rssi': avg_rssi,
+            'rssi_stddev': rssi_stddev,
+            'telemetry_received': received,
+            'telemetry_expected': expected,
+            'loss_pct': loss_pct
         }
     except Exception as e:
         logging.error(f"Error getting node reliability: {e}")
@@ -0,0 +1,193 @@
+"""
+Outbound delivery ledger.
+
+Every packet the BBS sends with wantAck=True is registered here by its packet
+id. Meshtastic reports the routing outcome through the onResponse callback; the
+ledger turns that into an ack / implicit ack / nak, and anything that never
+gets an answer is expired as a timeout by the periodic sweep. Failed sends
+that asked for retries are queued and resent from the sweep with a linear
+backoff.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+from metrics import registry
+
+# How long to wait for a routing response before calling a packet lost.
+# The firmware gives up on its own retransmissions well before this.
+ACK_TIMEOUT = 60
+
+# Delay before an app-level resend, multiplied by the attempt number
+RETRY_BACKOFF = 30
+
+# Retry budgets used by the callers in utils / command_handlers
+SYNC_MAX_RETRIES = 3
+MAIL_MAX_RETRIES = 2
+
+# After this many failures in a row a destination is treated as unreachable
+# and failed packets to it are no longer retried (first attempts still go out)
+UNREACHABLE_THRESHOLD = 5
+
+# Number of round-trip samples kept per destination
+LATENCY_SAMPLES = 50
+
+
+class DeliveryLedger:
+    def __init__(self, timeout=ACK_TIMEOUT):
+        self.timeout = timeout
+        self.pending = {}
+        self.retry_queue = []
+        self.destinations = {}
+        self.my_node_num = None
+        self.lock = threading.Lock()
+
+    def _destination_stats(self, destination):
+        stats = self.destinations.get(destination)
+        if stats is None:
+            stats = {
+                'sent': 0, 'ack': 0, 'implicit_ack': 0, 'nak': 0, 'timeout': 0,
+                'retries': 0, 'consecutive_failures': 0,
+                'latencies': deque(maxlen=LATENCY_SAMPLES)
+            }
+            self.destinations[destination] = stats
+        return stats
+
+    def track(self, packet_id, destination, resend=None, kind='reply', max_retries=0, attempt=1):
+        """Register a packet that was just handed to the radio"""
+        if packet_id is None:
+            return
+        with self.lock:
+            self.pending[packet_id] = {
+                'packet_id': packet_id,
+                'destination': destination,
+                'kind': kind,
+                'attempt': attempt,
+                'max_retries': max_retries,
+                'resend': resend,
+                'sent_at': time.time()
+            }
+            stats = self._destination_stats(destination)
+            stats['sent'] += 1
+            if attempt > 1:
+                stats['retries'] += 1
+
+    def record_response(self, packet):
+        """Resolve a pending packet from a ROUTING_APP response"""
+        decoded = packet.get('decoded', {})
+        packet_id = decoded.get('requestId')
+        error_reason = decoded.get('routing', {}).get('errorReason', 'NONE')
+
+        if error_reason != 'NONE':
+            status = 'nak'
+        elif self.my_node_num is not None and packet.get('from') == self.my_node_num:
+            # Our own radio heard a rebroadcast, not the destination
+            status = 'implicit_ack'
+        else:
+            status = 'ack'
+
+        self.resolve(packet_id, status, error_reason if status == 'nak' else None)
+
+    def resolve(self, packet_id, status, error_reason=None):
+        with self.lock:
+            entry = self.pending.pop(packet_id, None)
+            if entry is None:
+                logging.debug(f"Delivery response for unknown packet {packet_id}")
+                return
+
+            now = time.time()
+            latency = now - entry['sent_at']
+            stats = self._destination_stats(entry['destination'])
+            stats[status] += 1
+
+            if status in ('ack', 'implicit_ack'):
+                stats['consecutive_failures'] = 0
+                stats['latencies'].append(latency)
+            else:
+                stats['consecutive_failures'] += 1
+                if self._should_retry(entry, stats):
+                    entry['retry_at'] = now + RETRY_BACKOFF * entry['attempt']
+                    self.retry_queue.append(entry)
+
+        logging.info(f"Delivery of packet {packet_id} to {entry['destination']}: {status}"
+                     f"{f' ({error_reason})' if error_reason else ''} after {latency:.1f}s")
+
+        try:
+            from db_operations import log_delivery  # Import here to avoid circular import
+            log_delivery(packet_id, entry['destination'], entry['kind'], status, error_reason,
+                         entry['attempt'], int(entry['sent_at']), int(now),
+                         int(latency * 1000) if status != 'timeout' else None)
+        except Exception as e:
+            logging.warning(f"Failed to log delivery outcome: {e}")
+
+    def _should_retry(self, entry, stats):
+        if entry['resend'] is None or entry['attempt'] > entry['max_retries']:
+            return False
+        if stats['consecutive_failures'] >= UNREACHABLE_THRESHOLD:
+            logging.info(f"Not retrying packet {entry['packet_id']}: {entry['destination']} looks unreachable")
+            return False
+        return True
+
+    def sweep(self):
+        """Expire packets that never got a response and run due retries"""
+        now = time.time()
+        with self.lock:
+            expired = [packet_id for packet_id, entry in self.pending.items()
+                       if now - entry['sent_at'] > self.timeout]
+        for packet_id in expired:
+            self.resolve(packet_id, 'timeout')
+
+        with self.lock:
+            due = [entry for entry in self.retry_queue if entry['retry_at'] <= now]
+            self.retry_queue = [entry for entry in self.retry_queue if entry['retry_at'] > now]
+
+        for entry in due:
+            logging.info(f"Retrying {entry['kind']} packet to {entry['destination']} "
+                         f"(attempt {entry['attempt'] + 1} of {entry['max_retries'] + 1})")
+            try:
+                entry['resend'](entry['attempt'] + 1)
+            except Exception as e:
+                logging.error(f"Error resending packet to {entry['destination']}: {e}")
+
+    def is_reachable(self, destination):
+        with self.lock:
+            stats = self.destinations.get(destination)
+            return stats is None or stats['consecutive_failures'] < UNREACHABLE_THRESHOLD
+
+    def delivery_stats(self):
+        """Per-destination delivery rate and round-trip latency"""
+        with self.lock:
+            result = {}
+            for destination, stats in self.destinations.items():
+                resolved = stats['ack'] + stats['implicit_ack'] + stats['nak'] + stats['timeout']
+                latencies = sorted(stats['latencies'])
+                result[destination] = {
+                    'sent': stats['sent'],
+                    'ack': stats['ack'],
+                    'implicit_ack': stats['implicit_ack'],
+                    'nak': stats['nak'],
+                    'timeout': stats['timeout'],
+                    'retries': stats['retries'],
+                    'delivery_rate': (stats['ack'] + stats['implicit_ack']) / resolved if resolved else None,
+                    'rtt_avg': sum(latencies) / len(latencies) if latencies else None,
+                    'rtt_p50': latencies[len(latencies) // 2] if latencies else None
+                }
+            return result
+
+
+ledger = DeliveryLedger()
+
+registry.gauge('bbs_delivery_pending', "Sent packets waiting for an ack", function=lambda: len(ledger.pending))
+registry.gauge('bbs_delivery_retry_queue', "Unacknowledged packets waiting to be resent",
+               function=lambda: len(ledger.retry_queue))
+
+
+def onAckNak(packet):
+    """onResponse callback for sendText.
+
+    Meshtastic only hands plain ACKs (not just NAKs and replies) to a response
+    handler whose function is named onAckNak, hence the name.
+    """
+    ledger.record_response(packet)
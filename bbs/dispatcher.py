@@ -0,0 +1,94 @@
+"""
+Worker pool for incoming messages.
+
+The meshtastic receive callback only decodes a packet and hands the work to
+the dispatcher, so a slow handler (database analytics, a weather lookup, a
+long multi-packet reply) no longer holds up the packet reader or other users.
+Jobs are queued per sender and each sender's queue is drained by at most one
+worker at a time, one job per turn, so one user's messages are still handled
+strictly in the order they arrived and a busy sender can't starve the rest.
+
+The request a job belongs to is available to the code it runs through
+current_request, instead of being stored on the shared interface object.
+"""
+
+import contextvars
+import logging
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import registry
+
+MAX_WORKERS = 4
+
+# Jobs waiting across all senders; new messages are dropped beyond this
+MAX_PENDING = 500
+
+RequestContext = namedtuple('RequestContext', ['sender_id', 'timestamp'])
+
+# Context of the message being handled on this thread, None outside a job
+current_request = contextvars.ContextVar('current_request', default=None)
+
+
+class Dispatcher:
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dispatch')
+        self.max_pending = max_pending
+        # sender -> deque of (context, job); a sender is present while a worker owns its queue
+        self.queues = {}
+        self.pending = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def submit(self, sender_id, job, timestamp=None):
+        """Queue job() to run after earlier jobs from the same sender; False if dropped"""
+        context = RequestContext(sender_id, timestamp)
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                logging.warning(f"Dispatcher backlog full, dropping message from {sender_id}")
+                return False
+            self.pending += 1
+            queue = self.queues.get(sender_id)
+            if queue is not None:
+                # A worker is already draining this sender's queue
+                queue.append((context, job))
+                return True
+            self.queues[sender_id] = deque([(context, job)])
+        self.executor.submit(self._drain, sender_id)
+        return True
+
+    def _drain(self, sender_id):
+        """Run the sender's next job, then requeue the sender behind everyone else if it has more"""
+        with self.lock:
+            context, job = self.queues[sender_id].popleft()
+        token = current_request.set(context)
+        try:
+            job()
+        except Exception as e:
+            logging.error(f"Error handling message from {sender_id}: {e}")
+        finally:
+            current_request.reset(token)
+            with self.lock:
+                self.pending -= 1
+                more = bool(self.queues[sender_id])
+                if not more:
+                    del self.queues[sender_id]
+        if more:
+            self.executor.submit(self._drain, sender_id)
+
+    def stats(self):
+        with self.lock:
+            return {'pending': self.pending, 'active_senders': len(self.queues), 'dropped': self.dropped}
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+dispatcher = Dispatcher()
+
+registry.gauge('bbs_dispatch_pending', "Messages queued or running on the worker pool",
+               function=lambda: dispatcher.pending)
+registry.counter('bbs_dispatch_dropped_total', "Messages dropped because the worker pool backlog was full",
+                 function=lambda: dispatcher.dropped)
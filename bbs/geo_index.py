@@ -0,0 +1,244 @@
+"""
+Node positions for the location commands.
+
+Positions are kept in NumPy arrays (radians) indexed by slot, so distances
+from one point to every known node come out of a single vectorized haversine
+pass. A grid of CELL_DEGREES x CELL_DEGREES cells maps each cell to the slots
+inside it; radius queries only look at the cells overlapping the search box,
+and nearest-neighbour queries widen the radius until enough nodes are found.
+
+The index is filled from interface.nodes at startup and kept current from
+POSITION_APP packets.
+"""
+
+import logging
+import math
+import threading
+
+import numpy as np
+
+EARTH_RADIUS_MILES = 3959
+
+# Grid cell size; 0.25 degrees of latitude is about 17 miles
+CELL_DEGREES = 0.25
+LON_CELLS = int(360 / CELL_DEGREES)
+
+# Starting radius for nearest-neighbour searches, doubled until enough nodes are found
+NEAREST_START_MILES = 10
+NEAREST_MAX_MILES = 1000
+
+INITIAL_CAPACITY = 256
+
+
+def haversine_miles(lat, lon, lats, lons):
+    """Distances in miles from (lat, lon) to the arrays lats/lons, all in radians"""
+    dlat = lats - lat
+    dlon = lons - lon
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def cell_of(lat, lon):
+    """Grid cell for a position in degrees"""
+    return int(math.floor((lat + 90) / CELL_DEGREES)), int(math.floor((lon + 180) / CELL_DEGREES)) % LON_CELLS
+
+
+def position_from(position):
+    """(lat, lon) in degrees from a meshtastic position dict, or None"""
+    if not position:
+        return None
+    lat = position.get('latitude')
+    lon = position.get('longitude')
+    if lat is None and position.get('latitudeI') is not None:
+        lat = position['latitudeI'] * 1e-7
+    if lon is None and position.get('longitudeI') is not None:
+        lon = position['longitudeI'] * 1e-7
+    # 0,0 is what nodes without a fix report
+    if not lat or not lon:
+        return None
+    return lat, lon
+
+
+class GeoIndex:
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.lats = np.zeros(capacity)
+        self.lons = np.zeros(capacity)
+        self.node_nums = np.zeros(capacity, dtype=np.int64)
+        self.count = 0
+        # node_num -> slot, and the grid cell each node is filed under
+        self.slots = {}
+        self.cells = {}
+        self.grid = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        capacity = len(self.lats) * 2
+        for name in ('lats', 'lons', 'node_nums'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def _file(self, node_num, cell):
+        old_cell = self.cells.get(node_num)
+        if old_cell == cell:
+            return
+        if old_cell is not None:
+            members = self.grid[old_cell]
+            members.discard(node_num)
+            if not members:
+                del self.grid[old_cell]
+        self.cells[node_num] = cell
+        self.grid.setdefault(cell, set()).add(node_num)
+
+    def update(self, node_num, lat, lon):
+        """Add or move a node; lat/lon in degrees"""
+        with self.lock:
+            slot = self.slots.get(node_num)
+            if slot is None:
+                if self.count == len(self.lats):
+                    self._grow()
+                slot = self.count
+                self.count += 1
+                self.slots[node_num] = slot
+                self.node_nums[slot] = node_num
+            self.lats[slot] = math.radians(lat)
+            self.lons[slot] = math.radians(lon)
+            self._file(node_num, cell_of(lat, lon))
+
+    def remove(self, node_num):
+        with self.lock:
+            slot = self.slots.pop(node_num, None)
+            if slot is None:
+                return
+            # Move the last node into the freed slot
+            last = self.count - 1
+            if slot != last:
+                moved = int(self.node_nums[last])
+                self.lats[slot] = self.lats[last]
+                self.lons[slot] = self.lons[last]
+                self.node_nums[slot] = moved
+                self.slots[moved] = slot
+            self.count = last
+            cell = self.cells.pop(node_num)
+            self.grid[cell].discard(node_num)
+            if not self.grid[cell]:
+                del self.grid[cell]
+
+    def position(self, node_num):
+        """(lat, lon) in degrees, or None if the node has no known position"""
+        with self.lock:
+            slot = self.slots.get(node_num)
+            if slot is None:
+                return None
+            return math.degrees(self.lats[slot]), math.degrees(self.lons[slot])
+
+    def load_nodes(self, nodes):
+        """Index every node in an interface.nodes style dict that has a position"""
+        loaded = 0
+        for node in list(nodes.values()):
+            if not isinstance(node, dict) or 'num' not in node:
+                continue
+            position = position_from(node.get('position'))
+            if position:
+                self.update(node['num'], *position)
+                loaded += 1
+        return loaded
+
+    def update_from_packet(self, packet):
+        """Index the position in a POSITION_APP packet"""
+        position = position_from(packet.get('decoded', {}).get('position'))
+        if position and 'from' in packet:
+            self.update(packet['from'], *position)
+
+    def distances(self, lat, lon):
+        """(node_nums, distances in miles) from a point to every indexed node"""
+        with self.lock:
+            lats = self.lats[:self.count].copy()
+            lons = self.lons[:self.count].copy()
+            node_nums = self.node_nums[:self.count].copy()
+        return node_nums, haversine_miles(math.radians(lat), math.radians(lon), lats, lons)
+
+    def _candidate_slots(self, lat, lon, radius):
+        """Slots of nodes in the grid cells overlapping the box around a circle"""
+        dlat = radius / 69.0
+        lat_low = cell_of(max(lat - dlat, -90), 0)[0]
+        lat_high = cell_of(min(lat + dlat, 90), 0)[0]
+        widest = abs(lat) + dlat
+        lon_cells = None
+        if widest < 89:
+            span = int(radius / (69.0 * math.cos(math.radians(widest))) / CELL_DEGREES) + 1
+            if 2 * span + 1 < LON_CELLS:
+                lon_cell = cell_of(lat, lon)[1]
+                lon_cells = {(lon_cell + i) % LON_CELLS for i in range(-span, span + 1)}
+
+        box_cells = (lat_high - lat_low + 1) * (len(lon_cells) if lon_cells else LON_CELLS)
+        if box_cells > len(self.grid):
+            # Fewer occupied cells than cells in the box; walk those instead
+            cells = [cell for cell in self.grid
+                     if lat_low <= cell[0] <= lat_high and (lon_cells is None or cell[1] in lon_cells)]
+        else:
+            cells = [(lat_cell, lon_cell) for lat_cell in range(lat_low, lat_high + 1)
+                     for lon_cell in (lon_cells or range(LON_CELLS))]
+        return [self.slots[n] for cell in cells for n in self.grid.get(cell, ())]
+
+    def within(self, lat, lon, radius, exclude=None):
+        """[(node_num, miles)] of nodes within radius miles of a point, nearest first"""
+        with self.lock:
+            slots = np.array(self._candidate_slots(lat, lon, radius), dtype=np.int64)
+            lats = self.lats[slots]
+            lons = self.lons[slots]
+            node_nums = self.node_nums[slots]
+        if not len(slots):
+            return []
+        dist = haversine_miles(math.radians(lat), math.radians(lon), lats, lons)
+        keep = dist <= radius
+        if exclude is not None:
+            keep &= node_nums != exclude
+        order = np.argsort(dist[keep], kind='stable')
+        return list(zip(node_nums[keep][order].tolist(), dist[keep][order].tolist()))
+
+    def nearest(self, lat, lon, k=10, exclude=None):
+        """[(node_num, miles)] of the k nodes closest to a point, nearest first"""
+        radius = NEAREST_START_MILES
+        while radius <= NEAREST_MAX_MILES:
+            found = self.within(lat, lon, radius, exclude=exclude)
+            if len(found) >= k:
+                return found[:k]
+            radius *= 2
+        # Sparse mesh; rank everything in one pass
+        node_nums, dist = self.distances(lat, lon)
+        if exclude is not None:
+            keep = node_nums != exclude
+            node_nums, dist = node_nums[keep], dist[keep]
+        if len(dist) > k:
+            top = np.argpartition(dist, k)[:k]
+            node_nums, dist = node_nums[top], dist[top]
+        order = np.argsort(dist, kind='stable')
+        return list(zip(node_nums[order].tolist(), dist[order].tolist()))
+
+    def farthest(self, lat, lon, k=10, exclude=None):
+        """[(node_num, miles)] of the k nodes farthest from a point, farthest first"""
+        node_nums, dist = self.distances(lat, lon)
+        if exclude is not None:
+            keep = node_nums != exclude
+            node_nums, dist = node_nums[keep], dist[keep]
+        if len(dist) > k:
+            top = np.argpartition(-dist, k)[:k]
+            node_nums, dist = node_nums[top], dist[top]
+        order = np.argsort(-dist, kind='stable')
+        return list(zip(node_nums[order].tolist(), dist[order].tolist()))
+
+
+geo = GeoIndex()
+
+
+def on_position(packet, interface):
+    """Receive hook for POSITION_APP packets"""
+    try:
+        geo.update_from_packet(packet)
+    except Exception as e:
+        logging.warning(f"Error indexing position packet: {e}")
@@ -0,0 +1,195 @@
+"""
+HF spots from JS8Call.
+
+RX.SPOT, RX.ACTIVITY and RX.CALL_ACTIVITY frames report the stations JS8Call
+hears: callsign (when known), grid, SNR and frequency. They are parsed into
+spot tuples here and handed to the SpotWriter, which queues them in memory
+and writes them to js8_spots / js8_spot_rollups in batches from its own
+thread, so a busy band costs one transaction every few seconds instead of one
+per frame and the JS8Call reader never waits on the database.
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+from db_operations import log_js8_spots, prune_js8_spots
+from metrics import registry
+
+SPOT_TYPES = ('RX.SPOT', 'RX.ACTIVITY', 'RX.CALL_ACTIVITY')
+
+# Flush when this many spots are queued, or every FLUSH_INTERVAL seconds
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 5
+
+# Spots queued beyond this (database unavailable) are dropped
+MAX_PENDING = 20000
+
+PRUNE_INTERVAL = 3600
+
+# Calls from RX.CALL_ACTIVITY are remembered this long to skip repeats
+CALL_HEARD_TTL = 6 * 3600
+
+# Amateur bands by dial frequency, in Hz
+BANDS = [
+    (1800000, 2000000, '160m'),
+    (3500000, 4000000, '80m'),
+    (5330000, 5410000, '60m'),
+    (7000000, 7300000, '40m'),
+    (10100000, 10150000, '30m'),
+    (14000000, 14350000, '20m'),
+    (18068000, 18168000, '17m'),
+    (21000000, 21450000, '15m'),
+    (24890000, 24990000, '12m'),
+    (28000000, 29700000, '10m'),
+    (50000000, 54000000, '6m'),
+    (144000000, 148000000, '2m'),
+]
+
+# "KN4CRD: @HB HEARTBEAT EM73" - the callsign leading an activity line
+ACTIVITY_CALLSIGN = re.compile(r'^\s*([A-Z0-9]+(?:/[A-Z0-9]+)*):')
+
+
+def band_of(freq):
+    """Band name for a frequency in Hz, or None outside the amateur bands"""
+    if not freq:
+        return None
+    for low, high, band in BANDS:
+        if low <= freq <= high:
+            return band
+    return None
+
+
+def spot_time(utc_ms):
+    """Unix time from a JS8Call UTC field (milliseconds), defaulting to now"""
+    try:
+        return int(utc_ms) // 1000 if utc_ms else int(time.time())
+    except (TypeError, ValueError):
+        return int(time.time())
+
+
+def clean_grid(grid):
+    grid = (grid or '').strip().upper()
+    return grid or None
+
+
+def parse_spots(typ, value, params):
+    """Spot tuples (timestamp, kind, callsign, grid, snr, dial_freq, freq, band) from one API frame"""
+    if typ == 'RX.CALL_ACTIVITY':
+        # params maps each callsign heard to {GRID, SNR, UTC}
+        spots = []
+        for callsign, activity in params.items():
+            if callsign.startswith('_') or not isinstance(activity, dict):
+                continue
+            spots.append((spot_time(activity.get('UTC')), 'call', callsign, clean_grid(activity.get('GRID')),
+                           activity.get('SNR'), None, None, None))
+        return spots
+
+    dial = params.get('DIAL')
+    freq = params.get('FREQ')
+    if typ == 'RX.SPOT':
+        callsign = params.get('CALL')
+        kind = 'spot'
+    else:
+        match = ACTIVITY_CALLSIGN.match(value or '')
+        callsign = match.group(1) if match else None
+        kind = 'activity'
+    return [(spot_time(params.get('UTC')), kind, callsign or None, clean_grid(params.get('GRID')),
+             params.get('SNR'), dial, freq, band_of(dial or freq))]
+
+
+class SpotWriter:
+    def __init__(self, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = []
+        # RX.CALL_ACTIVITY repeats the whole call list; callsign -> time of the entry already queued
+        self.call_heard = {}
+        self.written = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.last_prune = 0
+
+    def add(self, spots):
+        with self.lock:
+            for spot in spots:
+                if spot[1] == 'call':
+                    if self.call_heard.get(spot[2]) == spot[0]:
+                        continue
+                    self.call_heard[spot[2]] = spot[0]
+                if len(self.pending) >= self.max_pending:
+                    self.dropped += 1
+                    continue
+                self.pending.append(spot)
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.wake.set()
+
+    def flush(self):
+        """Write everything queued; returns the number of spots written"""
+        cutoff = time.time() - CALL_HEARD_TTL
+        with self.lock:
+            batch, self.pending = self.pending, []
+            self.call_heard = {callsign: heard_at for callsign, heard_at in self.call_heard.items()
+                               if heard_at >= cutoff}
+        if not batch:
+            return 0
+        try:
+            log_js8_spots(batch)
+        except sqlite3.Error as e:
+            logging.error(f"Error writing {len(batch)} JS8Call spots: {e}")
+            # Put them back in front of anything that arrived meanwhile
+            with self.lock:
+                kept = batch[:max(self.max_pending - len(self.pending), 0)]
+                self.pending[:0] = kept
+                self.dropped += len(batch) - len(kept)
+            return 0
+        with self.lock:
+            self.written += len(batch)
+        return len(batch)
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+            if time.time() - self.last_prune > PRUNE_INTERVAL:
+                self.last_prune = time.time()
+                try:
+                    prune_js8_spots()
+                except sqlite3.Error as e:
+                    logging.error(f"Error pruning JS8Call spots: {e}")
+        self.flush()
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name='js8-spot-writer', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+            self.thread = None
+
+    def stats(self):
+        with self.lock:
+            return {'pending': len(self.pending), 'written': self.written, 'dropped': self.dropped}
+
+
+spot_writer = SpotWriter()
+
+registry.gauge('bbs_js8_spots_pending', "JS8Call spots waiting to be written", function=lambda: len(spot_writer.pending))
+registry.counter('bbs_js8_spots_written_total', "JS8Call spots written to the database",
+                 function=lambda: spot_writer.written)
+registry.counter('bbs_js8_spots_dropped_total', "JS8Call spots dropped because too many were queued",
+                 function=lambda: spot_writer.dropped)
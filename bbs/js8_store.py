@@ -0,0 +1,155 @@
+"""
+Storage for messages received from JS8Call.
+
+One JS8MessageStore owns the connection to the configured db_file and is
+shared by the JS8Call client, which writes from its reader thread, and the
+JS8Call menu, which reads from the dispatcher workers. Listings are read
+newest first one page at a time, continuing from the last row shown, and each
+page is cut to what fits in a single mesh packet.
+"""
+
+import sqlite3
+import threading
+
+from sync_transfer import MAX_PACKET_SIZE
+
+# Rows read per page; the page is then trimmed to MAX_PACKET_SIZE
+PAGE_SIZE = 10
+
+TABLES = ('messages', 'groups', 'urgent')
+
+MORE_PROMPT = "\n[M]ore E[X]IT"
+
+
+class JS8MessageStore:
+    def __init__(self):
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def open(self, db_file):
+        """Open db_file and create the tables and indexes; returns the connection"""
+        with self.lock:
+            if self.conn:
+                self.conn.close()
+            self.conn = sqlite3.connect(db_file, check_same_thread=False)
+            with self.conn:
+                self.conn.execute("PRAGMA journal_mode=WAL")
+                self.conn.execute('''
+                    CREATE TABLE IF NOT EXISTS messages (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        sender TEXT,
+                        receiver TEXT,
+                        message TEXT,
+                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                self.conn.execute('''
+                    CREATE TABLE IF NOT EXISTS groups (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        sender TEXT,
+                        groupname TEXT,
+                        message TEXT,
+                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                self.conn.execute('''
+                    CREATE TABLE IF NOT EXISTS urgent (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        sender TEXT,
+                        groupname TEXT,
+                        message TEXT,
+                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                self.conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp)')
+                self.conn.execute('CREATE INDEX IF NOT EXISTS idx_groups_groupname ON groups(groupname, timestamp)')
+                self.conn.execute('CREATE INDEX IF NOT EXISTS idx_groups_timestamp ON groups(timestamp)')
+                self.conn.execute('CREATE INDEX IF NOT EXISTS idx_urgent_timestamp ON urgent(timestamp)')
+            return self.conn
+
+    def close(self):
+        with self.lock:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+
+    def insert(self, table, sender, recipient, message):
+        """Save a message; recipient is the receiver for 'messages' and the group name otherwise"""
+        if table not in TABLES:
+            raise ValueError(f"Unknown JS8Call table {table}")
+        column = 'receiver' if table == 'messages' else 'groupname'
+        with self.lock:
+            if not self.conn:
+                raise sqlite3.OperationalError("JS8Call database is not open")
+            with self.conn:
+                self.conn.execute(f"INSERT INTO {table} (sender, {column}, message) VALUES (?, ?, ?)",
+                                  (sender, recipient, message))
+
+    def _query(self, sql, params):
+        with self.lock:
+            if not self.conn:
+                return []
+            return self.conn.execute(sql, params).fetchall()
+
+    def groups(self):
+        """[(groupname, message count)] with the most recently active group first"""
+        return self._query('''
+            SELECT groupname, COUNT(*) FROM groups
+            GROUP BY groupname
+            ORDER BY MAX(timestamp) DESC
+        ''', ())
+
+    def page(self, table, before=None, groupname=None, limit=PAGE_SIZE):
+        """Up to limit rows of (id, sender, receiver or group, message, timestamp), newest first.
+
+        before is the (timestamp, id) of the last row already shown; the page
+        continues from just after it.
+        """
+        if table not in TABLES:
+            raise ValueError(f"Unknown JS8Call table {table}")
+        column = 'receiver' if table == 'messages' else 'groupname'
+        where, params = [], []
+        if groupname is not None:
+            where.append('groupname = ?')
+            params.append(groupname)
+        if before is not None:
+            where.append('(timestamp, id) < (?, ?)')
+            params.extend(before)
+        sql = f"SELECT id, sender, {column}, message, timestamp FROM {table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit)
+        return self._query(sql, params)
+
+
+store = JS8MessageStore()
+
+
+def fit_listing(header, rows, format_row, more=False, budget=MAX_PACKET_SIZE):
+    """Build a reply from header and as many rows as fit in one packet.
+
+    Returns (text, rows shown). MORE_PROMPT is appended, and room kept for it,
+    when rows were left out or more says there are further rows after these;
+    a single row too long to fit on its own is shortened rather than dropped.
+    """
+    text = header
+    shown = 0
+    for i, row in enumerate(rows):
+        line = "\n" + format_row(row)
+        room = budget - len(text) - (len(MORE_PROMPT) if more or i + 1 < len(rows) else 0)
+        if len(line) > room:
+            if shown:
+                break
+            room = budget - len(text) - len(MORE_PROMPT)
+            line = line[:max(room - 1, 0)] + "…"
+        text += line
+        shown += 1
+    if more or shown < len(rows):
+        text += MORE_PROMPT
+    return text, shown
+
+
+def short_time(timestamp):
+    """'MM-DD HH:MM' from a SQLite CURRENT_TIMESTAMP value"""
+    return timestamp[5:16] if timestamp and len(timestamp) >= 16 else (timestamp or '')
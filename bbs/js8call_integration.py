@@ -1,17 +1,33 @@
-from socket import socket, AF_INET, SOCK_STREAM
+import socket
+import selectors
+import threading
 import json
 import time
 import sqlite3
 import configparser
 import logging
 
-from meshtastic import BROADCAST_NUM
-
 from command_handlers import handle_help_command
-from utils import send_message, update_user_state
+from js8_spots import SPOT_TYPES, parse_spots, spot_writer
+from js8_store import PAGE_SIZE, fit_listing, short_time, store
+from utils import send_broadcast, send_message, update_user_state
 
 config_file = 'config.ini'
 
+# Reconnect delay doubles from RECONNECT_MIN up to RECONNECT_MAX seconds
+RECONNECT_MIN = 1
+RECONNECT_MAX = 300
+CONNECT_TIMEOUT = 10
+
+# A STATION.GET_STATUS is sent after this many idle seconds; the connection is
+# considered dead when nothing has arrived for HEARTBEAT_TIMEOUT seconds
+HEARTBEAT_INTERVAL = 60
+HEARTBEAT_TIMEOUT = 3 * HEARTBEAT_INTERVAL
+
+RECV_SIZE = 65536
+# Longest API frame accepted before the buffer is discarded
+MAX_FRAME_SIZE = 1024 * 1024
+
 def from_message(content):
     try:
         return json.loads(content)
@@ -40,6 +56,7 @@ class JS8CallClient:
         self.db_file = self.config.get('js8call', 'db_file', fallback=None)
         self.js8groups = self.config.get('js8call', 'js8groups', fallback='').split(',')
         self.store_messages = self.config.getboolean('js8call', 'store_messages', fallback=True)
+        self.store_spots = self.config.getboolean('js8call', 'store_spots', fallback=True)
         self.js8urgent = self.config.get('js8call', 'js8urgent', fallback='').split(',')
         self.js8groups = [group.strip() for group in self.js8groups]
         self.js8urgent = [group.strip() for group in self.js8urgent]
@@ -48,47 +65,21 @@ class JS8CallClient:
         self.sock = None
         self.db_conn = None
         self.interface = interface
+        self.thread = None
+        self.stopping = threading.Event()
+        self.send_lock = threading.Lock()
+        # Received bytes not yet split into frames, and the chunk recv() fills
+        self.buffer = bytearray()
+        self.chunk = bytearray(RECV_SIZE)
+        self.last_received = 0
+        self.last_sent = 0
 
         if self.db_file:
-            self.db_conn = sqlite3.connect(self.db_file)
-            self.create_tables()
+            self.db_conn = store.open(self.db_file)
+            self.logger.info("Database tables created or verified.")
         else:
             self.logger.info("JS8Call configuration not found. Skipping JS8Call integration.")
 
-    def create_tables(self):
-        if not self.db_conn:
-            return
-
-        with self.db_conn:
-            self.db_conn.execute('''
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sender TEXT,
-                    receiver TEXT,
-                    message TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            self.db_conn.execute('''
-                CREATE TABLE IF NOT EXISTS groups (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sender TEXT,
-                    groupname TEXT,
-                    message TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            self.db_conn.execute('''
-                CREATE TABLE IF NOT EXISTS urgent (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sender TEXT,
-                    groupname TEXT,
-                    message TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-        self.logger.info("Database tables created or verified.")
-
     def insert_message(self, table, sender, recipient, message):
         """
         Inserts a message into the specified table in the database.
@@ -112,9 +103,9 @@ class JS8CallClient:
 
         Example Usage:
         --------------
-        client.insert_message('messages', sender='CALLSIGN1', receiver_or_group='CALLSIGN2', message='This is a message.')
-        client.insert_message('groups', sender='CALLSIGN1', receiver_or_group='GroupName', message='This is a group message.')
-        client.insert_message('urgent', sender='CALLSIGN1', receiver_or_group='UrgentGroupName', message='This is an urgent message.')
+        client.insert_message('messages', sender='CALLSIGN1', recipient='CALLSIGN2', message='This is a message.')
+        client.insert_message('groups', sender='CALLSIGN1', recipient='GroupName', message='This is a group message.')
+        client.insert_message('urgent', sender='CALLSIGN1', recipient='UrgentGroupName', message='This is an urgent message.')
         """
 
         if not self.db_conn:
@@ -122,11 +113,7 @@ class JS8CallClient:
             return
 
         try:
-            with self.db_conn:
-                self.db_conn.execute(f'''
-                    INSERT INTO {table} (sender, { 'receiver' if table == 'messages' else 'groupname' }, message)
-                    VALUES (?, ?, ?)
-                ''', (sender, receiver_or_group, message))
+            store.insert(table, sender, recipient, message)
         except sqlite3.Error as e:
             self.logger.error(f"Failed to insert message into {table} table: {e}")
 
@@ -138,6 +125,11 @@ class JS8CallClient:
         if not typ:
             return
 
+        if typ in SPOT_TYPES:
+            if self.store_spots:
+                spot_writer.add(parse_spots(typ, value, params))
+            return
+
         rx_types = [
             'RX.ACTIVITY', 'RX.DIRECTED', 'RX.SPOT', 'RX.CALL_ACTIVITY',
             'RX.CALL_SELECTED', 'RX.DIRECTED_ME', 'RX.ECHO', 'RX.DIRECTED_GROUP',
@@ -160,9 +152,9 @@ class JS8CallClient:
             self.logger.info(f"Received JS8Call message: {sender} to {receiver} - {msg}")
 
             if receiver in self.js8urgent:
-                self.insert_urgent('urgent', sender, receiver, msg)
+                self.insert_message('urgent', sender, receiver, msg)
                 notification_message = f"💥 URGENT JS8Call Message Received 💥\nFrom: {sender}\nCheck BBS for message"
-                send_message(notification_message, BROADCAST_NUM, self.interface)
+                send_broadcast(notification_message, self.interface, dedup_key=f"js8-urgent:{sender}:{receiver}:{msg}")
             elif receiver in self.js8groups:
                 self.insert_message('groups', sender, receiver, msg)
             elif self.store_messages:
@@ -176,41 +168,110 @@ class JS8CallClient:
             params['_ID'] = '{}'.format(int(time.time() * 1000))
             kwargs['params'] = params
         message = to_message(*args, **kwargs)
-        self.sock.send((message + '\n').encode('utf-8'))  # Convert to bytes
+        with self.send_lock:
+            if not self.sock:
+                raise ConnectionError("Not connected to JS8Call")
+            self.sock.sendall((message + '\n').encode('utf-8'))  # Convert to bytes
+            self.last_sent = time.time()
 
     def connect(self):
+        """Start the reader thread; it connects, and reconnects, in the background"""
         if not self.server[0] or not self.server[1]:
             self.logger.info("JS8Call server configuration not found. Skipping JS8Call connection.")
             return
 
-        self.logger.info(f"Connecting to {self.server}")
-        self.sock = socket(AF_INET, SOCK_STREAM)
-        try:
-            self.sock.connect(self.server)
-            self.connected = True
-            self.send("STATION.GET_STATUS")
-
-            while self.connected:
-                content = self.sock.recv(65500).decode('utf-8')  # Decode received bytes to string
-                if not content:
-                    continue  # Skip empty content
-
-                try:
-                    message = json.loads(content)
-                except ValueError:
-                    continue  # Skip invalid JSON content
-
-                if not message:
-                    continue  # Skip empty message
+        if self.store_spots:
+            spot_writer.start()
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name='js8call-client', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        delay = RECONNECT_MIN
+        while not self.stopping.is_set():
+            self.logger.info(f"Connecting to {self.server}")
+            try:
+                self.sock = socket.create_connection(self.server, timeout=CONNECT_TIMEOUT)
+            except OSError as e:
+                self.logger.error(f"Connection to JS8Call server {self.server} failed: {e}. Retrying in {delay}s")
+                self.stopping.wait(delay)
+                delay = min(delay * 2, RECONNECT_MAX)
+                continue
 
+            self.connected = True
+            try:
+                if self.read_frames():
+                    # The connection worked; start over from a short delay
+                    delay = RECONNECT_MIN
+            except OSError as e:
+                self.logger.error(f"JS8Call connection error: {e}")
+            finally:
+                self.connected = False
+                with self.send_lock:
+                    self.sock.close()
+                    self.sock = None
+                self.buffer.clear()
+
+            if not self.stopping.is_set():
+                self.logger.info(f"Disconnected from JS8Call. Reconnecting in {delay}s")
+                self.stopping.wait(delay)
+                delay = min(delay * 2, RECONNECT_MAX)
+
+    def read_frames(self):
+        """Read newline-framed API messages until the connection drops; True if any arrived"""
+        received_any = False
+        self.last_received = self.last_sent = time.time()
+        self.send("STATION.GET_STATUS")
+
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.sock, selectors.EVENT_READ)
+            while not self.stopping.is_set():
+                if selector.select(timeout=1.0):
+                    n = self.sock.recv_into(self.chunk)
+                    if n == 0:
+                        return received_any
+                    received_any = True
+                    self.last_received = time.time()
+                    self.buffer += memoryview(self.chunk)[:n]
+                    self.split_frames()
+
+                now = time.time()
+                if now - self.last_received > HEARTBEAT_TIMEOUT:
+                    self.logger.warning(f"No data from JS8Call for {HEARTBEAT_TIMEOUT}s, reconnecting")
+                    return received_any
+                if now - max(self.last_received, self.last_sent) > HEARTBEAT_INTERVAL:
+                    self.send("STATION.GET_STATUS")
+        return received_any
+
+    def split_frames(self):
+        start = 0
+        while True:
+            end = self.buffer.find(b'\n', start)
+            if end < 0:
+                break
+            line = bytes(self.buffer[start:end]).strip()
+            start = end + 1
+            if not line:
+                continue
+            message = from_message(line.decode('utf-8', errors='replace'))
+            if not message:
+                continue
+            try:
                 self.process(message)
-        except ConnectionRefusedError:
-            self.logger.error(f"Connection to JS8Call server {self.server} refused.")
-        finally:
-            self.sock.close()
+            except Exception as e:
+                self.logger.error(f"Error processing JS8Call message {message.get('type')}: {e}")
+        del self.buffer[:start]
+
+        if len(self.buffer) > MAX_FRAME_SIZE:
+            self.logger.warning(f"Discarding {len(self.buffer)} bytes of unterminated JS8Call data")
+            self.buffer.clear()
 
     def close(self):
-        self.connected = False
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+            self.thread = None
+        spot_writer.stop()
 
 
 def handle_js8call_command(sender_id, interface):
@@ -241,61 +302,82 @@ def handle_js8call_steps(sender_id, message, step, interface, state):
 
 
 
-def handle_group_messages_command(sender_id, interface):
-    conn = sqlite3.connect('js8call.db')
-    c = conn.cursor()
-    c.execute("SELECT DISTINCT groupname FROM groups")
-    groups = c.fetchall()
-    if groups:
-        response = "Group Messages Menu:\n" + "\n".join([f"[{i}] {group[0]}" for i, group in enumerate(groups)])
-        send_message(response, sender_id, interface)
-        update_user_state(sender_id, {'command': 'GROUP_MESSAGES', 'step': 1, 'groups': groups})
-    else:
-        send_message("No group messages available.", sender_id, interface)
+def handle_group_messages_command(sender_id, interface, offset=0):
+    counts = dict(store.groups())
+    groups = list(counts)
+    if offset >= len(groups):
+        send_message("No group messages available." if not offset else "No more groups.", sender_id, interface)
         handle_js8call_command(sender_id, interface)
+        return
+
+    rows = list(enumerate(groups[offset:], offset))
+    response, shown = fit_listing("Group Messages Menu:", rows,
+                                  lambda row: f"[{row[0]}] {row[1]} ({counts[row[1]]})")
+    send_message(response, sender_id, interface)
+    update_user_state(sender_id, {'command': 'GROUP_MESSAGES', 'step': 1, 'groups': groups, 'offset': offset + shown})
+
 
 def handle_station_messages_command(sender_id, interface):
-    conn = sqlite3.connect('js8call.db')
-    c = conn.cursor()
-    c.execute("SELECT sender, receiver, message, timestamp FROM messages")
-    messages = c.fetchall()
-    if messages:
-        response = "Station Messages:\n" + "\n".join([f"[{i+1}] {msg[0]} -> {msg[1]}: {msg[2]} ({msg[3]})" for i, msg in enumerate(messages)])
-        send_message(response, sender_id, interface)
-    else:
-        send_message("No station messages available.", sender_id, interface)
-    handle_js8call_command(sender_id, interface)
+    show_js8_messages(sender_id, interface, 'messages', "Station Messages:")
+
 
 def handle_urgent_messages_command(sender_id, interface):
-    conn = sqlite3.connect('js8call.db')
-    c = conn.cursor()
-    c.execute("SELECT sender, groupname, message, timestamp FROM urgent")
-    messages = c.fetchall()
-    if messages:
-        response = "Urgent Messages:\n" + "\n".join([f"[{i+1}] {msg[0]} -> {msg[1]}: {msg[2]} ({msg[3]})" for i, msg in enumerate(messages)])
-        send_message(response, sender_id, interface)
+    show_js8_messages(sender_id, interface, 'urgent', "Urgent Messages:")
+
+
+def show_js8_messages(sender_id, interface, table, title, groupname=None, before=None):
+    """Send the next page of a table newest first, continuing after the row before"""
+    rows = store.page(table, before=before, groupname=groupname)
+    if not rows:
+        if before:
+            send_message("No more messages.", sender_id, interface)
+        elif groupname:
+            send_message(f"No messages for group {groupname}.", sender_id, interface)
+        else:
+            send_message(f"No {title.rstrip(':').lower()} available.", sender_id, interface)
+        handle_js8call_command(sender_id, interface)
+        return
+
+    if groupname:
+        format_row = lambda row: f"{row[1]}: {row[3]} ({short_time(row[4])})"
+    else:
+        format_row = lambda row: f"{row[1]} -> {row[2]}: {row[3]} ({short_time(row[4])})"
+    response, shown = fit_listing(title, rows, format_row, more=len(rows) == PAGE_SIZE)
+    send_message(response, sender_id, interface)
+
+    if shown < len(rows) or len(rows) == PAGE_SIZE:
+        last = rows[shown - 1]
+        update_user_state(sender_id, {'command': 'JS8_MESSAGES', 'step': 1, 'table': table, 'title': title,
+                                      'groupname': groupname, 'before': (last[4], last[0])})
     else:
-        send_message("No urgent messages available.", sender_id, interface)
-    handle_js8call_command(sender_id, interface)
+        handle_js8call_command(sender_id, interface)
+
+
+def handle_js8_messages_steps(sender_id, message, step, state, interface):
+    """[M]ore continues the listing; anything else is taken as a JS8Call menu choice"""
+    if message.lower().strip() == 'm':
+        show_js8_messages(sender_id, interface, state['table'], state['title'],
+                          groupname=state.get('groupname'), before=tuple(state['before']))
+    else:
+        handle_js8call_steps(sender_id, message, 1, interface, state)
+
 
 def handle_group_message_selection(sender_id, message, step, state, interface):
     groups = state['groups']
-    try:
-        group_index = int(message)
-        groupname = groups[group_index][0]
-
-        conn = sqlite3.connect('js8call.db')
-        c = conn.cursor()
-        c.execute("SELECT sender, message, timestamp FROM groups WHERE groupname=?", (groupname,))
-        messages = c.fetchall()
+    choice = message.lower().strip()
+    if choice == 'm':
+        handle_group_messages_command(sender_id, interface, state.get('offset', 0))
+        return
+    if choice == 'x':
+        handle_js8call_command(sender_id, interface)
+        return
 
-        if messages:
-            response = f"Messages for group {groupname}:\n" + "\n".join([f"[{i+1}] {msg[0]}: {msg[1]} ({msg[2]})" for i, msg in enumerate(messages)])
-            send_message(response, sender_id, interface)
-        else:
-            send_message(f"No messages for group {groupname}.", sender_id, interface)
+    try:
+        group_index = int(choice)
+        groupname = groups[group_index]
     except (IndexError, ValueError):
         send_message("Invalid group selection. Please choose again.", sender_id, interface)
         handle_group_messages_command(sender_id, interface)
+        return
 
-    handle_js8call_command(sender_id, interface)
\ No newline at end of file
+    show_js8_messages(sender_id, interface, 'groups', f"Messages for group {groupname}:", groupname=groupname)
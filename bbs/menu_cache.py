@@ -0,0 +1,144 @@
+"""
+Precompiled BBS menus with hot reload.
+
+The menus are built once from messages.json and the [menu] section of
+config.ini into plain strings, so sending one is a dict lookup. A periodic
+check of the two files' modification times rebuilds everything when either
+changes (e.g. after an edit from the Observatory admin pages) and swaps the
+new content in at once, so content changes no longer need a BBS restart.
+"""
+
+import configparser
+import json
+import logging
+import os
+
+MESSAGES_FILE = 'messages.json'
+CONFIG_FILE = 'config.ini'
+
+# Seconds between modification time checks
+RELOAD_INTERVAL = 5
+
+# Menu item letter -> (messages.json label key, default label)
+MENU_LABELS = {
+    'N': ('network_info', '[N]etwork Info'),
+    'R': ('resources', '[R]esources'),
+    'B': ('bulletins', '[B]ulletins'),
+    'U': ('utilities', '[U]tilities'),
+    'X': ('exit', 'E[X]IT'),
+    'M': ('mail', '[M]ail'),
+    'C': ('channel_dir', '[C]hannel Dir'),
+    'J': ('js8call', '[J]S8CALL'),
+    'S': ('stats', '[S]tats'),
+    'F': ('fortune', '[F]ortune'),
+    'G': ('games', '[G]ames'),
+}
+
+DEFAULT_MAIL_MENU = 'What would you like to do with mail?\n[R]ead  [S]end E[X]IT'
+DEFAULT_BULLETIN_MENU = 'Which board would you like to enter?\n[G]eneral  [I]nfo  [N]ews  [U]rgent'
+
+
+def load_messages(path=MESSAGES_FILE):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def build_menu(items, menu_name, labels):
+    menu_str = f"{menu_name}\n"
+    for item in items:
+        item = item.strip()
+        if item == 'W':
+            # Context-aware: Weather for main menu, Wall of Shame for utilities
+            if "Utilities" in menu_name or "🛠️" in menu_name:
+                menu_str += labels.get('wall_of_shame', '[W]all of Shame') + "\n"
+            else:
+                menu_str += labels.get('weather', '[W]eather') + "\n"
+        elif item == 'Q':
+            if "BBS" in menu_name or "💾" in menu_name:
+                menu_str += labels.get('quote', '[Q]uote') + "\n"
+            else:
+                menu_str += labels.get('quick_commands', '[Q]uick Commands') + "\n"
+        elif item in MENU_LABELS:
+            key, default = MENU_LABELS[item]
+            menu_str += labels.get(key, default) + "\n"
+    return menu_str
+
+
+def compile_menus(messages, menu_config):
+    headers = messages.get('menu_headers', {})
+    labels = messages.get('menu_labels', {})
+    mail_msgs = messages.get('mail', {})
+    bulletin_msgs = messages.get('bulletins', {})
+
+    main_items = menu_config['main_menu_items'].split(',')
+    main_header = headers.get('main', '💾Wildcat TC² BBS💾 (✉️:{mail_count})')
+    # The main menu header shows the mail count, so it is formatted per render;
+    # everything else is final
+    main_body = build_menu(main_items, main_header, labels)[len(main_header):]
+
+    return {
+        'main': (main_header, main_body),
+        'bbs': build_menu(menu_config['bbs_menu_items'].split(','), headers.get('bbs', '📰BBS Menu📰'), labels),
+        'utilities': build_menu(menu_config['utilities_menu_items'].split(','),
+                                headers.get('utilities', '🛠️Utilities Menu🛠️'), labels),
+        'mail': f"{headers.get('mail', '✉️Mail Menu✉️')}\n{mail_msgs.get('menu', DEFAULT_MAIL_MENU)}",
+        'bulletin': f"{headers.get('bulletin', '📰Bulletin Menu📰')}\n{bulletin_msgs.get('menu', DEFAULT_BULLETIN_MENU)}",
+    }
+
+
+def file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class MenuCache:
+    def __init__(self, messages_path=MESSAGES_FILE, config_path=CONFIG_FILE):
+        self.messages_path = messages_path
+        self.config_path = config_path
+        self.mtimes = (None, None)
+        # (messages, compiled menus), replaced as a whole on reload
+        self.content = ({}, {})
+        self.reload()
+
+    @property
+    def messages(self):
+        return self.content[0]
+
+    def reload(self):
+        """Rebuild the menus if messages.json or config.ini changed; return True if rebuilt"""
+        mtimes = (file_mtime(self.messages_path), file_mtime(self.config_path))
+        if mtimes == self.mtimes:
+            return False
+
+        old_messages, old_menus = self.content
+        try:
+            messages = load_messages(self.messages_path)
+        except Exception as e:
+            logging.error(f"Error loading {self.messages_path}: {e}")
+            messages = old_messages
+
+        config = configparser.ConfigParser()
+        config.read(self.config_path)
+        if not config.has_section('menu') and old_menus:
+            logging.error(f"No [menu] section in {self.config_path}, keeping current menus")
+            menus = old_menus
+        else:
+            menus = compile_menus(messages, config['menu'])
+
+        self.content = (messages, menus)
+        if self.mtimes != (None, None):
+            logging.info("Menus rebuilt after a content change")
+        self.mtimes = mtimes
+        return True
+
+    def render(self, name, mail_count=0):
+        menu = self.content[1][name]
+        if name == 'main':
+            header, body = menu
+            return header.format(mail_count=mail_count) + body
+        return menu
+
+
+menus = MenuCache()
@@ -0,0 +1,135 @@
+"""
+Running census of the mesh for the Stats and Network Info menus.
+
+Rather than walking interface.nodes on every request, the census is updated
+as node info and packets arrive: Counters of hardware models and roles, a
+list of (lastHeard, node) kept sorted with bisect for "recently heard" and
+time-window counts, and a list of (SNR, node) kept sorted the same way for the
+signal leaderboards. Answering a stats request then only touches the K rows
+it sends back. A periodic reload from interface.nodesByNum corrects any drift.
+"""
+
+import bisect
+import threading
+import time
+from collections import Counter, namedtuple
+
+# Seconds between full reloads from interface.nodesByNum
+RELOAD_INTERVAL = 600
+
+CensusEntry = namedtuple('CensusEntry', ['num', 'short_name', 'long_name', 'hw_model', 'role', 'last_heard', 'snr'])
+
+
+class MeshCensus:
+    def __init__(self):
+        self.nodes = {}
+        self.hw_models = Counter()
+        self.roles = Counter()
+        # Sorted ascending; the newest / best are at the end
+        self.heard = []
+        self.by_snr = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _remove(self, entry):
+        self.hw_models[entry.hw_model] -= 1
+        if not self.hw_models[entry.hw_model]:
+            del self.hw_models[entry.hw_model]
+        self.roles[entry.role] -= 1
+        if not self.roles[entry.role]:
+            del self.roles[entry.role]
+        if entry.last_heard is not None:
+            del self.heard[bisect.bisect_left(self.heard, (entry.last_heard, entry.num))]
+        if entry.snr is not None:
+            del self.by_snr[bisect.bisect_left(self.by_snr, (entry.snr, entry.num))]
+
+    def _add(self, entry):
+        self.hw_models[entry.hw_model] += 1
+        self.roles[entry.role] += 1
+        if entry.last_heard is not None:
+            bisect.insort(self.heard, (entry.last_heard, entry.num))
+        if entry.snr is not None:
+            bisect.insort(self.by_snr, (entry.snr, entry.num))
+
+    def _replace(self, num, **changes):
+        old = self.nodes.get(num)
+        if old is None:
+            old = CensusEntry(num, 'Unknown', 'Unknown', 'Unknown', 'Unknown', None, None)
+        else:
+            changes = {k: v for k, v in changes.items() if getattr(old, k) != v}
+            if not changes:
+                return
+            self._remove(old)
+        entry = old._replace(**changes)
+        self.nodes[num] = entry
+        self._add(entry)
+
+    def update_node(self, node):
+        """Apply a node dict as found in interface.nodes"""
+        if not isinstance(node, dict) or 'num' not in node:
+            return
+        user = node.get('user', {})
+        with self.lock:
+            self._replace(
+                node['num'],
+                short_name=user.get('shortName', 'Unknown'),
+                long_name=user.get('longName', 'Unknown'),
+                hw_model=user.get('hwModel', 'Unknown'),
+                role=user.get('role', 'Unknown'),
+                last_heard=node.get('lastHeard'),
+                snr=node.get('snr')
+            )
+
+    def on_packet(self, packet):
+        """Record that a node was heard, and pick up node info sent over the air"""
+        num = packet.get('from')
+        if num is None:
+            return
+        changes = {'last_heard': packet.get('rxTime') or int(time.time())}
+        if packet.get('rxSnr') is not None:
+            changes['snr'] = packet['rxSnr']
+        decoded = packet.get('decoded', {})
+        if decoded.get('portnum') == 'NODEINFO_APP' and isinstance(decoded.get('user'), dict):
+            user = decoded['user']
+            changes.update(short_name=user.get('shortName', 'Unknown'), long_name=user.get('longName', 'Unknown'),
+                           hw_model=user.get('hwModel', 'Unknown'), role=user.get('role', 'Unknown'))
+        with self.lock:
+            self._replace(num, **changes)
+
+    def load_nodes(self, nodes_by_num):
+        """Rebuild the census from interface.nodesByNum"""
+        census = MeshCensus()
+        for node in list(nodes_by_num.values()):
+            census.update_node(node)
+        with self.lock:
+            self.nodes, self.hw_models, self.roles = census.nodes, census.hw_models, census.roles
+            self.heard, self.by_snr = census.heard, census.by_snr
+        return len(self.nodes)
+
+    def heard_since(self, cutoff):
+        """Number of nodes last heard at or after cutoff"""
+        with self.lock:
+            return len(self.heard) - bisect.bisect_left(self.heard, (cutoff,))
+
+    def recent(self, n):
+        """The n most recently heard nodes, newest first"""
+        with self.lock:
+            return [self.nodes[num] for _, num in reversed(self.heard[-n:])] if n > 0 else []
+
+    def top_snr(self, k):
+        """The k nodes with the best SNR, best first"""
+        with self.lock:
+            return [self.nodes[num] for _, num in reversed(self.by_snr[-k:])] if k > 0 else []
+
+    def hardware_counts(self):
+        with self.lock:
+            return Counter(self.hw_models)
+
+    def role_counts(self):
+        with self.lock:
+            return Counter(self.roles)
+
+
+census = MeshCensus()
@@ -1,4 +1,5 @@
 import logging
+import time
 
 from meshtastic import BROADCAST_NUM
 
@@ -10,15 +11,32 @@ from command_handlers import (
     handle_check_bulletin_command, handle_read_bulletin_command, handle_read_channel_command,
     handle_post_channel_command, handle_list_channels_command, handle_quick_help_command,
     handle_network_info_command, handle_network_info_steps, handle_resources_command, handle_resources_steps,
-    handle_weather_command, handle_weather_steps,
+    handle_weather_command, handle_weather_steps, handle_nearby_steps,
     handle_games_command, handle_games_steps, handle_trivia_command, handle_trivia_steps,
     handle_propagation_command, handle_propagation_steps,
     handle_propagation_analysis_command, handle_propagation_analysis_steps, handle_prop_node_input_steps
 )
-from db_operations import add_bulletin, add_mail, delete_bulletin, delete_mail, get_db_connection, add_channel, log_message
-from js8call_integration import handle_js8call_command, handle_js8call_steps, handle_group_message_selection
+from db_operations import add_bulletin, add_mail, delete_bulletin, delete_mail, get_db_connection, add_channel, log_message, is_tombstoned
+from dispatcher import dispatcher
+from geo_index import on_position
+from mesh_census import census
+from metrics import registry
+from js8call_integration import (
+    handle_js8call_command, handle_js8call_steps, handle_group_message_selection, handle_js8_messages_steps
+)
+from sync_protocol import (
+    BROADCAST_ACK_PREFIX, CHUNK_PREFIX, NACK_PREFIX, SYNC_PROTOCOL_VERSION, SyncDecodeError, decode as decode_sync, frame_version,
+    get_peer_version, hello_message, is_hello, is_sync_message, parse_hello, recent_messages, set_peer_version
+)
+from sync_broadcast import ack_frame, broadcasts
+from sync_reconcile import handle_reconcile_message
+from sync_transfer import TransferError, transfers
 from utils import get_user_state, get_node_short_name, get_node_id_from_num, send_message
 
+packets_received = registry.counter('bbs_packets_received_total', "Packets received, by portnum", ['portnum'])
+handler_seconds = registry.histogram('bbs_handler_seconds', "Time to handle a user message, replies included, by command",
+                                     ['command'])
+
 main_menu_handlers = {
     "w": handle_weather_command,
     "n": handle_network_info_command,
@@ -63,173 +81,292 @@ board_action_handlers = {
     "x": handle_help_command
 }
 
-def process_message(sender_id, message, interface, is_sync_message=False, request_timestamp=None):
-    state = get_user_state(sender_id)
-    message_lower = message.lower().strip()
-    message_strip = message.strip()
 
-    # Store timestamp in interface for handlers to access
-    interface.request_timestamp = request_timestamp
+# ---------- router ----------
+#
+# Every route is a function of (sender_id, message, state, interface, bbs_nodes).
+# resolve() picks one with a few dict lookups, in this order:
+#   1. quick commands (sm,, cb,, ...) by prefix
+#   2. priority step handlers, which see 'x' themselves
+#   3. 'x' -> main menu
+#   4. the step handler of the current command
+#   5. the option table of the current menu, else the main menu
+
+quick_command_trie = {}
+# route -> label for handler metrics: the quick command prefix, the step
+# handler's command, or menu:option
+route_names = {}
+priority_step_handlers = {}
+step_handlers = {}
+menu_tables = {}
+
+
+def register_quick_command(prefix, handler):
+    """Route messages starting with prefix to handler(sender_id, message, state, interface, bbs_nodes)"""
+    node = quick_command_trie
+    for char in prefix:
+        node = node.setdefault(char, {})
+    node[None] = handler
+    route_names[handler] = prefix.rstrip(',')
+
+
+def register_step_handler(command, handler, priority=False):
+    """Route messages from users in state command to handler(sender_id, message, state, interface, bbs_nodes)"""
+    (priority_step_handlers if priority else step_handlers)[command] = handler
+    route_names[handler] = command
+
+
+def register_menu(name, handlers, stateful=False):
+    """Route single-letter options of a menu; name is the MENU state's menu or the state command"""
+    if stateful:
+        menu_tables[name] = {option: (lambda handler: lambda sender_id, message, state, interface, bbs_nodes:
+                                      handler(sender_id, interface, state))(handler)
+                             for option, handler in handlers.items()}
+    else:
+        menu_tables[name] = {option: (lambda handler: lambda sender_id, message, state, interface, bbs_nodes:
+                                      handler(sender_id, interface))(handler)
+                             for option, handler in handlers.items()}
+    for option, route in menu_tables[name].items():
+        route_names[route] = f"{name}:{option}"
+
+
+def by_step(handlers):
+    """Step handler that dispatches on state['step'] and ignores other steps"""
+    def handle(sender_id, message, state, interface, bbs_nodes):
+        handler = handlers.get(state['step'])
+        if handler:
+            handler(sender_id, message, state, interface, bbs_nodes)
+    return handle
+
+
+def match_quick_command(message_lower):
+    node = quick_command_trie
+    for char in message_lower:
+        node = node.get(char)
+        if node is None:
+            return None
+        if None in node:
+            return node[None]
+    return None
+
+
+def show_main_menu(sender_id, message, state, interface, bbs_nodes):
+    handle_help_command(sender_id, interface)
+
+
+def resolve(message_lower, state):
+    """Return the route for a normalised message from a user in state"""
+    handler = match_quick_command(message_lower)
+    if handler:
+        return handler
+
+    command = state['command'] if state else None
+    handler = priority_step_handlers.get(command)
+    if handler:
+        return handler
+
+    if message_lower == 'x':
+        return show_main_menu
+
+    handler = step_handlers.get(command)
+    if handler:
+        return handler
+
+    menu = menu_tables.get(state.get('menu', 'main') if command == 'MENU' else command) or menu_tables['main']
+    return menu.get(message_lower, show_main_menu)
+
+
+def route_name(route):
+    """Metrics label for a route returned by resolve()"""
+    return route_names.get(route, 'MAIN')
 
-    bbs_nodes = interface.bbs_nodes
+
+register_quick_command("sm,,", lambda sender_id, message, state, interface, bbs_nodes:
+                       handle_send_mail_command(sender_id, message.strip(), interface, bbs_nodes))
+register_quick_command("cm", lambda sender_id, message, state, interface, bbs_nodes:
+                       handle_check_mail_command(sender_id, interface))
+register_quick_command("pb,,", lambda sender_id, message, state, interface, bbs_nodes:
+                       handle_post_bulletin_command(sender_id, message.strip(), interface, bbs_nodes))
+register_quick_command("cb,,", lambda sender_id, message, state, interface, bbs_nodes:
+                       handle_check_bulletin_command(sender_id, message.strip(), interface))
+register_quick_command("chp,,", lambda sender_id, message, state, interface, bbs_nodes:
+                       handle_post_channel_command(sender_id, message.strip(), interface))
+register_quick_command("chl", lambda sender_id, message, state, interface, bbs_nodes:
+                       handle_list_channels_command(sender_id, interface))
+
+register_step_handler('JS8CALL_MENU', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_js8call_steps(sender_id, message, state['step'], interface, state), priority=True)
+register_step_handler('GROUP_MESSAGES', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_group_message_selection(sender_id, message, state['step'], state, interface), priority=True)
+register_step_handler('JS8_MESSAGES', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_js8_messages_steps(sender_id, message, state['step'], state, interface), priority=True)
+
+register_step_handler('NETWORK_INFO', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_network_info_steps(sender_id, message, state['step'], state, interface))
+register_step_handler('NEARBY', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_nearby_steps(sender_id, message, state['step'], state, interface))
+register_step_handler('RESOURCES', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_resources_steps(sender_id, message, state['step'], state, interface))
+register_step_handler('WEATHER', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_weather_steps(sender_id, message, state['step'], state, interface))
+register_step_handler('MAIL', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_mail_steps(sender_id, message, state['step'], state, interface, bbs_nodes))
+register_step_handler('BULLETIN', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_bb_steps(sender_id, message, state['step'], state, interface, bbs_nodes))
+register_step_handler('STATS', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_stats_steps(sender_id, message, state['step'], interface))
+register_step_handler('CHANNEL_DIRECTORY', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_channel_directory_steps(sender_id, message, state['step'], state, interface))
+register_step_handler('CHECK_MAIL', by_step({
+    1: lambda sender_id, message, state, interface, bbs_nodes:
+        handle_read_mail_command(sender_id, message, state, interface),
+    2: lambda sender_id, message, state, interface, bbs_nodes:
+        handle_delete_mail_confirmation(sender_id, message, state, interface, bbs_nodes),
+}))
+register_step_handler('CHECK_BULLETIN', by_step({
+    1: lambda sender_id, message, state, interface, bbs_nodes:
+        handle_read_bulletin_command(sender_id, message, state, interface),
+}))
+register_step_handler('CHECK_CHANNEL', by_step({
+    1: lambda sender_id, message, state, interface, bbs_nodes:
+        handle_read_channel_command(sender_id, message, state, interface),
+}))
+register_step_handler('LIST_CHANNELS', by_step({
+    1: lambda sender_id, message, state, interface, bbs_nodes:
+        handle_read_channel_command(sender_id, message, state, interface),
+}))
+register_step_handler('BULLETIN_POST', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_bb_steps(sender_id, message, 4, state, interface, bbs_nodes))
+register_step_handler('BULLETIN_POST_CONTENT', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_bb_steps(sender_id, message, 5, state, interface, bbs_nodes))
+register_step_handler('BULLETIN_READ', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_bb_steps(sender_id, message, 3, state, interface, bbs_nodes))
+register_step_handler('GAMES', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_games_steps(sender_id, message, state['step'], state, interface))
+register_step_handler('TRIVIA', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_trivia_steps(sender_id, message, state['step'], state, interface))
+register_step_handler('PROPAGATION', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_propagation_steps(sender_id, message, state['step'], state, interface))
+register_step_handler('PROP_ANALYSIS', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_propagation_analysis_steps(sender_id, message, state['step'], state, interface))
+register_step_handler('PROP_NODE_INPUT', lambda sender_id, message, state, interface, bbs_nodes:
+                      handle_prop_node_input_steps(sender_id, message, state['step'], state, interface))
+
+register_menu('main', main_menu_handlers)
+register_menu('bbs', bbs_menu_handlers)
+register_menu('utilities', utilities_menu_handlers)
+register_menu('BULLETIN_MENU', bulletin_menu_handlers)
+register_menu('BULLETIN_ACTION', board_action_handlers, stateful=True)
+
+
+def process_message(sender_id, message, interface, is_sync_message=False):
+    state = get_user_state(sender_id)
+    message_lower = message.lower().strip()
 
     # Handle repeated characters for single character commands using a prefix
     if len(message_lower) == 2 and message_lower[1] == 'x':
         message_lower = message_lower[0]
 
     if is_sync_message:
-        if message.startswith("BULLETIN|"):
-            parts = message.split("|")
-            board, sender_short_name, subject, content, unique_id = parts[1], parts[2], parts[3], parts[4], parts[5]
-            add_bulletin(board, sender_short_name, subject, content, [], interface, unique_id=unique_id)
-
-            if board.lower() == "urgent":
-                notification_message = f"💥NEW URGENT BULLETIN💥\nFrom: {sender_short_name}\nTitle: {subject}\nDM 'CB,,Urgent' to view"
-                send_message(notification_message, BROADCAST_NUM, interface)
-        elif message.startswith("MAIL|"):
-            parts = message.split("|")
-            sender_id, sender_short_name, recipient_id, subject, content, unique_id = parts[1], parts[2], parts[3], parts[4], parts[5], parts[6]
-            add_mail(sender_id, sender_short_name, recipient_id, subject, content, [], interface, unique_id=unique_id)
-        elif message.startswith("DELETE_BULLETIN|"):
-            unique_id = message.split("|")[1]
-            delete_bulletin(unique_id, [], interface)
-        elif message.startswith("DELETE_MAIL|"):
-            unique_id = message.split("|")[1]
-            logging.info(f"Processing delete mail with unique_id: {unique_id}")
-            recipient_id = get_recipient_id_by_mail(unique_id)
-            delete_mail(unique_id, recipient_id, [], interface)
-        elif message.startswith("CHANNEL|"):
-            parts = message.split("|")
-            channel_name, channel_url = parts[1], parts[2]
-            add_channel(channel_name, channel_url)
+        process_sync_message(get_node_id_from_num(sender_id, interface), message, interface)
     else:
-        if message_lower.startswith("sm,,"):
-            handle_send_mail_command(sender_id, message_strip, interface, bbs_nodes)
-        elif message_lower.startswith("cm"):
-            handle_check_mail_command(sender_id, interface)
-        elif message_lower.startswith("pb,,"):
-            handle_post_bulletin_command(sender_id, message_strip, interface, bbs_nodes)
-        elif message_lower.startswith("cb,,"):
-            handle_check_bulletin_command(sender_id, message_strip, interface)
-        elif message_lower.startswith("chp,,"):
-            handle_post_channel_command(sender_id, message_strip, interface)
-        elif message_lower.startswith("chl"):
-            handle_list_channels_command(sender_id, interface)
-        else:
-            if state and state['command'] == 'MENU':
-                menu_name = state['menu']
-                if menu_name == 'bbs':
-                    handlers = bbs_menu_handlers
-                elif menu_name == 'utilities':
-                    handlers = utilities_menu_handlers
-                else:
-                    handlers = main_menu_handlers
-            elif state and state['command'] == 'BULLETIN_MENU':
-                handlers = bulletin_menu_handlers
-            elif state and state['command'] == 'BULLETIN_ACTION':
-                handlers = board_action_handlers
-            elif state and state['command'] == 'JS8CALL_MENU':
-                handle_js8call_steps(sender_id, message, state['step'], interface, state)
-                return
-            elif state and state['command'] == 'GROUP_MESSAGES':
-                handle_group_message_selection(sender_id, message, state['step'], state, interface)
-                return
-            else:
-                handlers = main_menu_handlers
-
-            if message_lower == 'x':
-                # Reset to main menu state
-                handle_help_command(sender_id, interface)
-                return
-
-            # Check state-based commands FIRST (submenus have priority)
-            if state:
-                command = state['command']
-                step = state['step']
-
-                if command == 'NETWORK_INFO':
-                    handle_network_info_steps(sender_id, message, step, state, interface)
-                    return
-                elif command == 'RESOURCES':
-                    handle_resources_steps(sender_id, message, step, state, interface)
-                    return
-                elif command == 'WEATHER':
-                    handle_weather_steps(sender_id, message, step, state, interface)
-                    return
-                elif command == 'MAIL':
-                    handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes)
-                    return
-                elif command == 'BULLETIN':
-                    handle_bb_steps(sender_id, message, step, state, interface, bbs_nodes)
-                    return
-                elif command == 'STATS':
-                    handle_stats_steps(sender_id, message, step, interface)
-                    return
-                elif command == 'CHANNEL_DIRECTORY':
-                    handle_channel_directory_steps(sender_id, message, step, state, interface)
-                    return
-                elif command == 'CHECK_MAIL':
-                    if step == 1:
-                        handle_read_mail_command(sender_id, message, state, interface)
-                    elif step == 2:
-                        handle_delete_mail_confirmation(sender_id, message, state, interface, bbs_nodes)
-                    return
-                elif command == 'CHECK_BULLETIN':
-                    if step == 1:
-                        handle_read_bulletin_command(sender_id, message, state, interface)
-                    return
-                elif command == 'CHECK_CHANNEL':
-                    if step == 1:
-                        handle_read_channel_command(sender_id, message, state, interface)
-                    return
-                elif command == 'LIST_CHANNELS':
-                    if step == 1:
-                        handle_read_channel_command(sender_id, message, state, interface)
-                    return
-                elif command == 'BULLETIN_POST':
-                    handle_bb_steps(sender_id, message, 4, state, interface, bbs_nodes)
-                    return
-                elif command == 'BULLETIN_POST_CONTENT':
-                    handle_bb_steps(sender_id, message, 5, state, interface, bbs_nodes)
-                    return
-                elif command == 'BULLETIN_READ':
-                    handle_bb_steps(sender_id, message, 3, state, interface, bbs_nodes)
-                    return
-                elif command == 'JS8CALL_MENU':
-                    handle_js8call_steps(sender_id, message, step, interface, state)
-                    return
-                elif command == 'GROUP_MESSAGES':
-                    handle_group_message_selection(sender_id, message, step, state, interface)
-                    return
-                elif command == 'GAMES':
-                    handle_games_steps(sender_id, message, step, state, interface)
-                    return
-                elif command == 'TRIVIA':
-                    handle_trivia_steps(sender_id, message, step, state, interface)
-                    return
-                elif command == 'PROPAGATION':
-                    handle_propagation_steps(sender_id, message, step, state, interface)
-                    return
-                elif command == 'PROP_ANALYSIS':
-                    handle_propagation_analysis_steps(sender_id, message, step, state, interface)
-                    return
-                elif command == 'PROP_NODE_INPUT':
-                    handle_prop_node_input_steps(sender_id, message, step, state, interface)
-                    return
-
-            # Now check menu handlers (for main menu navigation)
-            if message_lower in handlers:
-                if state and state['command'] in ['BULLETIN_ACTION', 'BULLETIN_READ', 'BULLETIN_POST', 'BULLETIN_POST_CONTENT']:
-                    handlers[message_lower](sender_id, interface, state)
-                else:
-                    handlers[message_lower](sender_id, interface)
-            else:
-                handle_help_command(sender_id, interface)
+        route = resolve(message_lower, state)
+        started = time.perf_counter()
+        try:
+            route(sender_id, message, state, interface, interface.bbs_nodes)
+        finally:
+            handler_seconds.observe(time.perf_counter() - started, route_name(route))
+
+
+def process_sync_message(peer_id, message, interface, broadcast=False):
+    """Apply a sync message received from a peer BBS"""
+    if is_hello(message):
+        try:
+            version, is_ack = parse_hello(message)
+        except SyncDecodeError as e:
+            logging.warning(f"SERVER SYNC: {e}")
+            return
+        set_peer_version(peer_id, min(version, SYNC_PROTOCOL_VERSION))
+        if not is_ack:
+            send_message(hello_message(ack=True), peer_id, interface, kind='sync')
+        return
+
+    version = frame_version(message)
+    if version > get_peer_version(peer_id):
+        set_peer_version(peer_id, min(version, SYNC_PROTOCOL_VERSION))
+
+    if message.startswith(BROADCAST_ACK_PREFIX):
+        broadcasts.handle_ack(peer_id, message)
+        return
+
+    try:
+        if message.startswith(NACK_PREFIX):
+            transfers.handle_nack(peer_id, message, interface)
+            return
+        if message.startswith(CHUNK_PREFIX):
+            transfer = transfers.receive_chunk(peer_id, message, broadcast=broadcast)
+            if transfer is None:
+                return  # Waiting for the rest of the transfer
+            # Acknowledge a broadcast transfer even if its last chunk was a unicast repair
+            message, broadcast = transfer
+    except TransferError as e:
+        logging.warning(f"SERVER SYNC: Dropping bad transfer frame from {peer_id}: {e}")
+        return
+
+    if broadcast:
+        # Confirm receipt so the sender doesn't fall back to unicast
+        send_message(ack_frame(message), peer_id, interface, kind='sync')
+
+    try:
+        msg_type, fields = decode_sync(message)
+    except SyncDecodeError as e:
+        logging.warning(f"SERVER SYNC: Dropping undecodable sync message from {peer_id}: {e}")
+        return
+
+    reconcile = msg_type in ('DIGEST', 'BUCKETS', 'IDS', 'WANT')
+    # Reconcile frames don't name their sender, so two peers with the same
+    # items send identical ones; only repeats from the same peer are duplicates
+    if not recent_messages.check(message, scope=peer_id if reconcile else ''):
+        logging.info(f"SERVER SYNC: Dropping duplicate sync message from {peer_id}")
+        return
+
+    if reconcile:
+        try:
+            handle_reconcile_message(peer_id, msg_type, fields, interface)
+        except SyncDecodeError as e:
+            logging.warning(f"SERVER SYNC: Bad {msg_type} from {peer_id}: {e}")
+        return
+
+    if msg_type in ('BULLETIN', 'MAIL') and is_tombstoned(fields['unique_id']):
+        logging.info(f"SERVER SYNC: Ignoring {msg_type} {fields['unique_id']} from {peer_id}, it was deleted here")
+        return
+
+    if msg_type == 'BULLETIN':
+        # add_bulletin sends the urgent-board notification itself
+        add_bulletin(fields['board'], fields['sender_short_name'], fields['subject'], fields['content'], [],
+                     interface, unique_id=fields['unique_id'])
+    elif msg_type == 'MAIL':
+        add_mail(fields['sender_id'], fields['sender_short_name'], fields['recipient_id'], fields['subject'],
+                 fields['content'], [], interface, unique_id=fields['unique_id'])
+    elif msg_type == 'DELETE_BULLETIN':
+        delete_bulletin(fields['unique_id'], [], interface)
+    elif msg_type == 'DELETE_MAIL':
+        unique_id = fields['unique_id']
+        logging.info(f"Processing delete mail with unique_id: {unique_id}")
+        recipient_id = get_recipient_id_by_mail(unique_id)
+        delete_mail(unique_id, recipient_id, [], interface)
+    elif msg_type == 'CHANNEL':
+        add_channel(fields['name'], fields['url'])
 
 
 def on_receive(packet, interface):
     try:
-        if 'decoded' in packet and packet['decoded']['portnum'] == 'TEXT_MESSAGE_APP':
+        decoded = packet.get('decoded')
+        packets_received.inc(decoded.get('portnum', 'UNKNOWN') if decoded else 'ENCRYPTED')
+        census.on_packet(packet)
+        if 'decoded' in packet and packet['decoded']['portnum'] == 'POSITION_APP':
+            on_position(packet, interface)
+        elif 'decoded' in packet and packet['decoded']['portnum'] == 'TEXT_MESSAGE_APP':
             message_bytes = packet['decoded']['payload']
             message_string = message_bytes.decode('utf-8')
             sender_id = packet['from']
@@ -247,21 +384,28 @@ def on_receive(packet, interface):
             snr = packet.get('rxSnr')
             rssi = packet.get('rxRssi')
             hop_limit = packet.get('hopLimit')
-            log_message(sender_node_id, sender_short_name, to_id, message_string, timestamp, channel_index, snr, rssi, hop_limit)
 
             bbs_nodes = interface.bbs_nodes
-            is_sync_message = any(message_string.startswith(prefix) for prefix in
-                                  ["BULLETIN|", "MAIL|", "DELETE_BULLETIN|", "DELETE_MAIL|"])
 
+            handler = None
             if sender_node_id in bbs_nodes:
-                if is_sync_message:
-                    process_message(sender_id, message_string, interface, is_sync_message=True)
+                if is_sync_message(message_string):
+                    broadcast = to_id == BROADCAST_NUM
+                    handler = lambda: process_sync_message(sender_node_id, message_string, interface, broadcast=broadcast)
                 else:
                     logging.info("Ignoring non-sync message from known BBS node")
             elif to_id is not None and to_id != 0 and to_id != 255 and to_id == interface.myInfo.my_node_num:
-                process_message(sender_id, message_string, interface, is_sync_message=False, request_timestamp=timestamp)
+                handler = lambda: process_message(sender_id, message_string, interface, is_sync_message=False)
             else:
                 logging.info("Ignoring message sent to group chat or from unknown node")
+
+            def job():
+                log_message(sender_node_id, sender_short_name, to_id, message_string, timestamp, channel_index, snr, rssi, hop_limit)
+                if handler:
+                    handler()
+
+            # Logging and handling run on the worker pool, in arrival order per sender
+            dispatcher.submit(sender_node_id, job, timestamp=timestamp)
     except KeyError as e:
         logging.error(f"Error processing packet: {e}")
 
@@ -16,10 +16,22 @@ import logging
 import time
 
 from config_init import initialize_config, get_interface, init_cli_parser, merge_config
+from content_bank import EVENT_POLL_INTERVAL, poll_admin_events
 from db_operations import initialize_database
+from delivery_tracker import ledger
+from dispatcher import dispatcher
+from geo_index import geo
 from js8call_integration import JS8CallClient
+from mesh_census import RELOAD_INTERVAL as CENSUS_RELOAD_INTERVAL, census
+from menu_cache import RELOAD_INTERVAL as MENU_RELOAD_INTERVAL, menus
 from message_processing import on_receive
+from metrics import start_server as start_metrics_server
 from pubsub import pub
+from sync_broadcast import broadcasts
+from sync_protocol import load_peer_versions
+from sync_reconcile import RECONCILE_INTERVAL, reconcile_with_peers
+from sync_transfer import transfers
+from utils import announce_sync_version, run_periodically, user_states
 
 # General logging
 logging.basicConfig(
@@ -61,17 +73,55 @@ def main():
 
     interface = get_interface(system_config)
     interface.bbs_nodes = system_config['bbs_nodes']
+    interface.sync_channel_index = system_config['sync_channel_index']
     interface.allowed_nodes = system_config['allowed_nodes']
 
     logging.info(f"TC²-BBS is running on {system_config['interface_type']} interface...")
 
     initialize_database()
 
+    if system_config['metrics_port']:
+        start_metrics_server(system_config['metrics_port'], system_config['metrics_host'])
+
+    # Pick up conversations that were in progress before a restart
+    user_states.load()
+    run_periodically(user_states.sweep, 300, name='session-sweep')
+
+    # Pick up messages.json / [menu] edits without a restart
+    run_periodically(menus.reload, MENU_RELOAD_INTERVAL, name='menu-reload')
+    run_periodically(poll_admin_events, EVENT_POLL_INTERVAL, name='admin-events')
+
     def receive_packet(packet, interface):
         on_receive(packet, interface)
 
     pub.subscribe(receive_packet, system_config['mqtt_topic'])
 
+    # Index known node positions; position packets keep it current, the periodic
+    # reload picks up positions that arrive in node info updates
+    logging.info(f"Indexed {geo.load_nodes(interface.nodes)} node positions")
+    run_periodically(lambda: geo.load_nodes(interface.nodes), 600, name='geo-reload')
+
+    # Stats menus read from the census, kept current by packets and node updates
+    census.load_nodes(interface.nodesByNum)
+
+    def node_updated(node, interface):
+        census.update_node(node)
+
+    pub.subscribe(node_updated, "meshtastic.node.updated")
+    run_periodically(lambda: census.load_nodes(interface.nodesByNum), CENSUS_RELOAD_INTERVAL, name='census-reload')
+
+    # Expire unanswered packets and run delivery retries in the background
+    ledger.my_node_num = interface.myInfo.my_node_num
+    run_periodically(ledger.sweep, 5, name='delivery-sweep')
+
+    # Negotiate the sync wire format with peer BBS nodes
+    load_peer_versions()
+    announce_sync_version(interface.bbs_nodes, interface)
+    run_periodically(lambda: transfers.sweep(interface), 10, name='sync-transfer-sweep')
+    run_periodically(lambda: broadcasts.sweep(interface), 10, name='sync-broadcast-sweep')
+    run_periodically(lambda: reconcile_with_peers(interface.bbs_nodes, interface), RECONCILE_INTERVAL,
+                     name='sync-reconcile')
+
     # Initialize and start JS8Call Client if configured
     js8call_client = JS8CallClient(interface)
     js8call_client.logger = js8call_logger
@@ -85,9 +135,9 @@ def main():
 
     except KeyboardInterrupt:
         logging.info("Shutting down the server...")
+        dispatcher.shutdown(wait=False)
         interface.close()
-        if js8call_client.connected:
-            js8call_client.close()
+        js8call_client.close()
 
 if __name__ == "__main__":
     main()
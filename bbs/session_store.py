@@ -0,0 +1,150 @@
+"""
+User session store.
+
+Holds the menu state of every user talking to the BBS (which menu they are
+in, half-written mail and bulletins, ...). Sessions are kept in LRU order and
+dropped after SESSION_TTL seconds of inactivity, or oldest-first once the
+store grows past MAX_SESSIONS entries or MAX_SESSION_BYTES of state. Every
+change is written through to the user_sessions table so conversations in
+progress survive a restart.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_TTL = 3600
+MAX_SESSIONS = 1000
+MAX_SESSION_BYTES = 4 * 1024 * 1024
+
+
+class SessionStore:
+    def __init__(self, ttl=SESSION_TTL, max_sessions=MAX_SESSIONS, max_bytes=MAX_SESSION_BYTES, persist=True):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.persist = persist
+        # user_id -> (state, size in bytes, last active)
+        self.sessions = OrderedDict()
+        self.total_bytes = 0
+        self.evictions = {'ttl': 0, 'capacity': 0}
+        self.lock = threading.Lock()
+
+    def _drop(self, user_id):
+        _, size, _ = self.sessions.pop(user_id)
+        self.total_bytes -= size
+
+    def _evict_over_capacity(self):
+        evicted = []
+        while self.sessions and (len(self.sessions) > self.max_sessions or self.total_bytes > self.max_bytes):
+            user_id = next(iter(self.sessions))
+            self._drop(user_id)
+            self.evictions['capacity'] += 1
+            evicted.append(user_id)
+        return evicted
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.sessions.get(user_id)
+            if entry is None:
+                return None
+            state, size, last_active = entry
+            if time.time() - last_active > self.ttl:
+                self._drop(user_id)
+                self.evictions['ttl'] += 1
+                expired = True
+            else:
+                self.sessions[user_id] = (state, size, time.time())
+                self.sessions.move_to_end(user_id)
+                expired = False
+        if expired:
+            self._delete_persisted([user_id])
+            return None
+        return state
+
+    def set(self, user_id, state):
+        if state is None:
+            self.clear(user_id)
+            return
+
+        serialized = json.dumps(state, default=str)
+        now = time.time()
+        with self.lock:
+            if user_id in self.sessions:
+                self._drop(user_id)
+            self.sessions[user_id] = (state, len(serialized), now)
+            self.total_bytes += len(serialized)
+            evicted = self._evict_over_capacity()
+
+        if self.persist:
+            try:
+                from db_operations import save_user_session  # Import here to avoid circular import
+                save_user_session(user_id, serialized, int(now))
+            except Exception as e:
+                logging.warning(f"Failed to persist session for {user_id}: {e}")
+        self._delete_persisted(evicted)
+
+    def clear(self, user_id):
+        with self.lock:
+            if user_id in self.sessions:
+                self._drop(user_id)
+        self._delete_persisted([user_id])
+
+    def sweep(self):
+        """Drop sessions idle for longer than the TTL"""
+        cutoff = time.time() - self.ttl
+        with self.lock:
+            expired = [user_id for user_id, (_, _, last_active) in self.sessions.items() if last_active < cutoff]
+            for user_id in expired:
+                self._drop(user_id)
+            self.evictions['ttl'] += len(expired)
+        if expired:
+            logging.info(f"Expired {len(expired)} idle user session(s)")
+            self._delete_persisted(expired)
+        return len(expired)
+
+    def load(self):
+        """Restore unexpired sessions from the database after a restart"""
+        if not self.persist:
+            return 0
+        from db_operations import get_user_sessions  # Import here to avoid circular import
+
+        cutoff = time.time() - self.ttl
+        restored = 0
+        stale = []
+        with self.lock:
+            for user_id, serialized, updated_at in get_user_sessions():
+                if updated_at < cutoff:
+                    stale.append(user_id)
+                    continue
+                try:
+                    state = json.loads(serialized)
+                except ValueError:
+                    continue
+                self.sessions[user_id] = (state, len(serialized), updated_at)
+                self.total_bytes += len(serialized)
+                restored += 1
+            evicted = self._evict_over_capacity()
+        self._delete_persisted(stale + evicted)
+        logging.info(f"Restored {restored} user session(s)")
+        return restored
+
+    def _delete_persisted(self, user_ids):
+        if not self.persist or not user_ids:
+            return
+        try:
+            from db_operations import delete_user_sessions  # Import here to avoid circular import
+            delete_user_sessions(user_ids)
+        except Exception as e:
+            logging.warning(f"Failed to delete persisted sessions: {e}")
+
+    def stats(self):
+        with self.lock:
+            return {
+                'active': len(self.sessions),
+                'bytes': self.total_bytes,
+                'evicted_ttl': self.evictions['ttl'],
+                'evicted_capacity': self.evictions['capacity']
+            }
@@ -0,0 +1,102 @@
+"""
+Broadcast sync mode.
+
+With `channel_index` set in the [sync] section, a sync message meant for
+several peers is published once as a broadcast on that (encrypted) channel
+instead of being unicast to every peer. Peers accept it because the sender is
+in their bbs_nodes, and confirm with a small unicast
+
+    ~A<message hash:8 hex>
+
+Peers that haven't confirmed within BROADCAST_ACK_TIMEOUT of the last packet
+going out (plus time for one round of chunk repair on a long broadcast) get
+the message by unicast, and missing chunks of a long broadcast are requested and resent by
+unicast as usual (see sync_transfer), so only the repair traffic grows with
+the number of peers.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+
+from meshtastic import BROADCAST_NUM
+
+from sync_protocol import BROADCAST_ACK_PREFIX
+
+BROADCAST_ACK_TIMEOUT = 90
+
+
+def message_hash(message):
+    return hashlib.blake2b(message.encode('utf-8'), digest_size=4).hexdigest()
+
+
+def ack_frame(message):
+    return f"{BROADCAST_ACK_PREFIX}{message_hash(message)}"
+
+
+class BroadcastSync:
+    def __init__(self):
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def publish(self, message, peers, interface, channel_index):
+        """Send one sync message to several peers with a single broadcast"""
+        from utils import SEND_INTERVAL, send_message  # Import here to avoid circular import
+        from sync_transfer import GAP_TIMEOUT, MAX_PACKET_SIZE, TransferError, transfers
+
+        digest = message_hash(message)
+        timeout = BROADCAST_ACK_TIMEOUT
+        # Not swept until sent_at is set: sending blocks for SEND_INTERVAL per packet
+        with self.lock:
+            self.pending[digest] = {'message': message, 'peers': set(peers), 'sent_at': None}
+
+        logging.info(f"SERVER SYNC: Broadcasting sync message on channel {channel_index} to {len(peers)} peers")
+        if len(message) > MAX_PACKET_SIZE:
+            try:
+                chunks = transfers.send(message, BROADCAST_NUM, interface, channel_index=channel_index)
+            except TransferError as e:
+                logging.warning(f"SERVER SYNC: Not broadcasting sync message: {e}")
+                with self.lock:
+                    self.pending.pop(digest, None)
+                return
+            # Peers wait GAP_TIMEOUT before asking for missing chunks, which are then resent one by one
+            timeout += GAP_TIMEOUT + chunks * SEND_INTERVAL
+        else:
+            send_message(message, BROADCAST_NUM, interface, kind='sync', channel_index=channel_index)
+
+        with self.lock:
+            entry = self.pending.get(digest)
+            if entry is not None:
+                entry['sent_at'] = time.time()
+                entry['timeout'] = timeout
+
+    def handle_ack(self, peer_id, frame):
+        digest = frame[len(BROADCAST_ACK_PREFIX):]
+        with self.lock:
+            entry = self.pending.get(digest)
+            if entry is None:
+                return
+            entry['peers'].discard(peer_id)
+            if not entry['peers']:
+                del self.pending[digest]
+
+    def sweep(self, interface):
+        """Unicast expired broadcasts to the peers that never confirmed them"""
+        from utils import send_sync_frame  # Import here to avoid circular import
+
+        now = time.time()
+        with self.lock:
+            expired = [(digest, entry) for digest, entry in self.pending.items()
+                       if entry['sent_at'] is not None and now - entry['sent_at'] > entry['timeout']]
+            for digest, entry in expired:
+                del self.pending[digest]
+
+        for digest, entry in expired:
+            logging.info(f"SERVER SYNC: Broadcast {digest} unconfirmed by {', '.join(sorted(entry['peers']))}, "
+                         f"falling back to unicast")
+            for node_id in entry['peers']:
+                send_sync_frame(entry['message'], node_id, interface)
+
+
+broadcasts = BroadcastSync()
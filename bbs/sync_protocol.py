@@ -0,0 +1,390 @@
+"""
+BBS-to-BBS sync wire format.
+
+Two encodings are understood:
+
+Legacy (version 1) - the original pipe-delimited text, e.g.
+    MAIL|sender|short|recipient|subject|content|uuid
+
+Compact (version 2+) - a binary frame sent as text:
+    "~S" + base85(header, type, fields)
+where header is (version << 4 | flags), each field is varint length-prefixed
+UTF-8, UUIDs and !hex node ids are packed into raw bytes, and the field block
+is raw-deflate compressed against a preset dictionary of common BBS text when
+that makes it smaller.
+
+Messages too long for one packet are sent to version 3+ peers as a chunked
+transfer (see sync_transfer): "~C" chunk frames, with "~N" frames asking for
+missing chunks.
+
+Version 5 peers can also receive sync messages as a single broadcast on a
+dedicated channel and confirm them with "~A" frames (see sync_broadcast).
+
+Peers announce their version with SYNC_HELLO / SYNC_HELLO_ACK, which legacy
+peers ignore, so they keep getting the legacy format.
+"""
+
+import base64
+import hashlib
+import logging
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+
+LEGACY_VERSION = 1
+COMPACT_VERSION = 2
+CHUNKED_VERSION = 3
+RECONCILE_VERSION = 4
+BROADCAST_VERSION = 5
+SYNC_PROTOCOL_VERSION = BROADCAST_VERSION
+
+FRAME_PREFIX = "~S"
+CHUNK_PREFIX = "~C"
+NACK_PREFIX = "~N"
+BROADCAST_ACK_PREFIX = "~A"
+HELLO_PREFIX = "SYNC_HELLO|"
+HELLO_ACK_PREFIX = "SYNC_HELLO_ACK|"
+
+FLAG_COMPRESSED = 0x01
+
+# Message type -> (wire type id, field names). Field names ending in _id are
+# packed as UUIDs / node ids when they have that shape; fields ending in _data
+# carry raw bytes.
+MESSAGE_TYPES = {
+    'BULLETIN': (1, ('board', 'sender_short_name', 'subject', 'content', 'unique_id')),
+    'MAIL': (2, ('sender_id', 'sender_short_name', 'recipient_id', 'subject', 'content', 'unique_id')),
+    'DELETE_BULLETIN': (3, ('unique_id',)),
+    'DELETE_MAIL': (4, ('unique_id',)),
+    'CHANNEL': (5, ('name', 'url')),
+    # Anti-entropy reconciliation (see sync_reconcile), compact-only
+    'DIGEST': (6, ('digest_data',)),
+    'BUCKETS': (7, ('set_name', 'bucket_data')),
+    'IDS': (8, ('set_name', 'mask_data', 'ids_data')),
+    'WANT': (9, ('set_name', 'ids_data')),
+}
+TYPES_BY_ID = {type_id: (name, fields) for name, (type_id, fields) in MESSAGE_TYPES.items()}
+
+LEGACY_TYPES = ('BULLETIN', 'MAIL', 'DELETE_BULLETIN', 'DELETE_MAIL', 'CHANNEL')
+LEGACY_PREFIXES = tuple(f"{name}|" for name in LEGACY_TYPES)
+
+# Strings that show up constantly in bulletins and mail. Deflate finds matches
+# near the end of the dictionary cheapest, so the most common text goes last.
+PRESET_DICTIONARY = (
+    b"https://meshtastic.org/e/#http://www.com.org "
+    b"frequency repeater antenna battery solar power outage storm weather "
+    b"forecast tonight tomorrow today meeting net check-in test testing range "
+    b"signal channel node nodes mesh Meshtastic LoRa radio BBS bulletin mail "
+    b"message please thanks Thank you! anyone everyone looking for "
+    b"General Info News Urgent Re: Re: "
+    b"the and for you are with this that have from will not can was our all "
+    b"your has been is to of in on at it we I a "
+)
+
+# Packed value kinds. String lengths are stored +1, so a zero length byte
+# introduces one of these instead
+PACKED_UUID = 0x00
+PACKED_NODE_ID = 0x01
+
+NODE_ID_RE = re.compile(r'^![0-9a-f]{8}$')
+
+# Received sync messages remembered for duplicate suppression
+RECENT_MESSAGES_SIZE = 512
+RECENT_MESSAGES_WINDOW = 600
+
+
+class SyncDecodeError(ValueError):
+    pass
+
+
+# ---------- varints ----------
+
+def write_varint(out, value):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise SyncDecodeError("Truncated varint")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+# ---------- fields ----------
+
+def _encode_field(out, name, value):
+    if name.endswith('_data'):
+        write_varint(out, len(value) + 1)
+        out.extend(value)
+        return
+
+    value = '' if value is None else str(value)
+    if name.endswith('_id'):
+        try:
+            parsed = uuid.UUID(value)
+            if str(parsed) == value:
+                out.append(0)
+                out.append(PACKED_UUID)
+                out.extend(parsed.bytes)
+                return
+        except ValueError:
+            pass
+        if NODE_ID_RE.match(value):
+            out.append(0)
+            out.append(PACKED_NODE_ID)
+            out.extend(bytes.fromhex(value[1:]))
+            return
+
+    encoded = value.encode('utf-8')
+    # Length is stored +1 so that 0 is free to mark a packed value
+    write_varint(out, len(encoded) + 1)
+    out.extend(encoded)
+
+
+def _decode_field(data, pos, name):
+    length, pos = read_varint(data, pos)
+    if length == 0:
+        if pos >= len(data):
+            raise SyncDecodeError("Truncated packed field")
+        kind = data[pos]
+        pos += 1
+        if kind == PACKED_UUID:
+            raw = data[pos:pos + 16]
+            if len(raw) != 16:
+                raise SyncDecodeError("Truncated UUID")
+            return str(uuid.UUID(bytes=bytes(raw))), pos + 16
+        if kind == PACKED_NODE_ID:
+            raw = data[pos:pos + 4]
+            if len(raw) != 4:
+                raise SyncDecodeError("Truncated node id")
+            return f"!{bytes(raw).hex()}", pos + 4
+        raise SyncDecodeError(f"Unknown packed field kind {kind}")
+
+    end = pos + length - 1
+    if end > len(data):
+        raise SyncDecodeError("Truncated field")
+    if name.endswith('_data'):
+        return bytes(data[pos:end]), end
+    return bytes(data[pos:end]).decode('utf-8'), end
+
+
+# ---------- frames ----------
+
+def encode_legacy(msg_type, fields):
+    """Pipe-delimited text understood by every TC²-BBS peer"""
+    names = MESSAGE_TYPES[msg_type][1]
+    return "|".join([msg_type] + [str(fields[name]) for name in names])
+
+
+def encode_compact(msg_type, fields):
+    """Binary, optionally compressed frame for peers at COMPACT_VERSION or later"""
+    type_id, names = MESSAGE_TYPES[msg_type]
+
+    body = bytearray()
+    for name in names:
+        _encode_field(body, name, fields.get(name))
+
+    flags = 0
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, PRESET_DICTIONARY)
+    compressed = compressor.compress(bytes(body)) + compressor.flush()
+    if len(compressed) < len(body):
+        body = compressed
+        flags |= FLAG_COMPRESSED
+
+    frame = bytes([(COMPACT_VERSION << 4) | flags, type_id]) + bytes(body)
+    return FRAME_PREFIX + base64.b85encode(frame).decode('ascii')
+
+
+def decode_compact(message):
+    """Return (msg_type, fields) from a compact frame"""
+    try:
+        frame = base64.b85decode(message[len(FRAME_PREFIX):])
+    except ValueError as e:
+        raise SyncDecodeError(f"Bad frame encoding: {e}")
+    if len(frame) < 2:
+        raise SyncDecodeError("Frame too short")
+
+    version, flags = frame[0] >> 4, frame[0] & 0x0F
+    if version < COMPACT_VERSION:
+        raise SyncDecodeError(f"Unsupported frame version {version}")
+    if frame[1] not in TYPES_BY_ID:
+        raise SyncDecodeError(f"Unknown message type {frame[1]}")
+    msg_type, names = TYPES_BY_ID[frame[1]]
+
+    body = frame[2:]
+    if flags & FLAG_COMPRESSED:
+        try:
+            decompressor = zlib.decompressobj(-15, PRESET_DICTIONARY)
+            body = decompressor.decompress(body) + decompressor.flush()
+        except zlib.error as e:
+            raise SyncDecodeError(f"Bad compressed body: {e}")
+
+    fields = {}
+    pos = 0
+    for name in names:
+        fields[name], pos = _decode_field(body, pos, name)
+    return msg_type, fields
+
+
+def decode_legacy(message):
+    """Return (msg_type, fields) from a pipe-delimited message.
+
+    The unique_id is always last, so it is split off from the right and any
+    '|' characters inside the content survive.
+    """
+    msg_type = message.split("|", 1)[0]
+    if msg_type not in LEGACY_TYPES:
+        raise SyncDecodeError(f"Unknown sync message type {msg_type}")
+    names = MESSAGE_TYPES[msg_type][1]
+
+    if names[-1] == 'unique_id' and len(names) > 1:
+        head, _, unique_id = message.rpartition("|")
+        parts = head.split("|", len(names) - 1)[1:]
+        parts.append(unique_id)
+    else:
+        parts = message.split("|", len(names))[1:]
+
+    if len(parts) != len(names):
+        raise SyncDecodeError(f"Malformed {msg_type} sync message")
+    return msg_type, dict(zip(names, parts))
+
+
+def decode(message):
+    """Return (msg_type, fields) for a sync message in either format"""
+    if message.startswith(FRAME_PREFIX):
+        return decode_compact(message)
+    return decode_legacy(message)
+
+
+def is_sync_message(message):
+    return (message.startswith((FRAME_PREFIX, CHUNK_PREFIX, NACK_PREFIX, BROADCAST_ACK_PREFIX)) or message.startswith(LEGACY_PREFIXES)
+            or message.startswith(HELLO_PREFIX) or message.startswith(HELLO_ACK_PREFIX))
+
+
+def frame_version(message):
+    """Protocol version a received sync message proves its sender speaks"""
+    if message.startswith(BROADCAST_ACK_PREFIX):
+        return BROADCAST_VERSION
+    if message.startswith((CHUNK_PREFIX, NACK_PREFIX)):
+        return CHUNKED_VERSION
+    if message.startswith(FRAME_PREFIX):
+        try:
+            return base64.b85decode(message[len(FRAME_PREFIX):len(FRAME_PREFIX) + 5])[0] >> 4
+        except (ValueError, IndexError):
+            return LEGACY_VERSION
+    return LEGACY_VERSION
+
+
+# ---------- duplicate suppression ----------
+
+class RecentMessages:
+    """LRU of recently received sync messages.
+
+    Retransmissions, relayed copies and broadcast/unicast fallbacks of the same
+    message are recognised by hash and dropped before they reach the database.
+    """
+
+    def __init__(self, size=RECENT_MESSAGES_SIZE, window=RECENT_MESSAGES_WINDOW):
+        self.size = size
+        self.window = window
+        self.entries = OrderedDict()
+        self.accepted = 0
+        self.duplicates = 0
+        self.lock = threading.Lock()
+
+    def check(self, message, scope=''):
+        """Return True the first time a message is seen within the window;
+        the same message under another scope (a peer id) counts as new"""
+        key = hashlib.blake2b(f"{scope}\n{message}".encode('utf-8'), digest_size=8).digest()
+        now = time.time()
+        with self.lock:
+            seen_at = self.entries.get(key)
+            if seen_at is not None and now - seen_at < self.window:
+                self.entries.move_to_end(key)
+                self.duplicates += 1
+                return False
+            self.entries[key] = now
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+            self.accepted += 1
+            return True
+
+    def stats(self):
+        with self.lock:
+            return {'accepted': self.accepted, 'duplicates': self.duplicates, 'tracked': len(self.entries)}
+
+
+recent_messages = RecentMessages()
+
+
+# ---------- version negotiation ----------
+
+peer_versions = {}
+peer_versions_lock = threading.Lock()
+
+
+def load_peer_versions():
+    """Seed the peer table from the database"""
+    from db_operations import get_sync_peer_versions  # Import here to avoid circular import
+    with peer_versions_lock:
+        peer_versions.update(get_sync_peer_versions())
+
+
+def get_peer_version(node_id):
+    with peer_versions_lock:
+        return peer_versions.get(node_id, LEGACY_VERSION)
+
+
+def set_peer_version(node_id, version):
+    with peer_versions_lock:
+        if peer_versions.get(node_id) == version:
+            return
+        peer_versions[node_id] = version
+    logging.info(f"SERVER SYNC: Peer {node_id} speaks sync protocol version {version}")
+    try:
+        from db_operations import save_sync_peer_version  # Import here to avoid circular import
+        save_sync_peer_version(node_id, version)
+    except Exception as e:
+        logging.warning(f"Failed to persist sync peer version: {e}")
+
+
+def hello_message(ack=False):
+    return f"{HELLO_ACK_PREFIX if ack else HELLO_PREFIX}{SYNC_PROTOCOL_VERSION}"
+
+
+def parse_hello(message):
+    """Return (version, is_ack) for a SYNC_HELLO / SYNC_HELLO_ACK message"""
+    is_ack = message.startswith(HELLO_ACK_PREFIX)
+    try:
+        version = int(message.split("|", 1)[1].strip())
+    except (IndexError, ValueError):
+        raise SyncDecodeError(f"Malformed hello: {message}")
+    return version, is_ack
+
+
+def is_hello(message):
+    return message.startswith(HELLO_PREFIX) or message.startswith(HELLO_ACK_PREFIX)
+
+
+def encode_for_peer(msg_type, fields, node_id):
+    """Encode a sync message in the best format the peer understands"""
+    if msg_type not in LEGACY_TYPES or get_peer_version(node_id) >= COMPACT_VERSION:
+        return encode_compact(msg_type, fields)
+    return encode_legacy(msg_type, fields)
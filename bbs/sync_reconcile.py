@@ -0,0 +1,280 @@
+"""
+Anti-entropy reconciliation between BBS peers.
+
+Flooded sync messages can be lost, so every RECONCILE_INTERVAL the BBS
+compares its content with each peer and transfers only what differs. Content
+is split into sets (mail, the bulletins of each board, delete tombstones) and
+each set is summarised by its size and the XOR of an 8-byte hash of every
+unique_id in it, which is cheap to keep and order-independent.
+
+    A -> B  DIGEST   count + root hash of every set
+    B -> A  BUCKETS  16 bucket hashes, only for sets whose root differs
+    A -> B  IDS      item hashes in some of the buckets that differ
+    B -> A  WANT     hashes B is missing; both sides push what the other lacks
+
+When nothing has changed reconciliation costs one DIGEST packet per peer.
+Pushed items are ordinary BULLETIN / MAIL / DELETE_* sync messages.
+
+An IDS message covers whole sub-buckets (items sharing the first hash byte)
+of the differing buckets, at most MAX_IDS hashes, so a peer that is new or
+was offline for long doesn't get the whole board at once. Each round starts
+after the sub-bucket where the previous round to that peer stopped, and
+later reconcile cycles cover the rest.
+"""
+
+import hashlib
+import logging
+import struct
+import threading
+
+from sync_protocol import RECONCILE_VERSION, SyncDecodeError, get_peer_version, read_varint, write_varint
+
+RECONCILE_INTERVAL = 1800
+
+# Deletes are remembered this long; a peer offline for longer may bring
+# deleted items back
+TOMBSTONE_TTL = 90 * 24 * 3600
+
+BUCKETS = 16
+HASH_SIZE = 8
+
+# Items pushed per message, the rest follow in the next round
+MAX_PUSH = 20
+
+# Item hashes per IDS message
+MAX_IDS = 64
+SUB_BUCKETS = 256
+
+# (peer, set name) -> sub-bucket the next IDS message to that peer starts from
+ids_cursors = {}
+ids_cursors_lock = threading.Lock()
+
+MAIL_SET = 'm'
+TOMBSTONE_SET = 't'
+BULLETIN_SET_PREFIX = 'b:'
+
+
+def item_hash(unique_id):
+    return hashlib.blake2b(unique_id.encode('utf-8'), digest_size=HASH_SIZE).digest()
+
+
+def bucket_of(item):
+    return item[0] >> 4
+
+
+def sub_bucket_of(item):
+    return item[0]
+
+
+def decode_mask(mask_data):
+    """Return a predicate for the items an IDS mask covers"""
+    mask = int.from_bytes(mask_data, 'big')
+    if len(mask_data) == BUCKETS // 8:
+        return lambda item: bool(mask & (1 << bucket_of(item)))
+    if len(mask_data) == SUB_BUCKETS // 8:
+        return lambda item: bool(mask & (1 << sub_bucket_of(item)))
+    raise SyncDecodeError("Bad bucket mask")
+
+
+def select_ids(peer_id, name, items, differing):
+    """(mask_data, ids_data) for whole sub-buckets of the differing buckets, at most MAX_IDS hashes"""
+    groups = {}
+    for item in items:
+        if bucket_of(item) in differing:
+            groups.setdefault(sub_bucket_of(item), []).append(item)
+
+    with ids_cursors_lock:
+        cursor = ids_cursors.get((peer_id, name), 0)
+    # Sub-buckets from the cursor on, wrapping around; empty ones are covered for free
+    order = [(cursor + i) % SUB_BUCKETS for i in range(SUB_BUCKETS)]
+    mask = 0
+    ids = []
+    for sub_bucket in order:
+        if sub_bucket >> 4 not in differing:
+            continue
+        group = groups.get(sub_bucket, [])
+        if ids and len(ids) + len(group) > MAX_IDS:
+            cursor = sub_bucket
+            break
+        # A sub-bucket larger than MAX_IDS on its own is still sent whole
+        mask |= 1 << sub_bucket
+        ids.extend(group)
+    else:
+        cursor = 0
+    with ids_cursors_lock:
+        ids_cursors[(peer_id, name)] = cursor
+    return mask.to_bytes(SUB_BUCKETS // 8, 'big'), b"".join(sorted(ids))
+
+
+def build_sets():
+    """Return {set name: {item hash: unique_id}} for everything we hold"""
+    from db_operations import get_sync_inventory, get_tombstones  # Import here to avoid circular import
+
+    bulletins, mail = get_sync_inventory()
+    sets = {MAIL_SET: {item_hash(unique_id): unique_id for unique_id in mail}}
+    for board, unique_id in bulletins:
+        name = BULLETIN_SET_PREFIX + board.lower()
+        sets.setdefault(name, {})[item_hash(unique_id)] = unique_id
+    sets[TOMBSTONE_SET] = {item_hash(unique_id): unique_id for unique_id, kind in get_tombstones()}
+    return sets
+
+
+def set_root(items):
+    root = 0
+    for item in items:
+        root ^= int.from_bytes(item, 'big')
+    return root
+
+
+def bucket_hashes(items):
+    hashes = [0] * BUCKETS
+    for item in items:
+        hashes[bucket_of(item)] ^= int.from_bytes(item[:4], 'big')
+    return hashes
+
+
+# ---------- payloads ----------
+
+def encode_digest(sets):
+    out = bytearray()
+    for name, items in sorted(sets.items()):
+        encoded = name.encode('utf-8')
+        write_varint(out, len(encoded))
+        out.extend(encoded)
+        write_varint(out, len(items))
+        out.extend(set_root(items).to_bytes(HASH_SIZE, 'big'))
+    return bytes(out)
+
+
+def decode_digest(data):
+    """Return {set name: (count, root)}"""
+    digest = {}
+    pos = 0
+    while pos < len(data):
+        length, pos = read_varint(data, pos)
+        name = data[pos:pos + length].decode('utf-8')
+        pos += length
+        count, pos = read_varint(data, pos)
+        root = data[pos:pos + HASH_SIZE]
+        if len(root) != HASH_SIZE:
+            raise SyncDecodeError("Truncated digest")
+        pos += HASH_SIZE
+        digest[name] = (count, int.from_bytes(root, 'big'))
+    return digest
+
+
+def encode_buckets(hashes):
+    return struct.pack(f'>{BUCKETS}I', *hashes)
+
+
+def decode_buckets(data):
+    if len(data) != BUCKETS * 4:
+        raise SyncDecodeError("Bad bucket list")
+    return list(struct.unpack(f'>{BUCKETS}I', data))
+
+
+def split_hashes(data):
+    if len(data) % HASH_SIZE:
+        raise SyncDecodeError("Bad item hash list")
+    return {data[i:i + HASH_SIZE] for i in range(0, len(data), HASH_SIZE)}
+
+
+# ---------- protocol ----------
+
+def start_reconciliation(node_id, interface):
+    from utils import send_sync_message  # Import here to avoid circular import
+    send_sync_message('DIGEST', {'digest_data': encode_digest(build_sets())}, [node_id], interface)
+
+
+def reconcile_with_peers(bbs_nodes, interface):
+    """Periodic task: send our digest to every peer that understands it"""
+    from db_operations import prune_tombstones  # Import here to avoid circular import
+
+    pruned = prune_tombstones(TOMBSTONE_TTL)
+    if pruned:
+        logging.info(f"SERVER SYNC: Pruned {pruned} expired tombstone(s)")
+
+    for node_id in bbs_nodes:
+        if get_peer_version(node_id) >= RECONCILE_VERSION:
+            start_reconciliation(node_id, interface)
+
+
+def handle_reconcile_message(peer_id, msg_type, fields, interface):
+    from utils import send_sync_message  # Import here to avoid circular import
+
+    sets = build_sets()
+
+    if msg_type == 'DIGEST':
+        theirs = decode_digest(fields['digest_data'])
+        differing = [name for name in sorted(set(theirs) | set(sets))
+                     if theirs.get(name, (0, 0)) != (len(sets.get(name, {})), set_root(sets.get(name, {})))]
+        if not differing:
+            logging.info(f"SERVER SYNC: In sync with {peer_id}")
+            return
+        logging.info(f"SERVER SYNC: {len(differing)} set(s) differ from {peer_id}: {', '.join(differing)}")
+        for name in differing:
+            send_sync_message('BUCKETS', {'set_name': name,
+                                          'bucket_data': encode_buckets(bucket_hashes(sets.get(name, {})))},
+                              [peer_id], interface)
+
+    elif msg_type == 'BUCKETS':
+        name = fields['set_name']
+        theirs = decode_buckets(fields['bucket_data'])
+        mine = sets.get(name, {})
+        differing = {i for i, h in enumerate(bucket_hashes(mine)) if h != theirs[i]}
+        if not differing:
+            return
+        mask_data, ids = select_ids(peer_id, name, mine, differing)
+        send_sync_message('IDS', {'set_name': name, 'mask_data': mask_data, 'ids_data': ids},
+                          [peer_id], interface)
+
+    elif msg_type == 'IDS':
+        name = fields['set_name']
+        covered = decode_mask(fields['mask_data'])
+        theirs = split_hashes(fields['ids_data'])
+        mine = sets.get(name, {})
+        ours = {item for item in mine if covered(item)}
+
+        push_items(peer_id, name, [mine[item] for item in ours - theirs], interface)
+
+        wanted = theirs - ours
+        if name != TOMBSTONE_SET:
+            # Don't ask for things we deleted
+            wanted -= set(sets[TOMBSTONE_SET])
+        if wanted:
+            send_sync_message('WANT', {'set_name': name, 'ids_data': b"".join(sorted(wanted)[:MAX_PUSH])},
+                              [peer_id], interface)
+
+    elif msg_type == 'WANT':
+        name = fields['set_name']
+        mine = sets.get(name, {})
+        push_items(peer_id, name, [mine[item] for item in split_hashes(fields['ids_data']) if item in mine],
+                   interface)
+
+
+def push_items(peer_id, name, unique_ids, interface):
+    """Send a peer the items of a set it is missing"""
+    from db_operations import get_bulletin_by_unique_id, get_mail_by_unique_id, get_tombstones  # Import here to avoid circular import
+    from utils import (send_bulletin_to_bbs_nodes, send_delete_bulletin_to_bbs_nodes,
+                       send_delete_mail_to_bbs_nodes, send_mail_to_bbs_nodes)
+
+    if not unique_ids:
+        return
+    logging.info(f"SERVER SYNC: Pushing {min(len(unique_ids), MAX_PUSH)} of {len(unique_ids)} missing item(s) "
+                 f"of set {name} to {peer_id}")
+
+    kinds = dict(get_tombstones()) if name == TOMBSTONE_SET else {}
+    for unique_id in unique_ids[:MAX_PUSH]:
+        if name == TOMBSTONE_SET:
+            if kinds.get(unique_id) == 'mail':
+                send_delete_mail_to_bbs_nodes(unique_id, [peer_id], interface)
+            else:
+                send_delete_bulletin_to_bbs_nodes(unique_id, [peer_id], interface)
+        elif name == MAIL_SET:
+            mail = get_mail_by_unique_id(unique_id)
+            if mail:
+                send_mail_to_bbs_nodes(*mail, unique_id, [peer_id], interface)
+        else:
+            bulletin = get_bulletin_by_unique_id(unique_id)
+            if bulletin:
+                send_bulletin_to_bbs_nodes(*bulletin, unique_id, [peer_id], interface)
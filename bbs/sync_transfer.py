@@ -0,0 +1,196 @@
+"""
+Chunked transfers for BBS-to-BBS sync.
+
+A sync message longer than one packet is split into chunk frames
+
+    ~C<transfer id:4 hex><seq:2 hex><total:2 hex><payload>
+
+that the peer reassembles before handing the whole message back to
+process_sync_message. If chunks stop arriving before the transfer is complete
+the receiver asks for just the missing ones with
+
+    ~N<transfer id:4 hex><seq:2 hex><seq:2 hex>...
+
+and the sender retransmits those chunks from its recent-transfer cache.
+"""
+
+import logging
+import random
+import threading
+import time
+
+from meshtastic import BROADCAST_NUM
+
+from sync_protocol import CHUNK_PREFIX, NACK_PREFIX
+
+MAX_PACKET_SIZE = 200
+CHUNK_HEADER_SIZE = len(CHUNK_PREFIX) + 8
+CHUNK_PAYLOAD_SIZE = MAX_PACKET_SIZE - CHUNK_HEADER_SIZE
+MAX_CHUNKS = 0xFF
+
+# Seconds without a new chunk before the receiver asks for the missing ones.
+# send_message paces packets 2s apart, so this leaves room for mesh latency.
+GAP_TIMEOUT = 45
+MAX_NACKS = 3
+
+# Incomplete transfers are abandoned after this long; anything lost for good
+# is left to the next reconciliation
+TRANSFER_TIMEOUT = 600
+
+# How long sent transfers are kept around to answer retransmit requests, and
+# how long received ones are remembered so late or duplicated chunks are dropped
+OUTGOING_TTL = 900
+
+# Seq numbers per retransmit request, so the request fits in one packet
+MAX_NACK_SEQS = (MAX_PACKET_SIZE - len(NACK_PREFIX) - 4) // 2
+
+
+class TransferError(ValueError):
+    pass
+
+
+def split_chunks(message, transfer_id):
+    payloads = [message[i:i + CHUNK_PAYLOAD_SIZE] for i in range(0, len(message), CHUNK_PAYLOAD_SIZE)]
+    if len(payloads) > MAX_CHUNKS:
+        raise TransferError(f"Message of {len(message)} chars needs more than {MAX_CHUNKS} chunks")
+    total = len(payloads)
+    return [f"{CHUNK_PREFIX}{transfer_id:04x}{seq:02x}{total:02x}{payload}" for seq, payload in enumerate(payloads)]
+
+
+def parse_chunk(frame):
+    """Return (transfer_id, seq, total, payload) for a chunk frame"""
+    header = frame[len(CHUNK_PREFIX):CHUNK_HEADER_SIZE]
+    try:
+        transfer_id = int(header[0:4], 16)
+        seq = int(header[4:6], 16)
+        total = int(header[6:8], 16)
+    except ValueError:
+        raise TransferError(f"Malformed chunk header: {header!r}")
+    if total == 0 or seq >= total:
+        raise TransferError(f"Chunk {seq} out of range for {total}-chunk transfer")
+    return transfer_id, seq, total, frame[CHUNK_HEADER_SIZE:]
+
+
+def parse_nack(frame):
+    """Return (transfer_id, [missing seqs]) for a retransmit request"""
+    body = frame[len(NACK_PREFIX):]
+    try:
+        transfer_id = int(body[0:4], 16)
+        seqs = [int(body[i:i + 2], 16) for i in range(4, len(body), 2)]
+    except ValueError:
+        raise TransferError(f"Malformed retransmit request: {frame!r}")
+    return transfer_id, seqs
+
+
+class SyncTransfers:
+    def __init__(self):
+        self.next_id = random.randrange(0x10000)
+        self.outgoing = {}
+        self.incoming = {}
+        # (node_id, transfer_id) -> time reassembled
+        self.completed = {}
+        self.lock = threading.Lock()
+
+    def _new_transfer_id(self):
+        with self.lock:
+            transfer_id = self.next_id
+            self.next_id = (self.next_id + 1) & 0xFFFF
+            return transfer_id
+
+    def send(self, message, node_id, interface, channel_index=0):
+        """Send a long sync message to one peer (or broadcast it) as a chunked transfer;
+        returns the number of chunks"""
+        from utils import send_message  # Import here to avoid circular import
+
+        transfer_id = self._new_transfer_id()
+        chunks = split_chunks(message, transfer_id)
+        with self.lock:
+            self.outgoing[(node_id, transfer_id)] = {'chunks': chunks, 'sent_at': time.time()}
+
+        logging.info(f"SERVER SYNC: Sending transfer {transfer_id:04x} to {node_id} in {len(chunks)} chunks")
+        for chunk in chunks:
+            # No app-level retries here: the receiver asks for what it missed
+            send_message(chunk, node_id, interface, kind='sync', channel_index=channel_index)
+        return len(chunks)
+
+    def handle_nack(self, node_id, frame, interface):
+        """Retransmit the chunks a peer reports missing"""
+        from utils import send_message  # Import here to avoid circular import
+
+        transfer_id, seqs = parse_nack(frame)
+        with self.lock:
+            # Chunks of a broadcast transfer are repaired by unicast to whoever asks
+            transfer = self.outgoing.get((node_id, transfer_id)) or self.outgoing.get((BROADCAST_NUM, transfer_id))
+        if transfer is None:
+            logging.info(f"SERVER SYNC: {node_id} asked for expired transfer {transfer_id:04x}")
+            return
+
+        chunks = transfer['chunks']
+        logging.info(f"SERVER SYNC: Retransmitting {len(seqs)} chunk(s) of transfer {transfer_id:04x} to {node_id}")
+        for seq in seqs:
+            if seq < len(chunks):
+                send_message(chunks[seq], node_id, interface, kind='sync')
+
+    def receive_chunk(self, node_id, frame, broadcast=False):
+        """Buffer a chunk; once all chunks are in, return (message, whether the
+        transfer started as a broadcast), otherwise None"""
+        transfer_id, seq, total, payload = parse_chunk(frame)
+        key = (node_id, transfer_id)
+        now = time.time()
+
+        with self.lock:
+            if key in self.completed:
+                # A relayed copy or retransmit of a chunk we already used
+                return None
+            transfer = self.incoming.get(key)
+            if transfer is None or transfer['total'] != total:
+                transfer = {'total': total, 'chunks': {}, 'first_seen': now, 'nacks': 0, 'broadcast': False}
+                self.incoming[key] = transfer
+            # Missing chunks of a broadcast arrive by unicast
+            transfer['broadcast'] = transfer['broadcast'] or broadcast
+            transfer['chunks'][seq] = payload
+            transfer['last_seen'] = now
+
+            if len(transfer['chunks']) < total:
+                return None
+            del self.incoming[key]
+            self.completed[key] = now
+
+        return "".join(transfer['chunks'][i] for i in range(total)), transfer['broadcast']
+
+    def sweep(self, interface):
+        """Ask for missing chunks of stalled transfers and drop stale state"""
+        from utils import send_message  # Import here to avoid circular import
+
+        now = time.time()
+        requests = []
+        with self.lock:
+            for key, transfer in list(self.incoming.items()):
+                if now - transfer['first_seen'] > TRANSFER_TIMEOUT or transfer['nacks'] >= MAX_NACKS:
+                    if now - transfer['last_seen'] > GAP_TIMEOUT:
+                        logging.warning(f"SERVER SYNC: Abandoning transfer {key[1]:04x} from {key[0]} with "
+                                        f"{len(transfer['chunks'])}/{transfer['total']} chunks")
+                        del self.incoming[key]
+                    continue
+                if now - transfer['last_seen'] > GAP_TIMEOUT:
+                    missing = [seq for seq in range(transfer['total']) if seq not in transfer['chunks']]
+                    transfer['nacks'] += 1
+                    # Restart the gap timer so the retransmission has time to arrive
+                    transfer['last_seen'] = now
+                    requests.append((key, missing[:MAX_NACK_SEQS]))
+
+            for key, transfer in list(self.outgoing.items()):
+                if now - transfer['sent_at'] > OUTGOING_TTL:
+                    del self.outgoing[key]
+
+            for key, completed_at in list(self.completed.items()):
+                if now - completed_at > OUTGOING_TTL:
+                    del self.completed[key]
+
+        for (node_id, transfer_id), missing in requests:
+            logging.info(f"SERVER SYNC: Requesting {len(missing)} missing chunk(s) of transfer {transfer_id:04x} from {node_id}")
+            frame = f"{NACK_PREFIX}{transfer_id:04x}" + "".join(f"{seq:02x}" for seq in missing)
+            send_message(frame, node_id, interface, kind='sync')
+
+
+transfers = SyncTransfers()
@@ -14,6 +14,8 @@ import meshtastic
 import meshtastic.tcp_interface
 import meshtastic.serial_interface
 
+from metrics import registry, start_server as start_metrics_server
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -26,6 +28,15 @@ logger = logging.getLogger(__name__)
 import os
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'shared', 'bulletins.db')
 
+# Telemetry packets closer together than this are duplicates, not the node's
+# reporting interval (same as db_operations.MIN_TELEMETRY_GAP)
+MIN_TELEMETRY_GAP = 60
+
+packets_received = registry.counter('telemetry_packets_received_total', "Packets received, by portnum", ['portnum'])
+rows_written = registry.counter('telemetry_rows_written_total', "Rows written, by table", ['table'])
+db_commit_seconds = registry.histogram('telemetry_db_commit_seconds', "Time to commit a write, by table", ['table'])
+write_errors = registry.counter('telemetry_write_errors_total', "Packets that could not be written, by table", ['table'])
+
 
 def get_db_connection():
     """Get database connection"""
@@ -33,6 +44,14 @@ def get_db_connection():
     return conn
 
 
+def commit(conn, table, rows=1):
+    """Commit, recording the latency and rows written"""
+    started = time.perf_counter()
+    conn.commit()
+    db_commit_seconds.observe(time.perf_counter() - started, table)
+    rows_written.inc(table, amount=rows)
+
+
 def log_telemetry(packet):
     """Log telemetry data (battery, voltage, temperature, etc.)"""
     try:
@@ -74,12 +93,37 @@ def log_telemetry(packet):
             device_metrics.get('uptimeSeconds')
         ))
 
-        conn.commit()
+        commit(conn, 'telemetry_logs')
+
+        # Track the node's telemetry cadence for the daily reliability summary
+        # (node_daily_stats is created by the BBS)
+        try:
+            local = time.localtime(timestamp)
+            day_bucket = local.tm_year * 10000 + local.tm_mon * 100 + local.tm_mday
+            c.execute("""
+                INSERT INTO node_daily_stats (
+                    sender_id, day_bucket, telemetry_count, telemetry_first_at, telemetry_last_at
+                ) VALUES (?, ?, 1, ?, ?)
+                ON CONFLICT(sender_id, day_bucket) DO UPDATE SET
+                    telemetry_count = telemetry_count + 1,
+                    telemetry_min_gap = CASE
+                        WHEN excluded.telemetry_last_at - telemetry_last_at >= ?
+                        THEN COALESCE(MIN(telemetry_min_gap, excluded.telemetry_last_at - telemetry_last_at),
+                                      excluded.telemetry_last_at - telemetry_last_at)
+                        ELSE telemetry_min_gap END,
+                    telemetry_first_at = COALESCE(MIN(telemetry_first_at, excluded.telemetry_first_at), excluded.telemetry_first_at),
+                    telemetry_last_at = COALESCE(MAX(telemetry_last_at, excluded.telemetry_last_at), excluded.telemetry_last_at)
+            """, (node_id, day_bucket, timestamp, timestamp, MIN_TELEMETRY_GAP))
+            commit(conn, 'node_daily_stats')
+        except sqlite3.Error as e:
+            write_errors.inc('node_daily_stats')
+            logger.warning(f"Could not update telemetry cadence: {e}")
         conn.close()
 
         logger.info(f"📊 Telemetry logged: {node_id} - Battery: {device_metrics.get('batteryLevel')}%")
 
     except Exception as e:
+        write_errors.inc('telemetry_logs')
         logger.error(f"Error logging telemetry: {e}")
 
 
@@ -133,12 +177,13 @@ def log_position(packet):
             position.get('satsInView')
         ))
 
-        conn.commit()
+        commit(conn, 'position_logs')
         conn.close()
 
         logger.info(f"📍 Position logged: {node_id} - {latitude:.4f}, {longitude:.4f}")
 
     except Exception as e:
+        write_errors.inc('position_logs')
         logger.error(f"Error logging position: {e}")
 
 
@@ -173,12 +218,13 @@ def log_neighbor_info(packet):
                 neighbor.get('lastHeard')
             ))
 
-        conn.commit()
+        commit(conn, 'neighbor_info', rows=len(neighbors))
         conn.close()
 
         logger.info(f"🔗 Neighbor info logged: {node_id} - {len(neighbors)} neighbors")
 
     except Exception as e:
+        write_errors.inc('neighbor_info')
         logger.error(f"Error logging neighbor info: {e}")
 
 
@@ -225,18 +271,22 @@ def update_node_info(packet, interface):
             timestamp
         ))
 
-        conn.commit()
+        commit(conn, 'node_info')
         conn.close()
 
         logger.info(f"ℹ️ Node info updated: {user.get('shortName')} ({node_id})")
 
     except Exception as e:
+        write_errors.inc('node_info')
         logger.error(f"Error updating node info: {e}")
 
 
 def on_receive(packet, interface):
     """Main packet handler - routes to appropriate logger"""
     try:
+        decoded = packet.get('decoded')
+        packets_received.inc(decoded.get('portnum', 'UNKNOWN') if decoded else 'ENCRYPTED')
+
         # Log different packet types
         log_telemetry(packet)
         log_position(packet)
@@ -259,6 +309,12 @@ def main():
 
     interface_type = config.get('interface', 'type', fallback='serial')
 
+    # A blank "telemetry_port =" leaves metrics off
+    metrics_port = config.get('metrics', 'telemetry_port', fallback='').strip()
+    metrics_port = int(metrics_port) if metrics_port else None
+    if metrics_port:
+        start_metrics_server(metrics_port, config.get('metrics', 'host', fallback='127.0.0.1'))
+
     try:
         # Connect to Meshtastic interface
         if interface_type == 'tcp':
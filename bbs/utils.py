@@ -1,23 +1,92 @@
+import hashlib
 import logging
+import threading
 import time
 
-user_states = {}
+from meshtastic import BROADCAST_NUM
+
+from delivery_tracker import ledger, onAckNak, SYNC_MAX_RETRIES
+from dispatcher import current_request
+from metrics import registry
+from session_store import SessionStore
+from sync_broadcast import broadcasts
+from sync_protocol import (
+    BROADCAST_VERSION, CHUNKED_VERSION, LEGACY_TYPES, encode_compact, encode_for_peer, get_peer_version, hello_message
+)
+from sync_transfer import MAX_PACKET_SIZE, TransferError, transfers
+
+user_states = SessionStore()
+
+# The same notification is broadcast at most once per key within this many seconds
+BROADCAST_DEDUP_WINDOW = 3600
+recent_broadcasts = {}
+recent_broadcasts_lock = threading.Lock()
+
+# Handlers run on several worker threads; the radio takes one packet at a time
+send_lock = threading.Lock()
+
+# Pause after each packet of a reply so the radio isn't flooded
+SEND_INTERVAL = 2
+
+send_queue_depth = registry.gauge('bbs_send_queue_depth', "Packets waiting for or holding the radio")
+packets_sent = registry.counter('bbs_packets_sent_total', "Packets handed to the radio, by kind", ['kind'])
 
 
 def update_user_state(user_id, state):
-    user_states[user_id] = state
+    user_states.set(user_id, state)
 
 
 def get_user_state(user_id):
-    return user_states.get(user_id, None)
+    return user_states.get(user_id)
+
 
+def run_periodically(task, interval, name=None):
+    """Run task every interval seconds on a daemon thread"""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                task()
+            except Exception as e:
+                logging.error(f"Error in periodic task {name or task.__name__}: {e}")
 
-def send_message(message, destination, interface, response_timestamp=None):
-    max_payload_size = 200
+    thread = threading.Thread(target=loop, name=name, daemon=True)
+    thread.start()
+    return thread
 
-    # Check if interface has a request_timestamp from the incoming message
-    if response_timestamp is None and hasattr(interface, 'request_timestamp') and interface.request_timestamp:
-        response_timestamp = interface.request_timestamp
+
+def send_text(text, destination, interface, kind='reply', max_retries=0, attempt=1, channel_index=0):
+    """Send a single packet with wantAck and register it in the delivery ledger"""
+    send_queue_depth.inc()
+    try:
+        with send_lock:
+            d = interface.sendText(
+                text=text,
+                destinationId=destination,
+                wantAck=True,
+                wantResponse=False,
+                onResponse=onAckNak,
+                channelIndex=channel_index
+            )
+    finally:
+        send_queue_depth.dec()
+    packets_sent.inc(kind)
+    ledger.track(
+        d.id, destination,
+        resend=lambda next_attempt: send_text(text, destination, interface, kind, max_retries, next_attempt,
+                                              channel_index),
+        kind=kind, max_retries=max_retries, attempt=attempt
+    )
+    return d
+
+
+def send_message(message, destination, interface, response_timestamp=None, kind='reply', max_retries=0, channel_index=0):
+    max_payload_size = MAX_PACKET_SIZE
+
+    # Default to the timestamp of the incoming message being handled, if any
+    request = current_request.get()
+    if response_timestamp is None and request is not None:
+        response_timestamp = request.timestamp
 
     for i in range(0, len(message), max_payload_size):
         chunk = message[i:i + max_payload_size]
@@ -27,12 +96,7 @@ def send_message(message, destination, interface, response_timestamp=None):
         send_timestamp = (response_timestamp + 1) if response_timestamp else int(time.time())
 
         try:
-            d = interface.sendText(
-                text=chunk,
-                destinationId=destination,
-                wantAck=True,
-                wantResponse=False
-            )
+            d = send_text(chunk, destination, interface, kind=kind, max_retries=max_retries, channel_index=channel_index)
             destid = get_node_id_from_num(destination, interface)
             chunk_display = chunk.replace('\n', '\\n')
             logging.info(f"Sending message to user '{get_node_short_name(destid, interface)}' ({destid}) with sendID {d.id}: \"{chunk_display}\"")
@@ -53,7 +117,7 @@ def send_message(message, destination, interface, response_timestamp=None):
                     to_id=destid if destid else 'unknown',
                     message=chunk,
                     timestamp=send_timestamp,  # Use timestamp from before send
-                    channel_index=0,  # Assume primary channel
+                    channel_index=channel_index,
                     snr=None,  # No SNR for outgoing
                     rssi=None,  # No RSSI for outgoing
                     hop_limit=None
@@ -62,10 +126,30 @@ def send_message(message, destination, interface, response_timestamp=None):
                 logging.warning(f"Failed to log outgoing message to database: {log_error}")
 
         except Exception as e:
-            logging.info(f"REPLY SEND ERROR {e.message}")
+            logging.info(f"REPLY SEND ERROR {e}")
 
 
-        time.sleep(2)
+        time.sleep(SEND_INTERVAL)
+
+
+def send_broadcast(message, interface, dedup_key=None, window=BROADCAST_DEDUP_WINDOW):
+    """Broadcast a notification on the primary channel unless it already went out within window.
+
+    dedup_key identifies the event (e.g. a bulletin's unique_id); by default
+    the message text itself is the key. Returns True if the broadcast was sent.
+    """
+    key = dedup_key or hashlib.sha1(message.encode('utf-8')).hexdigest()
+    now = time.time()
+    with recent_broadcasts_lock:
+        for old_key in [k for k, sent_at in recent_broadcasts.items() if now - sent_at >= window]:
+            del recent_broadcasts[old_key]
+        if key in recent_broadcasts:
+            logging.info(f"Skipping duplicate broadcast for {key}")
+            return False
+        recent_broadcasts[key] = now
+
+    send_message(message, BROADCAST_NUM, interface, kind='broadcast')
+    return True
 
 
 def get_node_info(interface, short_name):
@@ -89,34 +173,65 @@ def get_node_short_name(node_id, interface):
     return None
 
 
-def send_bulletin_to_bbs_nodes(board, sender_short_name, subject, content, unique_id, bbs_nodes, interface):
-    message = f"BULLETIN|{board}|{sender_short_name}|{subject}|{content}|{unique_id}"
+def send_sync_frame(message, node_id, interface):
+    """Unicast an encoded sync message to one peer"""
+    if len(message) > MAX_PACKET_SIZE and get_peer_version(node_id) >= CHUNKED_VERSION:
+        try:
+            transfers.send(message, node_id, interface)
+        except TransferError as e:
+            logging.warning(f"SERVER SYNC: Not sending sync message to {node_id}: {e}")
+    else:
+        send_message(message, node_id, interface, kind='sync', max_retries=SYNC_MAX_RETRIES)
+
+
+def send_sync_message(msg_type, fields, bbs_nodes, interface):
+    """Send a sync message to each peer in the newest format it understands.
+
+    If a sync channel is configured, peers that support it get a single
+    broadcast on that channel instead of one unicast each.
+    """
+    channel_index = getattr(interface, 'sync_channel_index', None)
+    broadcast_peers = []
+    if channel_index is not None and msg_type in LEGACY_TYPES:
+        broadcast_peers = [node_id for node_id in bbs_nodes if get_peer_version(node_id) >= BROADCAST_VERSION]
+    if len(broadcast_peers) > 1:
+        broadcasts.publish(encode_compact(msg_type, fields), broadcast_peers, interface, channel_index)
+    else:
+        broadcast_peers = []
+
     for node_id in bbs_nodes:
-        send_message(message, node_id, interface)
+        if node_id not in broadcast_peers:
+            send_sync_frame(encode_for_peer(msg_type, fields, node_id), node_id, interface)
+
+
+def announce_sync_version(bbs_nodes, interface):
+    """Tell peers which sync protocol version we speak; legacy peers ignore this"""
+    for node_id in bbs_nodes:
+        send_message(hello_message(), node_id, interface, kind='sync')
+
+
+def send_bulletin_to_bbs_nodes(board, sender_short_name, subject, content, unique_id, bbs_nodes, interface):
+    fields = {'board': board, 'sender_short_name': sender_short_name, 'subject': subject,
+              'content': content, 'unique_id': unique_id}
+    send_sync_message('BULLETIN', fields, bbs_nodes, interface)
 
 
 def send_mail_to_bbs_nodes(sender_id, sender_short_name, recipient_id, subject, content, unique_id, bbs_nodes,
                            interface):
-    message = f"MAIL|{sender_id}|{sender_short_name}|{recipient_id}|{subject}|{content}|{unique_id}"
+    fields = {'sender_id': sender_id, 'sender_short_name': sender_short_name, 'recipient_id': recipient_id,
+              'subject': subject, 'content': content, 'unique_id': unique_id}
     logging.info(f"SERVER SYNC: Syncing new mail message {subject} sent from {sender_short_name} to other BBS systems.")
-    for node_id in bbs_nodes:
-        send_message(message, node_id, interface)
+    send_sync_message('MAIL', fields, bbs_nodes, interface)
 
 
 def send_delete_bulletin_to_bbs_nodes(bulletin_id, bbs_nodes, interface):
-    message = f"DELETE_BULLETIN|{bulletin_id}"
-    for node_id in bbs_nodes:
-        send_message(message, node_id, interface)
+    send_sync_message('DELETE_BULLETIN', {'unique_id': bulletin_id}, bbs_nodes, interface)
 
 
 def send_delete_mail_to_bbs_nodes(unique_id, bbs_nodes, interface):
-    message = f"DELETE_MAIL|{unique_id}"
     logging.info(f"SERVER SYNC: Sending delete mail sync message with unique_id: {unique_id}")
-    for node_id in bbs_nodes:
-        send_message(message, node_id, interface)
+    send_sync_message('DELETE_MAIL', {'unique_id': unique_id}, bbs_nodes, interface)
 
 
 def send_channel_to_bbs_nodes(name, url, bbs_nodes, interface):
-    message = f"CHANNEL|{name}|{url}"
-    for node_id in bbs_nodes:
-        send_message(message, node_id, interface)
+    send_sync_message('CHANNEL', {'name': name, 'url': url}, bbs_nodes, interface)
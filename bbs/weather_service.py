@@ -0,0 +1,211 @@
+"""
+Weather lookups for the Weather menu.
+
+Reports are cached per ZIP code in memory and in the weather_cache table.
+A fresh entry (younger than CACHE_TTL) is answered straight from memory; an
+older one still answers immediately while a background refresh fetches a new
+report (stale-while-revalidate), and only a ZIP that was never looked up (or
+is older than STALE_TTL) waits for the provider. Provider calls never run on
+the packet receive thread: results are delivered through a callback.
+
+The provider is pluggable; OpenWeatherMapProvider is used by default and
+FakeWeatherProvider answers locally from canned reports (FAKE_REPORTS unless
+given others), for tests and offline setups.
+"""
+
+import abc
+import configparser
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+
+import requests
+
+CACHE_TTL = 600
+STALE_TTL = 3 * 3600
+REQUEST_TIMEOUT = 5
+
+# Built-in key, used unless [weather] api_key is set in config.ini
+DEFAULT_API_KEY = "b5f7bc717799c13af6c652a35002edd6"
+
+# What FakeWeatherProvider answers with by default
+FAKE_REPORTS = {
+    '45202': {'city': 'Cincinnati', 'temp': 68.0, 'feels_like': 67.5, 'humidity': 62, 'conditions': 'Scattered Clouds'},
+    '41011': {'city': 'Covington', 'temp': 67.2, 'feels_like': 66.9, 'humidity': 64, 'conditions': 'Light Rain'},
+    '40502': {'city': 'Lexington', 'temp': 71.6, 'feels_like': 71.1, 'humidity': 55, 'conditions': 'Clear Sky'},
+    '43215': {'city': 'Columbus', 'temp': 64.4, 'feels_like': 63.3, 'humidity': 70, 'conditions': 'Overcast Clouds'},
+}
+
+
+class WeatherError(Exception):
+    pass
+
+
+class WeatherNotFound(WeatherError):
+    pass
+
+
+class WeatherProvider(abc.ABC):
+    """Returns the current weather for a ZIP code as a dict with city, temp,
+    feels_like, humidity and conditions, or raises WeatherError"""
+
+    @abc.abstractmethod
+    def current(self, zip_code):
+        pass
+
+
+class OpenWeatherMapProvider(WeatherProvider):
+    url = "http://api.openweathermap.org/data/2.5/weather"
+
+    def __init__(self, api_key, country_code="us", timeout=REQUEST_TIMEOUT):
+        self.api_key = api_key
+        self.country_code = country_code
+        self.timeout = timeout
+        # Keeps the connection to the API open between lookups
+        self.session = requests.Session()
+
+    def current(self, zip_code):
+        params = {'zip': f"{zip_code},{self.country_code}", 'appid': self.api_key, 'units': 'imperial'}
+        try:
+            response = self.session.get(self.url, params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise WeatherError(str(e))
+
+        if response.status_code == 404:
+            raise WeatherNotFound(zip_code)
+        if response.status_code != 200:
+            raise WeatherError(f"HTTP {response.status_code}")
+
+        data = response.json()
+        return {
+            'city': data["name"],
+            'temp': data["main"]["temp"],
+            'feels_like': data["main"]["feels_like"],
+            'humidity': data["main"]["humidity"],
+            'conditions': data["weather"][0]["description"].title()
+        }
+
+
+class FakeWeatherProvider(WeatherProvider):
+    """Answers from a dict of canned reports (FAKE_REPORTS by default); unknown ZIPs are not found"""
+
+    def __init__(self, reports=None):
+        self.reports = FAKE_REPORTS if reports is None else reports
+        self.calls = 0
+
+    def current(self, zip_code):
+        self.calls += 1
+        if zip_code not in self.reports:
+            raise WeatherNotFound(zip_code)
+        return dict(self.reports[zip_code])
+
+
+class WeatherService:
+    def __init__(self, provider, ttl=CACHE_TTL, stale_ttl=STALE_TTL, persist=True):
+        self.provider = provider
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.persist = persist
+        # zip -> (report, fetched_at); report is None for ZIPs the provider doesn't know
+        self.cache = {}
+        # zip -> callbacks waiting for a fetch in progress
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def _cached(self, zip_code):
+        with self.lock:
+            entry = self.cache.get(zip_code)
+        if entry is None and self.persist:
+            try:
+                from db_operations import get_cached_weather  # Import here to avoid circular import
+                row = get_cached_weather(zip_code)
+                if row:
+                    entry = (json.loads(row[0]), row[1])
+                    with self.lock:
+                        self.cache.setdefault(zip_code, entry)
+            except Exception as e:
+                logging.warning(f"Weather cache read failed: {e}")
+        return entry
+
+    def lookup(self, zip_code, callback):
+        """Call callback(report, error) with the weather for zip_code.
+
+        Cached reports are delivered before this returns; otherwise the
+        callback runs on a background thread once the provider answers.
+        """
+        entry = self._cached(zip_code)
+        if entry is not None:
+            report, fetched_at = entry
+            age = time.time() - fetched_at
+            if age < self.ttl:
+                self._deliver(callback, report)
+                return
+            if age < self.stale_ttl:
+                self._deliver(callback, report)
+                self._fetch(zip_code, None)
+                return
+        self._fetch(zip_code, callback)
+
+    def _deliver(self, callback, report, error=None):
+        if report is None and error is None:
+            error = WeatherNotFound()
+        try:
+            callback(report, error)
+        except Exception as e:
+            logging.error(f"Error delivering weather report: {e}")
+
+    def _fetch(self, zip_code, callback):
+        if callback:
+            # Keep the request context (e.g. its timestamp) for the reply sent from the fetch thread
+            callback = functools.partial(contextvars.copy_context().run, callback)
+        with self.lock:
+            waiting = self.pending.get(zip_code)
+            if waiting is not None:
+                # Already being fetched; just wait for that result
+                if callback:
+                    waiting.append(callback)
+                return
+            self.pending[zip_code] = [callback] if callback else []
+        threading.Thread(target=self._run_fetch, args=(zip_code,), name='weather-fetch', daemon=True).start()
+
+    def _run_fetch(self, zip_code):
+        report, error = None, None
+        try:
+            report = self.provider.current(zip_code)
+        except WeatherNotFound:
+            pass
+        except Exception as e:
+            error = e if isinstance(e, WeatherError) else WeatherError(str(e))
+
+        now = time.time()
+        with self.lock:
+            if error is None:
+                self.cache[zip_code] = (report, now)
+            callbacks = self.pending.pop(zip_code, [])
+
+        if error is None and self.persist:
+            try:
+                from db_operations import save_cached_weather  # Import here to avoid circular import
+                save_cached_weather(zip_code, json.dumps(report), int(now))
+            except Exception as e:
+                logging.warning(f"Weather cache write failed: {e}")
+        elif error is not None:
+            logging.error(f"Error getting weather for {zip_code}: {error}")
+
+        for callback in callbacks:
+            self._deliver(callback, report, error)
+
+
+def load_provider(config_file='config.ini'):
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    if config.get('weather', 'provider', fallback='openweathermap') == 'fake':
+        return FakeWeatherProvider()
+    return OpenWeatherMapProvider(config.get('weather', 'api_key', fallback=DEFAULT_API_KEY),
+                                  config.get('weather', 'country_code', fallback='us'))
+
+
+weather = WeatherService(load_provider())
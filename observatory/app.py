@@ -2,10 +2,11 @@
 Wildcat Mesh Network Observatory
 Flask Dashboard for Northern Kentucky Mesh
 """
-from flask import Flask, render_template, jsonify, Response, request
+from flask import Flask, render_template, jsonify, Response, request, g
 from flask_socketio import SocketIO, emit
 from datetime import datetime
 import logging
+import math
 import threading
 import time
 import configparser
@@ -32,9 +33,16 @@ from modules.db import (
     get_channel_details,
     get_channel_messages,
     get_node_positions,
+    get_latest_positions,
     get_bbs_messages,
-    get_neighbor_info
+    get_neighbor_info,
+    get_delivery_stats,
+    get_js8_spots,
+    get_js8_spot_rollups,
+    record_admin_event
 )
+from modules.geo import nearby_nodes
+from modules.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry
 
 app = Flask(__name__)
 app.config.from_object(config)
@@ -51,6 +59,29 @@ logging.basicConfig(
 # Initialize database tables
 initialize_observatory_tables()
 
+request_seconds = registry.histogram('observatory_request_seconds', "Time to serve a request, by endpoint", ['endpoint'])
+requests_total = registry.counter('observatory_requests_total', "Requests served, by endpoint, method and status",
+                                  ['endpoint', 'method', 'status'])
+websocket_clients = registry.gauge('observatory_websocket_clients', "Connected WebSocket clients")
+stats_update_seconds = registry.histogram('observatory_stats_update_seconds',
+                                          "Time to gather the stats pushed to WebSocket clients")
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    # Endpoint names, not paths, so /node/<node_id> is one series
+    endpoint = request.endpoint or 'unmatched'
+    started = g.pop('request_started', None)
+    if started is not None:
+        request_seconds.observe(time.perf_counter() - started, endpoint)
+    requests_total.inc(endpoint, request.method, str(response.status_code))
+    return response
+
 
 # Template filters
 @app.template_filter('format_time')
@@ -108,6 +139,7 @@ def dashboard():
     active_nodes = get_active_nodes(threshold=3600)  # 1 hour
     channel_activity = get_channel_activity()
     low_battery_nodes = get_low_battery_nodes()
+    delivery_stats = get_delivery_stats(hours=24)
 
     return render_template(
         'dashboard.html',
@@ -115,7 +147,8 @@ def dashboard():
         recent_messages=recent_messages,
         active_nodes=active_nodes,
         channel_activity=channel_activity,
-        low_battery_nodes=low_battery_nodes
+        low_battery_nodes=low_battery_nodes,
+        delivery_stats=delivery_stats
     )
 
 
@@ -154,6 +187,16 @@ def propagation_view():
                           snr_distribution=snr_dist)
 
 
+@app.route('/js8-spots')
+def js8_spots_view():
+    """HF stations heard by JS8Call"""
+    return render_template('js8_spots.html',
+                          bands=get_js8_spot_rollups(days=1, by='band'),
+                          hourly=get_js8_spot_rollups(days=7, by='hour'),
+                          grids=get_js8_spot_rollups(days=1, by='grid', limit=20),
+                          spots=get_js8_spots(hours=1, limit=100))
+
+
 @app.route('/topology')
 def topology_view():
     """Network topology visualization"""
@@ -509,6 +552,12 @@ def save_bbs_content():
         with open(file_path, 'w') as f:
             f.write(content)
 
+        # Let the running BBS pick up the change right away
+        try:
+            record_admin_event('content_updated', file_type)
+        except Exception as e:
+            logging.warning(f"Could not notify BBS of content change: {e}")
+
         return jsonify({
             'success': True,
             'message': f'{file_type.title()} saved successfully!',
@@ -551,6 +600,29 @@ def api_positions():
     return jsonify(get_node_positions())
 
 
+@app.route('/api/v1/nearby')
+def api_nearby():
+    """Get nodes nearest to a point or to another node (JSON)"""
+    positions = get_latest_positions()
+    node_id = request.args.get('node')
+    if node_id:
+        origin = next((p for p in positions if p['node_id'] == node_id), None)
+        if origin is None:
+            return jsonify({'error': f'No position for node {node_id}'}), 404
+        lat, lon = origin['latitude'], origin['longitude']
+    else:
+        lat = request.args.get('lat', type=float)
+        lon = request.args.get('lon', type=float)
+        if lat is None or lon is None:
+            return jsonify({'error': 'Pass lat and lon, or node'}), 400
+
+    radius = request.args.get('radius', type=float)
+    if radius is not None and not (math.isfinite(radius) and radius > 0):
+        return jsonify({'error': 'radius must be a positive number of miles'}), 400
+    limit = request.args.get('limit', 10, type=int)
+    return jsonify(nearby_nodes(positions, lat, lon, radius=radius, limit=limit, exclude=node_id))
+
+
 @app.route('/api/v1/top-senders')
 def api_top_senders():
     """Get top senders (JSON)"""
@@ -585,6 +657,39 @@ def api_neighbor_info():
     return jsonify(get_neighbor_info())
 
 
+@app.route('/api/v1/delivery-stats')
+def api_delivery_stats():
+    """Get BBS outbound delivery rates (JSON)"""
+    hours = request.args.get('hours', 24, type=int)
+    return jsonify(get_delivery_stats(hours=hours))
+
+
+@app.route('/api/v1/js8/spots')
+def api_js8_spots():
+    """Get recent JS8Call spots (JSON)"""
+    hours = request.args.get('hours', 1, type=int)
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify(get_js8_spots(hours=hours, limit=limit,
+                                 band=request.args.get('band'), callsign=request.args.get('callsign')))
+
+
+@app.route('/api/v1/js8/rollups')
+def api_js8_rollups():
+    """Get JS8Call spot counts and SNR by band, hour or grid (JSON)"""
+    by = request.args.get('by', 'band')
+    if by not in ('band', 'hour', 'grid'):
+        return jsonify({'error': 'by must be band, hour or grid'}), 400
+    days = request.args.get('days', 1, type=int)
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify(get_js8_spot_rollups(days=days, by=by, limit=limit))
+
+
+@app.route('/metrics')
+def metrics():
+    """Request, WebSocket and stats update metrics (Prometheus text format)"""
+    return Response(registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 # Export endpoints
 @app.route('/export/nodes.csv')
 def export_nodes_csv():
@@ -660,6 +765,7 @@ def export_messages_csv():
 @socketio.on('connect')
 def handle_connect():
     """Client connected"""
+    websocket_clients.inc()
     logging.info('Client connected to WebSocket')
     emit('connected', {'status': 'connected'})
 
@@ -667,6 +773,7 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     """Client disconnected"""
+    websocket_clients.dec()
     logging.info('Client disconnected from WebSocket')
 
 
@@ -676,9 +783,11 @@ def background_stats_updater():
     while True:
         time.sleep(5)
         try:
+            started = time.perf_counter()
             stats = get_mesh_stats()
             active_nodes = get_active_nodes(threshold=3600)
             recent_messages = get_recent_messages(limit=5)
+            stats_update_seconds.observe(time.perf_counter() - started)
 
             socketio.emit('stats_update', {
                 'stats': stats,
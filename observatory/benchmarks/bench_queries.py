@@ -0,0 +1,284 @@
+"""
+Query benchmark for the Observatory.
+
+Times every read function in modules/db.py and every /api/v1 route (through
+the Flask test client) against one or more databases, typically synthetic
+ones of increasing size from generate_db.py, and records the query plan of
+each SQL statement they run. Plans that scan a whole table or sort through a
+temporary B-tree are flagged, and with several databases each timing is
+compared with the first, so queries whose cost grows faster than the data
+stand out.
+
+    python benchmarks/generate_db.py --output /tmp/1m.db --messages 1000000
+    python benchmarks/generate_db.py --output /tmp/10m.db --messages 10000000
+    python benchmarks/bench_queries.py --db /tmp/1m.db --db /tmp/10m.db --output queries.json
+"""
+
+import argparse
+import inspect
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+
+OBSERVATORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, OBSERVATORY_DIR)
+
+import config  # noqa: E402
+
+# Tables whose size the timings are compared against
+DATA_TABLES = ['message_logs', 'position_logs', 'neighbor_info', 'telemetry_logs']
+
+# Functions in modules/db.py that write rather than read
+SKIP_FUNCTIONS = {'get_db_connection', 'initialize_observatory_tables', 'record_admin_event'}
+
+# Query strings for routes that need them
+ROUTE_QUERIES = {
+    '/api/v1/nearby': 'lat=39.05&lon=-84.51&radius=25',
+}
+
+# A timing that grows this many times faster than message_logs is flagged
+CLIFF_FACTOR = 1.5
+
+# Seconds a single call may run before its queries are interrupted
+DEFAULT_TIMEOUT = 60
+
+
+def sample_arguments(conn):
+    """Values for the required arguments of modules/db functions, taken from the database"""
+    row = conn.execute("SELECT sender_id FROM message_logs GROUP BY sender_id ORDER BY COUNT(*) DESC LIMIT 1").fetchone()
+    return {'node_id': row[0] if row else '!00000000', 'channel_index': 0}
+
+
+def table_sizes(conn):
+    sizes = {}
+    for table in DATA_TABLES:
+        try:
+            sizes[table] = conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+        except sqlite3.OperationalError:
+            sizes[table] = None
+    return sizes
+
+
+class StatementRecorder:
+    """Wraps modules.db.get_db_connection to collect the SQL each call runs
+    and to interrupt queries that are still running after the timeout"""
+
+    def __init__(self, db, timeout=DEFAULT_TIMEOUT):
+        self.db = db
+        self.original = db.get_db_connection
+        self.statements = []
+        self.timeout = timeout
+        self.deadline = None
+        # Only the benchmark's own calls, not the app's background stats thread
+        self.thread = threading.get_ident()
+        db.get_db_connection = self.connect
+
+    def connect(self):
+        conn = self.original()
+        if threading.get_ident() == self.thread:
+            conn.set_trace_callback(self.statements.append)
+            conn.set_progress_handler(self.expired, 100000)
+        return conn
+
+    def start(self):
+        self.deadline = time.perf_counter() + self.timeout
+
+    def expired(self):
+        return self.deadline is not None and time.perf_counter() > self.deadline
+
+    def take(self):
+        statements, self.statements = self.statements, []
+        return statements
+
+
+def query_plans(path, statements):
+    """[{sql, plan, full_scans, temp_btree}] for the distinct SELECTs in statements"""
+    conn = sqlite3.connect(path)
+    plans = []
+    seen = set()
+    for sql in statements:
+        text = ' '.join(sql.split())
+        if not text.upper().startswith(('SELECT', 'WITH')) or text in seen:
+            continue
+        seen.add(text)
+        try:
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {text}")]
+        except sqlite3.Error as e:
+            plan = [f"error: {e}"]
+        plans.append({
+            'sql': text,
+            'plan': plan,
+            # "SCAN t" without "USING ... INDEX" reads every row of t
+            'full_scans': [step.split()[1] for step in plan if step.startswith('SCAN ') and 'INDEX' not in step],
+            'temp_btree': any('TEMP B-TREE' in step for step in plan),
+        })
+    conn.close()
+    return plans
+
+
+def time_call(call, repeat, recorder):
+    """(min ms, median ms, result of the last call); the timings are None if the call timed out"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        recorder.start()
+        started = time.perf_counter()
+        try:
+            result = call()
+        except sqlite3.OperationalError as e:
+            if 'interrupted' not in str(e):
+                raise
+            return None, None, None
+        # Functions that catch sqlite3.Error themselves return normally when interrupted
+        if recorder.expired():
+            return None, None, result
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(min(timings), 2), round(statistics.median(timings), 2), result
+
+
+def format_ms(ms):
+    return f"{'timeout':>10}" if ms is None else f"{ms:>10.2f}"
+
+
+def result_size(result):
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if isinstance(result, dict):
+        return sum(len(v) for v in result.values() if isinstance(v, list)) or len(result)
+    return None
+
+
+def bench_functions(db, recorder, path, repeat):
+    conn = sqlite3.connect(path)
+    arguments = sample_arguments(conn)
+    conn.close()
+
+    results = {}
+    for name, function in inspect.getmembers(db, inspect.isfunction):
+        if name.startswith('_') or name in SKIP_FUNCTIONS or function.__module__ != db.__name__:
+            continue
+        params = inspect.signature(function).parameters
+        required = [p for p in params.values() if p.default is inspect.Parameter.empty]
+        missing = [p.name for p in required if p.name not in arguments]
+        if missing:
+            logging.warning(f"Skipping {name}: no sample value for {', '.join(missing)}")
+            continue
+        kwargs = {p.name: arguments[p.name] for p in required}
+
+        recorder.take()
+        best, median, result = time_call(lambda: function(**kwargs), repeat, recorder)
+        plans = query_plans(path, recorder.take())
+        results[name] = {'min_ms': best, 'median_ms': median, 'timed_out': best is None,
+                         'rows': result_size(result), 'queries': plans}
+        flags = sorted({t for p in plans for t in p['full_scans']})
+        print(f"  {name:<32} {format_ms(best)} {format_ms(median)}  {'SCAN ' + ','.join(flags) if flags else ''}",
+              flush=True)
+    return results
+
+
+def bench_routes(app, recorder, path, repeat):
+    client = app.test_client()
+    results = {}
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if not rule.rule.startswith('/api/v1') or 'GET' not in rule.methods or rule.arguments:
+            continue
+        url = rule.rule + ('?' + ROUTE_QUERIES[rule.rule] if rule.rule in ROUTE_QUERIES else '')
+        recorder.take()
+        best, median, response = time_call(lambda: client.get(url), repeat, recorder)
+        plans = query_plans(path, recorder.take())
+        status = response.status_code if response is not None else None
+        results[rule.rule] = {'min_ms': best, 'median_ms': median, 'timed_out': best is None, 'status': status,
+                              'bytes': len(response.data) if response is not None else None, 'queries': plans}
+        print(f"  {url:<48} {format_ms(best)} {format_ms(median)}  {status}", flush=True)
+    return results
+
+
+def compare(runs):
+    """Flag timings that grew faster than message_logs between the first database and each later one"""
+    base = runs[0]
+    base_rows = base['tables'].get('message_logs') or 1
+    cliffs = []
+    for run in runs[1:]:
+        growth = (run['tables'].get('message_logs') or 1) / base_rows
+        for section in ('functions', 'routes'):
+            for name, result in run[section].items():
+                before = base[section].get(name)
+                if result['timed_out'] and before and not before['timed_out']:
+                    cliffs.append({'database': run['database'], 'name': name, 'time_growth': None,
+                                   'data_growth': round(growth, 2), 'min_ms': None})
+                if not before or not before['min_ms'] or result['timed_out']:
+                    continue
+                ratio = result['min_ms'] / before['min_ms']
+                result['growth_vs_first'] = round(ratio, 2)
+                if ratio > growth * CLIFF_FACTOR and result['min_ms'] > 10:
+                    cliffs.append({'database': run['database'], 'name': name, 'time_growth': round(ratio, 2),
+                                   'data_growth': round(growth, 2), 'min_ms': result['min_ms']})
+    return cliffs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--db', action='append', required=True,
+                        help="database to benchmark; repeat for several sizes, smallest first")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help="seconds before a call's queries are interrupted and it is reported as timed out")
+    parser.add_argument('--no-routes', action='store_true', help="skip the Flask routes")
+    parser.add_argument('--output', default='query_results.json')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    config.DATABASE_PATH = args.db[0]
+    import modules.db as db
+    recorder = StatementRecorder(db, timeout=args.timeout)
+
+    app = None
+    if not args.no_routes:
+        try:
+            from app import app
+        except ImportError as e:
+            print(f"Skipping routes: {e}")
+
+    runs = []
+    for path in args.db:
+        db.DATABASE_PATH = path
+        conn = sqlite3.connect(path)
+        tables = table_sizes(conn)
+        conn.close()
+        print(f"{path}: " + ', '.join(f"{t} {n:,}" for t, n in tables.items() if n is not None))
+        print(f"  {'function / route':<32} {'min ms':>10} {'median ms':>10}")
+        run = {'database': path, 'tables': tables, 'functions': bench_functions(db, recorder, path, args.repeat)}
+        run['routes'] = bench_routes(app, recorder, path, args.repeat) if app else {}
+        runs.append(run)
+
+    cliffs = compare(runs) if len(runs) > 1 else []
+    for cliff in cliffs:
+        if cliff['min_ms'] is None:
+            print(f"Scaling cliff: {cliff['name']} timed out on {cliff['database']}")
+            continue
+        print(f"Scaling cliff: {cliff['name']} took {cliff['time_growth']}x longer on {cliff['database']} "
+              f"for {cliff['data_growth']}x the messages ({cliff['min_ms']} ms)")
+
+    report = {
+        'benchmark': 'observatory-queries',
+        'timestamp': int(time.time()),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'repeat': args.repeat,
+        'timeout': args.timeout,
+        'runs': runs,
+        'scaling_cliffs': cliffs,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
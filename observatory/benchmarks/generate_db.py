@@ -0,0 +1,312 @@
+"""
+Build a synthetic bulletins.db for benchmarking the Observatory queries.
+
+The database has the real schema (created by the BBS's initialize_database
+and the Observatory's initialize_observatory_tables) filled with generated
+traffic over a span of days:
+
+    message_logs   text traffic following a daily activity curve, a few
+                   chatty nodes and many quiet ones, spread over channels,
+                   with DMs to the BBS and the BBS's replies
+    position_logs  fixed nodes reporting every few hours, mobile nodes
+                   every few minutes while moving
+    neighbor_info  periodic neighbour snapshots from each node's nearest nodes
+    telemetry_logs device and environment metrics
+    node_info, delivery_log, and the BBS summary tables rebuilt from the above
+
+Rows are written in time order, in batches, so tens of millions of
+messages take minutes rather than hours.
+
+    python benchmarks/generate_db.py --output /tmp/bench.db --messages 10000000
+"""
+
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+
+OBSERVATORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BBS_DIR = os.path.join(os.path.dirname(OBSERVATORY_DIR), 'bbs')
+
+BROADCAST_NUM = 4294967295
+BBS_NODE_ID = '!9e766b18'
+BBS_NODE_NUM = 0x9e766b18
+
+BATCH_SIZE = 50000
+
+HW_MODELS = ['HELTEC_V3', 'TBEAM', 'RAK4631', 'T_ECHO', 'STATION_G2', 'HELTEC_WIRELESS_TRACKER']
+ROLES = ['CLIENT', 'CLIENT', 'CLIENT', 'CLIENT_MUTE', 'ROUTER', 'REPEATER']
+WORDS = ('the mesh is up test check radio signal good morning anyone copy weather net tonight '
+         'bbs mail relay node battery solar repeater hill antenna new here thanks 73').split()
+BBS_COMMANDS = ['m', 'b', 's', 'x', 'h', 'n', 'r', 'w', 'cm', 'chl']
+
+
+def activity(local_hour):
+    """Relative traffic at a local hour: quiet overnight, peaking in the evening"""
+    return 0.15 + math.exp(-((local_hour - 19) ** 2) / 18) + 0.6 * math.exp(-((local_hour - 8) ** 2) / 8)
+
+
+class Node:
+    def __init__(self, index, rng, center, mobile):
+        self.num = 0x10000000 + index * 7919
+        self.node_id = f"!{self.num:08x}"
+        self.short_name = f"{chr(65 + index % 26)}{index:03d}"[:4]
+        self.long_name = f"Synthetic Node {index}"
+        self.hw_model = rng.choice(HW_MODELS)
+        self.role = rng.choice(ROLES)
+        self.mobile = mobile
+        self.lat = center[0] + rng.gauss(0, 0.25)
+        self.lon = center[1] + rng.gauss(0, 0.3)
+        # Nearby nodes hear each other well; the BBS hears distant nodes poorly
+        self.base_snr = rng.uniform(-15, 10)
+        self.chattiness = rng.paretovariate(1.2)
+        self.battery = rng.randint(40, 100)
+        self.solar = rng.random() < 0.4
+
+
+def batches(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert(conn, sql, rows, label):
+    count = 0
+    for batch in batches(rows):
+        conn.executemany(sql, batch)
+        count += len(batch)
+        conn.commit()
+        print(f"\r  {label}: {count:,}", end='', flush=True)
+    print()
+    return count
+
+
+def hour_slots(start, days):
+    """(hour start time, local hour, day_bucket) for every hour in the span"""
+    for hour_start in range(start, start + days * 86400, 3600):
+        local = time.localtime(hour_start)
+        yield hour_start, local.tm_hour, local.tm_year * 10000 + local.tm_mon * 100 + local.tm_mday
+
+
+def spread(total, weights):
+    """Split total into whole counts proportional to weights"""
+    weight_sum = sum(weights)
+    counts, carried, given = [], 0.0, 0
+    for weight in weights:
+        carried += total * weight / weight_sum
+        counts.append(int(carried) - given)
+        given = int(carried)
+    return counts
+
+
+def message_rows(rng, nodes, slots, total, channels):
+    senders = nodes
+    cum_weights = []
+    running = 0
+    for node in senders:
+        running += node.chattiness
+        cum_weights.append(running)
+    channel_weights = [1.0 / (i + 1) ** 1.5 for i in range(channels)]
+    counts = spread(total, [activity(local_hour) for _, local_hour, _ in slots])
+
+    for (hour_start, local_hour, day_bucket), count in zip(slots, counts):
+        if not count:
+            continue
+        # Evenings are noisier on the band
+        hour_penalty = 2 * math.exp(-((local_hour - 19) ** 2) / 18)
+        times = sorted(rng.randrange(3600) for _ in range(count))
+        for offset, node in zip(times, rng.choices(senders, cum_weights=cum_weights, k=count)):
+            timestamp = hour_start + offset
+            snr = round(node.base_snr - hour_penalty + rng.gauss(0, 3), 2)
+            rssi = int(-95 + snr * 2 + rng.gauss(0, 4))
+            hop_limit = rng.randint(0, 3)
+            if rng.random() < 0.12:
+                # DM to the BBS, and its reply
+                command = rng.choice(BBS_COMMANDS)
+                yield (timestamp, node.node_id, node.short_name, BBS_NODE_NUM, 0, command, snr, rssi, hop_limit,
+                       local_hour, day_bucket)
+                yield (timestamp + 1, BBS_NODE_ID, 'BBS', node.node_id, 0, f"Reply to {command}", None, None, None,
+                       local_hour, day_bucket)
+            else:
+                channel = rng.choices(range(channels), weights=channel_weights)[0]
+                text = ' '.join(rng.choices(WORDS, k=rng.randint(2, 12)))
+                yield (timestamp, node.node_id, node.short_name, BROADCAST_NUM, channel, text, snr, rssi, hop_limit,
+                       local_hour, day_bucket)
+
+
+def position_rows(rng, nodes, slots, total):
+    # Mobile nodes report about twelve times as often as fixed ones
+    weights = [12 if node.mobile else 1 for node in nodes]
+    per_hour = [count / len(slots) for count in spread(total, weights)]
+    for hour_start, _, _ in slots:
+        rows = []
+        for node, rate in zip(nodes, per_hour):
+            reports = int(rate) + (rng.random() < rate - int(rate))
+            for _ in range(reports):
+                if node.mobile:
+                    node.lat += rng.gauss(0, 0.01)
+                    node.lon += rng.gauss(0, 0.01)
+                    lat, lon = node.lat, node.lon
+                else:
+                    lat, lon = node.lat + rng.gauss(0, 0.0001), node.lon + rng.gauss(0, 0.0001)
+                rows.append((hour_start + rng.randrange(3600), node.node_id, node.num, round(lat, 6), round(lon, 6),
+                             rng.randint(150, 400), 32, rng.randint(0, 60) if node.mobile else 0,
+                             rng.randint(0, 359), rng.randint(4, 14)))
+        rows.sort()
+        yield from rows
+
+
+def nearest_neighbors(nodes, k):
+    neighbors = {}
+    for node in nodes:
+        others = sorted((n for n in nodes if n is not node),
+                        key=lambda n: (n.lat - node.lat) ** 2 + (n.lon - node.lon) ** 2)
+        neighbors[node.num] = others[:k]
+    return neighbors
+
+
+def neighbor_rows(rng, nodes, slots, total, k=6):
+    neighbors = nearest_neighbors(nodes, k)
+    snapshots = max(1, total // (len(nodes) * k))
+    every = max(1, len(slots) // snapshots)
+    for i, (hour_start, _, _) in enumerate(slots):
+        if i % every:
+            continue
+        rows = []
+        for node in nodes:
+            timestamp = hour_start + rng.randrange(3600)
+            for other in neighbors[node.num]:
+                distance = math.hypot(other.lat - node.lat, other.lon - node.lon)
+                snr = round(10 - distance * 40 + rng.gauss(0, 2), 2)
+                rows.append((timestamp, node.node_id, other.num, snr, timestamp - rng.randint(0, 900)))
+        rows.sort()
+        yield from rows
+
+
+def telemetry_rows(rng, nodes, slots, total):
+    per_hour = total / (len(nodes) * len(slots))
+    for hour_start, local_hour, _ in slots:
+        rows = []
+        for node in nodes:
+            reports = int(per_hour) + (rng.random() < per_hour - int(per_hour))
+            for _ in range(reports):
+                charging = node.solar and 9 <= local_hour <= 16
+                node.battery = max(5, min(101, node.battery + (3 if charging else -1)))
+                rows.append((hour_start + rng.randrange(3600), node.node_id, node.num, node.battery,
+                             round(3.3 + node.battery / 100 * 0.9, 3), round(rng.uniform(2, 35), 2),
+                             round(rng.uniform(0, 8), 2), round(15 + 10 * math.sin((local_hour - 9) / 24 * 2 * math.pi), 1),
+                             round(rng.uniform(30, 80), 1), round(rng.uniform(990, 1030), 1), None,
+                             rng.randint(0, 10 ** 7)))
+        rows.sort()
+        yield from rows
+
+
+def delivery_rows(rng, conn):
+    """One delivery outcome per BBS reply, mostly acknowledged"""
+    for timestamp, destination in conn.execute(
+            "SELECT timestamp, to_id FROM message_logs WHERE sender_id = ? ORDER BY timestamp", (BBS_NODE_ID,)):
+        status = rng.choices(['ack', 'implicit_ack', 'nak', 'timeout'], weights=[80, 8, 4, 8])[0]
+        latency = rng.randint(800, 25000) if status != 'timeout' else None
+        yield (rng.getrandbits(31), destination, 'reply', status, 'NO_RESPONSE' if status == 'nak' else None, 1,
+               timestamp, timestamp + (latency or 60000) // 1000, latency)
+
+
+def create_schema(path):
+    """Create every table the BBS and the Observatory use, in a fresh database at path"""
+    sys.path.insert(0, BBS_DIR)
+    import db_operations
+    db_operations.DB_PATH = path
+    db_operations.initialize_database()
+
+    sys.path.insert(0, OBSERVATORY_DIR)
+    import config
+    config.DATABASE_PATH = path
+    from modules.db import initialize_observatory_tables
+    initialize_observatory_tables()
+    return db_operations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output', required=True, help="database file to create (must not exist)")
+    parser.add_argument('--messages', type=int, default=1000000,
+                        help="messages heard; the BBS's replies to DMs are logged on top of these")
+    parser.add_argument('--positions', type=int, default=None, help="default: messages / 5")
+    parser.add_argument('--neighbors', type=int, default=None, help="default: messages / 10")
+    parser.add_argument('--telemetry', type=int, default=None, help="default: messages / 5")
+    parser.add_argument('--nodes', type=int, default=400)
+    parser.add_argument('--mobile-fraction', type=float, default=0.1)
+    parser.add_argument('--channels', type=int, default=8)
+    parser.add_argument('--days', type=int, default=90, help="span of history, ending now")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--analyze', action='store_true',
+                        help="run ANALYZE afterwards (production databases usually haven't been)")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        parser.error(f"{args.output} already exists")
+
+    rng = random.Random(args.seed)
+    started = time.time()
+    db_operations = create_schema(args.output)
+
+    center = (39.05, -84.51)
+    nodes = [Node(i, rng, center, rng.random() < args.mobile_fraction) for i in range(args.nodes)]
+    end = int(time.time()) // 3600 * 3600
+    slots = list(hour_slots(end - args.days * 86400, args.days))
+
+    conn = sqlite3.connect(args.output)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -200000")
+
+    insert(conn, """INSERT INTO message_logs (timestamp, sender_id, sender_short_name, to_id, channel_index, message,
+                    snr, rssi, hop_limit, local_hour, day_bucket) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+           message_rows(rng, nodes, slots, args.messages, args.channels), "message_logs")
+    insert(conn, """INSERT INTO position_logs (timestamp, node_id, node_name, latitude, longitude, altitude,
+                    precision_bits, ground_speed, ground_track, satellites_in_view) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+           position_rows(rng, nodes, slots, args.positions if args.positions is not None else args.messages // 5),
+           "position_logs")
+    insert(conn, "INSERT INTO neighbor_info (timestamp, node_id, neighbor_id, snr, last_heard) VALUES (?, ?, ?, ?, ?)",
+           neighbor_rows(rng, nodes, slots, args.neighbors if args.neighbors is not None else args.messages // 10),
+           "neighbor_info")
+    insert(conn, """INSERT INTO telemetry_logs (timestamp, node_id, node_name, battery_level, voltage, channel_util,
+                    air_util_tx, temperature, humidity, pressure, gas_resistance, uptime_seconds)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+           telemetry_rows(rng, nodes, slots, args.telemetry if args.telemetry is not None else args.messages // 5),
+           "telemetry_logs")
+    insert(conn, """INSERT INTO node_info (node_id, short_name, long_name, hw_model, role, firmware_version,
+                    first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+           ((n.node_id, n.short_name, n.long_name, n.hw_model, n.role, '2.5.0', slots[0][0], end) for n in nodes),
+           "node_info")
+    insert(conn, """INSERT INTO delivery_log (packet_id, destination, kind, status, error_reason, attempt, sent_at,
+                    resolved_at, latency_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+           list(delivery_rows(rng, conn)), "delivery_log")
+
+    # The summary tables the BBS keeps up to date on ingest
+    print("  rebuilding summary tables")
+    c = conn.cursor()
+    c.execute("DELETE FROM node_signal_records")
+    c.execute("DELETE FROM signal_top_records")
+    c.execute("DELETE FROM node_daily_stats")
+    db_operations.backfill_signal_tables(c)
+    db_operations.backfill_node_daily_stats(c)
+    conn.commit()
+    if args.analyze:
+        conn.execute("ANALYZE")
+    conn.close()
+
+    size = os.path.getsize(args.output) / 1024 ** 2
+    print(f"Wrote {args.output} ({size:,.0f} MiB) in {time.time() - started:,.0f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -83,6 +83,9 @@ def initialize_observatory_tables():
         notes TEXT
     )''')
 
+    # Latest position per node (get_latest_positions)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_position_logs_node ON position_logs (node_id, timestamp)")
+
     conn.commit()
     conn.close()
     logging.info("Observatory tables initialized")
@@ -219,13 +222,13 @@ def get_channel_hourly_activity(hours=24):
 
     c.execute("""
         SELECT
-            CAST(strftime('%H', datetime(timestamp, 'unixepoch', 'localtime')) AS INTEGER) as hour,
+            local_hour as hour,
             channel_index,
             COUNT(*) as count
         FROM message_logs
         WHERE timestamp >= ? AND channel_index IS NOT NULL
-        GROUP BY hour, channel_index
-        ORDER BY hour, channel_index
+        GROUP BY local_hour, channel_index
+        ORDER BY local_hour, channel_index
     """, (cutoff,))
 
     activity = c.fetchall()
@@ -360,15 +363,15 @@ def get_hourly_snr_trends(days=7):
 
     c.execute("""
         SELECT
-            CAST(strftime('%H', datetime(timestamp, 'unixepoch', 'localtime')) AS INTEGER) as hour,
+            local_hour as hour,
             AVG(snr) as avg_snr,
             AVG(rssi) as avg_rssi,
             COUNT(*) as message_count,
             COUNT(DISTINCT sender_id) as node_count
         FROM message_logs
         WHERE timestamp >= ? AND snr IS NOT NULL
-        GROUP BY hour
-        ORDER BY hour ASC
+        GROUP BY local_hour
+        ORDER BY local_hour ASC
     """, (cutoff,))
 
     results = c.fetchall()
@@ -376,33 +379,41 @@ def get_hourly_snr_trends(days=7):
     return [dict(row) for row in results]
 
 
-def get_best_worst_propagation():
+def get_best_worst_propagation(days=7):
     """Get best and worst propagation times/connections"""
     import time
     conn = get_db_connection()
     c = conn.cursor()
 
-    cutoff = int(time.time()) - (7 * 86400)
-
-    # Best connections (highest SNR)
-    c.execute("""
-        SELECT sender_short_name, snr, rssi, timestamp
-        FROM message_logs
-        WHERE timestamp >= ? AND snr IS NOT NULL
-        ORDER BY snr DESC
-        LIMIT 10
-    """, (cutoff,))
-    best = c.fetchall()
-
-    # Worst connections (lowest SNR)
-    c.execute("""
-        SELECT sender_short_name, snr, rssi, timestamp
-        FROM message_logs
-        WHERE timestamp >= ? AND snr IS NOT NULL
-        ORDER BY snr ASC
-        LIMIT 10
-    """, (cutoff,))
-    worst = c.fetchall()
+    # signal_top_records holds each local day's strongest / weakest readings
+    # (maintained by the BBS), so the window's top 10 is among them
+    first = time.localtime(int(time.time()) - (days - 1) * 86400)
+    first_day = first.tm_year * 10000 + first.tm_mon * 100 + first.tm_mday
+
+    try:
+        # Best connections (highest SNR)
+        c.execute("""
+            SELECT sender_short_name, snr, rssi, timestamp
+            FROM signal_top_records
+            WHERE day_bucket >= ? AND kind = 'best'
+            ORDER BY snr DESC
+            LIMIT 10
+        """, (first_day,))
+        best = c.fetchall()
+
+        # Worst connections (lowest SNR)
+        c.execute("""
+            SELECT sender_short_name, snr, rssi, timestamp
+            FROM signal_top_records
+            WHERE day_bucket >= ? AND kind = 'worst'
+            ORDER BY snr ASC
+            LIMIT 10
+        """, (first_day,))
+        worst = c.fetchall()
+    except sqlite3.OperationalError as e:
+        # signal_top_records is created by the BBS; it may not have run yet
+        logging.warning(f"Propagation records unavailable: {e}")
+        best, worst = [], []
 
     conn.close()
 
@@ -495,6 +506,28 @@ def get_node_positions():
     return [dict(row) for row in positions]
 
 
+def get_latest_positions():
+    """Get the latest GPS position of each node, without the message stats of get_node_positions"""
+    conn = get_db_connection()
+    c = conn.cursor()
+
+    # One index seek per node rather than a MAX over the whole table
+    c.execute("""
+        SELECT p.node_id, p.node_name, p.latitude, p.longitude, p.timestamp
+        FROM (SELECT DISTINCT node_id FROM position_logs) n
+        JOIN position_logs p ON p.id = (
+            SELECT id FROM position_logs
+            WHERE node_id = n.node_id AND latitude IS NOT NULL AND longitude IS NOT NULL
+            ORDER BY timestamp DESC
+            LIMIT 1
+        )
+    """)
+
+    positions = c.fetchall()
+    conn.close()
+    return [dict(row) for row in positions]
+
+
 def get_bbs_messages(limit=500, hours=168):
     """Get direct messages (both to and from BBS node)"""
     import time
@@ -566,3 +599,137 @@ def get_neighbor_info():
     neighbors = c.fetchall()
     conn.close()
     return [dict(row) for row in neighbors]
+
+
+def get_delivery_stats(hours=24):
+    """Get BBS outbound delivery rates and round-trip latency by destination"""
+    conn = get_db_connection()
+    c = conn.cursor()
+
+    cutoff = int(time.time()) - (hours * 3600)
+
+    try:
+        c.execute("""
+            SELECT
+                d.destination,
+                n.short_name,
+                COUNT(*) as resolved,
+                SUM(CASE WHEN d.status IN ('ack', 'implicit_ack') THEN 1 ELSE 0 END) as delivered,
+                SUM(CASE WHEN d.status = 'nak' THEN 1 ELSE 0 END) as nak,
+                SUM(CASE WHEN d.status = 'timeout' THEN 1 ELSE 0 END) as timeout,
+                SUM(CASE WHEN d.attempt > 1 THEN 1 ELSE 0 END) as retries,
+                AVG(CASE WHEN d.status IN ('ack', 'implicit_ack') THEN d.latency_ms END) as avg_latency_ms
+            FROM delivery_log d
+            LEFT JOIN node_info n ON d.destination = n.node_id
+            WHERE d.sent_at >= ?
+            GROUP BY d.destination
+            ORDER BY resolved DESC
+        """, (cutoff,))
+        destinations = [dict(row) for row in c.fetchall()]
+    except sqlite3.OperationalError as e:
+        # delivery_log is created by the BBS; it may not have run yet
+        logging.warning(f"Delivery stats unavailable: {e}")
+        destinations = []
+
+    conn.close()
+
+    for dest in destinations:
+        dest['delivery_rate'] = round(100.0 * dest['delivered'] / dest['resolved'], 1) if dest['resolved'] else None
+
+    resolved = sum(d['resolved'] for d in destinations)
+    delivered = sum(d['delivered'] for d in destinations)
+
+    return {
+        'resolved': resolved,
+        'delivered': delivered,
+        'delivery_rate': round(100.0 * delivered / resolved, 1) if resolved else None,
+        'destinations': destinations
+    }
+
+
+JS8_ROLLUP_COLUMNS = {'band': 'band', 'hour': 'local_hour', 'grid': 'grid'}
+
+
+def get_js8_spots(hours=1, limit=100, band=None, callsign=None):
+    """Get recent stations heard by JS8Call, newest first"""
+    conn = get_db_connection()
+    c = conn.cursor()
+
+    sql = "SELECT timestamp, kind, callsign, grid, snr, dial_freq, freq, band FROM js8_spots WHERE timestamp >= ?"
+    params = [int(time.time()) - hours * 3600]
+    if band:
+        sql += " AND band = ?"
+        params.append(band)
+    if callsign:
+        sql += " AND callsign = ?"
+        params.append(callsign.upper())
+    sql += " ORDER BY timestamp DESC LIMIT ?"
+    params.append(min(limit, 1000))
+
+    try:
+        c.execute(sql, params)
+        spots = [dict(row) for row in c.fetchall()]
+    except sqlite3.OperationalError as e:
+        # js8_spots is created by the BBS; it may not have run yet
+        logging.warning(f"JS8 spots unavailable: {e}")
+        spots = []
+
+    conn.close()
+    return spots
+
+
+def get_js8_spot_rollups(days=1, by='band', limit=50):
+    """Spot counts and SNR grouped by band, local hour or grid square over whole local days"""
+    column = JS8_ROLLUP_COLUMNS[by]
+    conn = get_db_connection()
+    c = conn.cursor()
+
+    # js8_spot_rollups is kept per local day / hour / band / grid by the BBS
+    first = time.localtime(int(time.time()) - (days - 1) * 86400)
+    first_day = first.tm_year * 10000 + first.tm_mon * 100 + first.tm_mday
+
+    try:
+        c.execute(f"""
+            SELECT
+                {column} as {by},
+                SUM(spot_count) as spot_count,
+                SUM(snr_sum) / NULLIF(SUM(snr_count), 0) as avg_snr,
+                MIN(snr_min) as min_snr,
+                MAX(snr_max) as max_snr,
+                MAX(last_at) as last_at
+            FROM js8_spot_rollups
+            WHERE day_bucket >= ? AND {column} != ''
+            GROUP BY {column}
+            ORDER BY {'local_hour ASC' if by == 'hour' else 'spot_count DESC'}
+            LIMIT ?
+        """, (first_day, limit))
+        rollups = [dict(row) for row in c.fetchall()]
+    except sqlite3.OperationalError as e:
+        logging.warning(f"JS8 spot rollups unavailable: {e}")
+        rollups = []
+
+    conn.close()
+    for row in rollups:
+        if row['avg_snr'] is not None:
+            row['avg_snr'] = round(row['avg_snr'], 1)
+    return rollups
+
+
+def record_admin_event(event, payload=None):
+    """Tell the BBS about an admin change (it polls admin_events)"""
+    conn = get_db_connection()
+    c = conn.cursor()
+
+    # Shared with the BBS, which also creates it on startup
+    c.execute('''CREATE TABLE IF NOT EXISTS admin_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        event TEXT NOT NULL,
+        payload TEXT,
+        created_at INTEGER NOT NULL
+    )''')
+    now = int(time.time())
+    c.execute("INSERT INTO admin_events (event, payload, created_at) VALUES (?, ?, ?)", (event, payload, now))
+    # The BBS only needs recent events
+    c.execute("DELETE FROM admin_events WHERE created_at < ?", (now - 86400,))
+    conn.commit()
+    conn.close()
@@ -0,0 +1,28 @@
+"""Distance queries over node positions"""
+import numpy as np
+
+EARTH_RADIUS_MILES = 3959
+
+
+def nearby_nodes(positions, lat, lon, radius=None, limit=10, exclude=None):
+    """Nodes from get_node_positions() nearest to a point, with distance_miles added.
+
+    Distances to every node are computed in one vectorized pass; radius (miles)
+    optionally drops nodes farther away than that.
+    """
+    positions = [p for p in positions if p['node_id'] != exclude]
+    if not positions:
+        return []
+
+    lats = np.radians(np.array([p['latitude'] for p in positions], dtype=float))
+    lons = np.radians(np.array([p['longitude'] for p in positions], dtype=float))
+    lat, lon = np.radians(lat), np.radians(lon)
+
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    distances = 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    order = np.argsort(distances, kind='stable')
+    if radius is not None:
+        order = order[distances[order] <= radius]
+
+    return [dict(positions[i], distance_miles=round(float(distances[i]), 2)) for i in order[:limit]]